@@ -0,0 +1,140 @@
+"""Benchmark embeddingów pytań: osobne zapytania vs EmbeddingBatcher.
+
+Uruchamia stub_openai.py i wysyła `--queries` pytań z conversations.json
+(losowo, z powtórzeniami jak w ruchu) przy `--concurrency` naraz - raz
+każde pytanie osobno (aembed_query, jak przed zmianą), raz przez
+EmbeddingBatcher. Raport: przepustowość, p50/p95 i liczba zapytań HTTP,
+które dotarły do stuba.
+
+Uruchomienie:
+    cd window-sales-chatbot/benchmarks
+    python bench_embedding_batcher.py --queries 5000 --concurrency 200
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+import httpx
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(script_dir, '..', 'src'))
+
+from embedding_batcher import EmbeddingBatcher  # noqa: E402
+from load_test import percentile  # noqa: E402
+from run_benchmark import start_process, wait_ready  # noqa: E402
+
+
+async def run(embed, queries: list[str], concurrency: int):
+    """Wszystkie pytania, najwyżej `concurrency` naraz; zwraca czasy (ms) i czas całkowity"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(query):
+        async with semaphore:
+            start = time.perf_counter()
+            await embed(query)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(query) for query in queries))
+    return latencies, time.perf_counter() - start
+
+
+async def measure(name: str, make_embed, queries: list[str], concurrency: int, stub_url: str) -> dict:
+    async with httpx.AsyncClient() as http:
+        before = (await http.get(f"{stub_url}/stats")).json()
+        embed, stats = make_embed()
+        latencies, elapsed = await run(embed, queries, concurrency)
+        extra = stats()
+        after = (await http.get(f"{stub_url}/stats")).json()
+    return {
+        "name": name,
+        "queries_per_sec": len(queries) / elapsed,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "http_requests": after["embeddings"] - before["embeddings"],
+        "texts_sent": after["embedding_inputs"] - before["embedding_inputs"],
+        **extra,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark paczkowania embeddingów pytań")
+    parser.add_argument("--queries", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--embed-latency", type=float, default=40, help="ms na zapytanie do stuba")
+    parser.add_argument("--embed-input-latency", type=float, default=0.2, help="ms na każdy tekst w zapytaniu")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--wait-ms", type=float, default=5)
+    parser.add_argument("--stub-port", type=int, default=8111)
+    parser.add_argument("--unique", action="store_true", help="każde pytanie inne (bez zysku z duplikatów)")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    with open(os.path.join(script_dir, 'conversations.json'), 'r', encoding='utf-8') as f:
+        base = [turn for conversation in json.load(f) for turn in conversation]
+    rng = random.Random(args.seed)
+    queries = [rng.choice(base) for _ in range(args.queries)]
+    if args.unique:
+        queries = [f"{query} ({i})" for i, query in enumerate(queries)]
+
+    stub_url = f"http://127.0.0.1:{args.stub_port}"
+    env = dict(os.environ)
+    env.update({
+        "OPENAI_API_KEY": "sk-stub",
+        "OPENAI_BASE_URL": f"{stub_url}/v1",
+        "STUB_EMBED_LATENCY_MS": str(args.embed_latency),
+        "STUB_EMBED_INPUT_MS": str(args.embed_input_latency),
+    })
+    os.environ.update({"OPENAI_API_KEY": "sk-stub", "OPENAI_BASE_URL": f"{stub_url}/v1"})
+    from langchain_openai import OpenAIEmbeddings
+
+    def client():
+        return OpenAIEmbeddings(model="text-embedding-3-small", check_embedding_ctx_length=False, request_timeout=30)
+
+    def single():
+        embeddings = client()
+        return embeddings.aembed_query, lambda: {}
+
+    def batched():
+        embeddings = client()
+        batcher = EmbeddingBatcher(embeddings.aembed_documents, max_batch=args.batch_size,
+                                   max_wait=args.wait_ms / 1000)
+        return batcher.embed, batcher.get_stats
+
+    stub = start_process(["stub_openai:app", "--port", str(args.stub_port)], script_dir, env,
+                         os.path.join(tempfile.gettempdir(), "wafam_stub_embed.log"))
+    try:
+        wait_ready(f"{stub_url}/stats", stub)
+
+        async def compare():
+            # Rozgrzewka stuba
+            await run(client().aembed_query, queries[:20], 10)
+            return [
+                await measure("osobno", single, queries, args.concurrency, stub_url),
+                await measure("paczki", batched, queries, args.concurrency, stub_url),
+            ]
+
+        results = asyncio.run(compare())
+    finally:
+        stub.terminate()
+        stub.wait(timeout=10)
+
+    print("=" * 60)
+    print(f"Pytań: {args.queries}, naraz: {args.concurrency}, paczka do {args.batch_size}, okno {args.wait_ms} ms")
+    for result in results:
+        print(f"{result['name']:>7}: {result['queries_per_sec']:7.0f} pytań/s, "
+              f"p50 {result['p50_ms']:6.1f} ms, p95 {result['p95_ms']:6.1f} ms, "
+              f"zapytań HTTP {result['http_requests']}, tekstów {result['texts_sent']}")
+    stats = results[1]
+    print(f"Średnia paczka: {stats['avg_batch']}, duplikaty pominięte: {stats['deduplicated']}")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""Mikrobenchmark rozpoznawania intencji/produktu/kontaktu na 100 tys. wiadomości.
+
+Porównuje dawne funkcje z api.py (wiele przejść: listy słów + 4 regexy)
+z jednoprzebiegowym Extractor i sprawdza, że wyniki są takie same.
+
+Uruchomienie:
+    python bench_extractor.py --messages 100000
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import time
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(script_dir, '..', 'src'))
+
+from extractor import Extractor  # noqa: E402
+
+EXTRA_MESSAGES = [
+    "Proszę o kontakt: +48 601-234-567",
+    "mój mail to Jan.Kowalski@Example.com, ile kosztuje montaż?",
+    "kontakt@firma.pl",
+    "Czemu okna Salamander są droższe?",
+    "Przygotuj ofertę na 5 okien i drzwi tarasowe",
+    "Dzień dobry, chciałbym zapytać o bramy garażowe segmentowe z napędem do garażu dwustanowiskowego",
+    "tak poproszę",
+    "nie wiem jeszcze, doradzisz co wybrać?",
+]
+
+
+# Dawna implementacja (api.py sprzed zmiany) - punkt odniesienia
+def legacy_extract(message: str) -> tuple:
+    message_lower = message.lower()
+
+    if any(word in message_lower for word in ["pomiar", "umówić", "wizyta", "przyjechać"]):
+        intent = "pomiar"
+    elif any(word in message_lower for word in ["cena", "koszt", "ile", "kosztuje", "drogo", "tanio"]):
+        intent = "cena"
+    elif any(word in message_lower for word in ["kontakt", "telefon", "zadzwonić", "email", "adres", "gdzie jesteście"]):
+        intent = "kontakt"
+    elif any(word in message_lower for word in ["jakie macie", "co macie", "oferta", "produkty", "asortyment"]):
+        intent = "produkty"
+    elif any(word in message_lower for word in ["polecasz", "polecacie", "doradzisz", "co wybrać", "która", "który"]):
+        intent = "rekomendacja"
+    elif any(word in message_lower for word in ["dlaczego", "czemu", "po co"]):
+        intent = "wyjasnienie"
+    elif any(word in message_lower for word in ["wycena", "ofertę", "przygotuj"]):
+        intent = "wycena"
+    else:
+        intent = "ogolne"
+
+    product = None
+    if any(word in message_lower for word in ["okna", "okno"]):
+        product = "okna"
+    elif any(word in message_lower for word in ["drzwi"]):
+        product = "drzwi"
+    elif any(word in message_lower for word in ["rolety", "roleta"]):
+        product = "rolety"
+    elif any(word in message_lower for word in ["brama", "bramy", "garaż"]):
+        product = "bramy"
+
+    phone = None
+    for pattern in [
+        r'\b\d{3}[\s-]?\d{3}[\s-]?\d{3}\b',
+        r'\b\d{9}\b',
+        r'\+48[\s-]?\d{3}[\s-]?\d{3}[\s-]?\d{3}\b'
+    ]:
+        phone_match = re.search(pattern, message)
+        if phone_match:
+            phone = re.sub(r'[\s\-\+]', '', phone_match.group())
+            if phone.startswith('48'):
+                phone = phone[2:]
+            break
+
+    email = None
+    email_match = re.search(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b', message)
+    if email_match:
+        email = email_match.group().lower()
+
+    short_responses = ["tak", "nie", "podaj", "link", "chcę", "poproszę", "dawaj", "ok", "okej", "dobrze"]
+    stripped = message_lower.strip()
+    short_reply = len(stripped.split()) <= 4 and any(word in stripped for word in short_responses)
+
+    product_keywords = ["okna", "okno", "drzwi", "rolety", "roleta", "bramy", "brama", "żaluzje", "taras", "przesuwne"]
+    topic = any(keyword in message_lower for keyword in product_keywords)
+
+    return intent, product, topic, phone, email, short_reply
+
+
+def build_corpus(count: int, seed: int) -> list[str]:
+    with open(os.path.join(script_dir, 'conversations.json'), 'r', encoding='utf-8') as f:
+        base = [turn for conversation in json.load(f) for turn in conversation] + EXTRA_MESSAGES
+    rng = random.Random(seed)
+    return [rng.choice(base) for _ in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mikrobenchmark ekstraktora")
+    parser.add_argument("--messages", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.messages, args.seed)
+    extractor = Extractor()
+
+    start = time.perf_counter()
+    legacy = [legacy_extract(message) for message in corpus]
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    results = [extractor.extract(message) for message in corpus]
+    new_time = time.perf_counter() - start
+
+    mismatches = [
+        (message, old, new) for message, old, new in zip(corpus, legacy, results)
+        if old != (new.intent, new.product, new.topic, new.phone, new.email, new.short_reply)
+    ]
+
+    print("=" * 50)
+    print(f"Wiadomości: {len(corpus)}")
+    print(f"Dawne funkcje: {legacy_time:.2f} s ({legacy_time / len(corpus) * 1e6:.1f} µs/wiad.)")
+    print(f"Extractor:     {new_time:.2f} s ({new_time / len(corpus) * 1e6:.1f} µs/wiad.)")
+    print(f"Przyspieszenie: {legacy_time / new_time:.1f}x")
+    print(f"Różne wyniki: {len(mismatches)}")
+    for message, old, new in mismatches[:5]:
+        print(f"  {message!r}: {old} != {new}")
+    print("=" * 50)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Benchmark szybkiej ścieżki: jaka część wiadomości omija model i ile to kosztuje.
+
+Przepuszcza pytania z conversations.json (albo z pliku `--questions`,
+jedna wiadomość w linii) przez ekstraktor i FastPath, tak jak robi to
+prepare_chat. Raport: odsetek odpowiedzi z szablonu wg reguły, wiadomości
+odrzucone przez próg pewności, czas sprawdzenia jednej wiadomości i
+wiadomości z NEGATIVES, które nie powinny dostać odpowiedzi z szablonu.
+`--show` wypisuje wiadomości obsłużone bez modelu.
+
+Uruchomienie:
+    cd window-sales-chatbot/benchmarks
+    python bench_fast_path.py --min-confidence 0.7 --show
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(script_dir, '..', 'src'))
+
+from extractor import Extractor, load_keywords  # noqa: E402
+from fast_path import FastPath  # noqa: E402
+
+# Pytania, które tylko przypominają pytanie o kontakt - odpowiadać ma model
+NEGATIVES = [
+    "Jaki jest numer zamówienia?",
+    "Podajcie numer NIP do faktury",
+    "Czy trzeba dzwonić przed dostawą?",
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Odsetek i koszt odpowiedzi z szybkiej ścieżki")
+    parser.add_argument("--questions", help="plik z wiadomościami (jedna w linii)")
+    parser.add_argument("--min-confidence", type=float, default=0.7)
+    parser.add_argument("--repeat", type=int, default=200, help="powtórzenia do pomiaru czasu")
+    parser.add_argument("--show", action="store_true")
+    args = parser.parse_args()
+
+    if args.questions:
+        with open(args.questions, 'r', encoding='utf-8') as f:
+            questions = [line.strip() for line in f if line.strip()]
+    else:
+        with open(os.path.join(script_dir, 'conversations.json'), 'r', encoding='utf-8') as f:
+            questions = [turn for conversation in json.load(f) for turn in conversation]
+
+    extractor = Extractor(load_keywords())
+    fast_path = FastPath.from_chunks_file(
+        os.path.join(script_dir, '..', 'data', 'wafam_chunks.json'),
+        contact_line="KONTAKT: inwestycje@wafam.pl",
+        min_confidence=args.min_confidence
+    )
+
+    rules = {}
+    for text in questions:
+        answer = fast_path.answer(text, extractor.extract(text), {})
+        if answer:
+            rules[answer["rule"]] = rules.get(answer["rule"], 0) + 1
+            if args.show:
+                print(f"[{answer['rule']}] {text}")
+    stats = fast_path.get_stats()
+
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        for text in questions:
+            fast_path.answer(text, extractor.extract(text), {})
+    per_message = (time.perf_counter() - start) / (args.repeat * len(questions))
+    false_hits = [text for text in NEGATIVES if fast_path.answer(text, extractor.extract(text), {})]
+
+    print("=" * 60)
+    print(f"Wiadomości: {len(questions)}, próg pewności {args.min_confidence}")
+    print(f"Bez modelu: {stats['answered']} ({stats['ratio']:.1%}) - "
+          + ", ".join(f"{rule} {count}" for rule, count in sorted(rules.items())))
+    print(f"Odrzucone przez próg: {stats['declined']}")
+    print(f"Ekstrakcja + szybka ścieżka: {per_message * 1e6:.1f} µs na wiadomość")
+    print(f"Fałszywe trafienia: {len(false_hits)} z {len(NEGATIVES)}" + "".join(f"\n  {text}" for text in false_hits))
+    print("=" * 60)
+    if false_hits:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
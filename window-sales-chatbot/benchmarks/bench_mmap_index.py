@@ -0,0 +1,115 @@
+"""Benchmark pamięci indeksu przy wielu workerach: NumpyIndex vs MmapIndex.
+
+Zapisuje syntetyczny index.bin (`--chunks` wektorów o wymiarze `--dim`)
+i uruchamia `--workers` procesów, z których każdy wczytuje indeks i
+wykonuje `--queries` wyszukiwań - tak jak workery `uvicorn --workers N`.
+NumpyIndex: każdy proces ma własną kopię macierzy (jak from_chroma).
+MmapIndex: wszystkie procesy mapują ten sam plik.
+Raport: czas wczytania, czas zapytania i suma PSS procesów (pamięć
+proporcjonalna - strony współdzielone dzielone przez liczbę procesów).
+
+Uruchomienie (tylko Linux - PSS z /proc):
+    cd window-sales-chatbot/benchmarks
+    python bench_mmap_index.py --chunks 100000 --dim 1536 --workers 4
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(script_dir, '..', 'src'))
+
+from retrieval import MmapIndex, NumpyIndex, write_index  # noqa: E402
+
+
+def pss_mb(pid: int) -> float:
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            if line.startswith("Pss:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def worker(backend: str, path: str, queries: int, ready, done, results):
+    start = time.perf_counter()
+    if backend == "mmap":
+        index = MmapIndex(path)
+    else:
+        # Jak NumpyIndex.from_chroma: wektory w prywatnej pamięci procesu
+        mapped = MmapIndex(path)
+        index = NumpyIndex(np.array(mapped.vectors), list(mapped.documents), list(mapped.titles))
+    load = time.perf_counter() - start
+
+    rng = np.random.default_rng(os.getpid())
+    start = time.perf_counter()
+    for _ in range(queries):
+        index.search(rng.standard_normal(index.vectors.shape[1]).astype(np.float32), k=4)
+    results.put((load, (time.perf_counter() - start) / queries))
+    ready.set()
+    # Czekaj na pomiar pamięci
+    done.wait()
+
+
+def measure(backend: str, path: str, workers: int, queries: int) -> dict:
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    done = context.Event()
+    events, processes = [], []
+    for _ in range(workers):
+        ready = context.Event()
+        process = context.Process(target=worker, args=(backend, path, queries, ready, done, results))
+        process.start()
+        events.append(ready)
+        processes.append(process)
+    for ready in events:
+        ready.wait()
+    total_pss = sum(pss_mb(process.pid) for process in processes)
+    done.set()
+    timings = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    return {
+        "backend": backend,
+        "pss_mb": total_pss,
+        "load_s": max(load for load, _ in timings),
+        "query_ms": sum(query for _, query in timings) / len(timings) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pamięć indeksu przy wielu workerach")
+    parser.add_argument("--chunks", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--queries", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(7)
+    vectors = rng.standard_normal((args.chunks, args.dim), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    documents = [f"Fragment {i}: okna, drzwi i rolety - opis oferty numer {i}." for i in range(args.chunks)]
+    titles = [f"Temat {i % 50}" for i in range(args.chunks)]
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "index.bin")
+        start = time.perf_counter()
+        write_index(path, vectors, documents, titles, build="bench", embedder="bench")
+        print(f"index.bin: {os.path.getsize(path) / 2**20:.0f} MB, zapis {time.perf_counter() - start:.1f} s")
+        del vectors
+        results = [measure(backend, path, args.workers, args.queries) for backend in ("numpy", "mmap")]
+
+    print("=" * 60)
+    print(f"Fragmentów: {args.chunks}, wymiar {args.dim}, workerów: {args.workers}")
+    for result in results:
+        print(f"{result['backend']:>6}: PSS razem {result['pss_mb']:7.0f} MB, wczytanie {result['load_s']:.2f} s, "
+              f"zapytanie {result['query_ms']:.1f} ms")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
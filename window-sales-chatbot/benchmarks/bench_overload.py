@@ -0,0 +1,119 @@
+"""Przeciążenie /chat: czy klienci zostawiający kontakt są obsługiwani szybko mimo zalewu.
+
+`--flood` równoległych "botów" (każdy z innego adresu IP - nagłówek
+X-Forwarded-For, uvicorn ufa mu z 127.0.0.1) wysyła pytania bez przerwy.
+W tym samym czasie `--leads` klientów prowadzi krótkie rozmowy: pytanie
+o produkt, numer telefonu, pytanie uzupełniające (sesja z zebranymi
+danymi). Raport: opóźnienia klientów (wg rodzaju wiadomości) i ruchu
+zalewowego, liczba odpowiedzi 429.
+
+Wymaga uruchomionego API (najlepiej na stub_openai.py); porównanie bez
+kontroli przyjęć: WAFAM_ADMISSION_MAX_ACTIVE=0 WAFAM_RATE_IP_PER_MIN=0 WAFAM_RATE_SESSION_PER_MIN=0
+    python bench_overload.py --flood 300 --leads 20 --duration 30
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+import httpx
+
+from load_test import QUESTIONS, percentile
+
+LEAD_TURNS = [
+    ("question", "Interesują mnie okna DECCO 82"),
+    ("contact", "Mój numer to {phone}"),
+    ("follow_up", "Czy robicie też ciepły montaż?"),
+]
+
+
+def summary(values: list[float]) -> str:
+    if not values:
+        return "brak"
+    return (f"p50 {statistics.median(values) * 1000:.0f} ms, p95 {percentile(values, 95) * 1000:.0f} ms, "
+            f"max {max(values) * 1000:.0f} ms ({len(values)})")
+
+
+async def run(url: str, flood: int, leads: int, duration: float, timeout: float):
+    latencies = {"question": [], "contact": [], "follow_up": [], "flood": []}
+    rejected = {"lead": 0, "flood": 0}
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def post(client, payload: dict, ip: str):
+        start = time.perf_counter()
+        response = await client.post(f"{url}/chat", json=payload, headers={"X-Forwarded-For": ip})
+        return response, time.perf_counter() - start
+
+    async def bot(client, n: int):
+        nonlocal errors
+        i = 0
+        while time.perf_counter() < deadline:
+            i += 1
+            payload = {"text": random.choice(QUESTIONS), "session_id": f"flood_{n}_{i}"}
+            try:
+                response, elapsed = await post(client, payload, f"10.1.{n // 250}.{n % 250}")
+            except httpx.HTTPError:
+                errors += 1
+                continue
+            if response.status_code == 429:
+                rejected["flood"] += 1
+                # Bot nie słucha Retry-After - czeka tylko chwilę
+                await asyncio.sleep(0.05)
+            else:
+                latencies["flood"].append(elapsed)
+
+    async def customer(client, n: int):
+        nonlocal errors
+        i = 0
+        while time.perf_counter() < deadline:
+            i += 1
+            session_id = f"lead_{n}_{i}"
+            phone = f"5{n:02d}{i:03d}{random.randint(100, 999)}"
+            for kind, text in LEAD_TURNS:
+                payload = {"text": text.format(phone=phone), "session_id": session_id}
+                try:
+                    response, elapsed = await post(client, payload, f"10.2.0.{n % 250}")
+                except httpx.HTTPError:
+                    errors += 1
+                    continue
+                if response.status_code == 429:
+                    rejected["lead"] += 1
+                else:
+                    latencies[kind].append(elapsed)
+                # Klient czyta odpowiedź i pisze kolejną wiadomość
+                await asyncio.sleep(random.uniform(1.0, 3.0))
+
+    limits = httpx.Limits(max_connections=flood + leads, max_keepalive_connections=flood + leads)
+    async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+        await asyncio.gather(
+            *(bot(client, n) for n in range(flood)),
+            *(customer(client, n) for n in range(leads))
+        )
+    return latencies, rejected, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Opóźnienia klientów przy zalewie zapytań /chat")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--flood", type=int, default=300, help="równoległych botów")
+    parser.add_argument("--leads", type=int, default=20, help="równoległych klientów")
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    args = parser.parse_args()
+
+    latencies, rejected, errors = asyncio.run(run(args.url, args.flood, args.leads, args.duration, args.timeout))
+
+    print("=" * 60)
+    print(f"Klienci - pytanie o produkt: {summary(latencies['question'])}")
+    print(f"Klienci - numer telefonu:    {summary(latencies['contact'])}")
+    print(f"Klienci - pytanie po kontakcie: {summary(latencies['follow_up'])}")
+    print(f"Klienci - odrzucone (429): {rejected['lead']}")
+    print(f"Boty - obsłużone: {summary(latencies['flood'])}")
+    print(f"Boty - odrzucone (429): {rejected['flood']}, błędy połączenia: {errors}")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""Test odporności API na awarie OpenAI (stub ze wstrzykiwanymi błędami).
+
+Uruchamia stub_openai.py i api:app, po czym przez `--phase-seconds` s
+na fazę wysyła pytania z conversations.json (`--concurrency` naraz),
+zmieniając awarie stuba przez POST /faults:
+    normal   - bez awarii,
+    flaky    - 30% zapytań kończy się błędem 503 (ponowienia je maskują),
+    slow     - 30% zapytań wisi (limit czasu + ponowienie),
+    outage   - wszystkie zapytania z błędem (bezpiecznik, odpowiedź awaryjna),
+    recovery - bez awarii (bezpiecznik zamyka się po WAFAM_BREAKER_RESET s).
+Raport na fazę: tury, błędy HTTP, p50/p95/max, odpowiedzi z modelu,
+z cache i awaryjne, ponowienia i stan bezpiecznika.
+
+Uruchomienie:
+    cd window-sales-chatbot/benchmarks
+    python chaos_test.py --phase-seconds 15 --concurrency 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import time
+
+import httpx
+
+from load_test import percentile
+from run_benchmark import start_process, wait_ready
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+src_dir = os.path.join(script_dir, '..', 'src')
+
+PHASES = [
+    ("normal", {"fail_rate": 0.0, "hang_rate": 0.0}),
+    ("flaky", {"fail_rate": 0.3, "fail_status": 503, "hang_rate": 0.0}),
+    ("slow", {"fail_rate": 0.0, "hang_rate": 0.3}),
+    ("outage", {"fail_rate": 1.0, "fail_status": 503, "hang_rate": 0.0}),
+    ("recovery", {"fail_rate": 0.0, "hang_rate": 0.0}),
+]
+
+COUNTER_RE = re.compile(r'^(wafam_chat_requests_total|wafam_upstream_events_total)\{([^}]*)\} (\S+)$')
+BREAKER_RE = re.compile(r'^wafam_upstream_breaker_open\{upstream="(\w+)"\} (\S+)$')
+QUOTE = '"'
+
+
+def parse_metrics(text: str) -> tuple[dict, dict]:
+    """Liczniki odpowiedzi i zdarzeń upstream oraz stan bezpieczników z /metrics"""
+    counters, breakers = {}, {}
+    for line in text.splitlines():
+        if match := COUNTER_RE.match(line):
+            name, labels, value = match.groups()
+            counters[(name, labels)] = float(value)
+        elif match := BREAKER_RE.match(line):
+            breakers[match.group(1)] = float(match.group(2))
+    return counters, breakers
+
+
+def counter_delta(before: dict, after: dict, name: str) -> dict:
+    """Przyrost licznika: {etykiety: wartość}"""
+    return {
+        labels: value - before.get((metric, labels), 0.0)
+        for (metric, labels), value in after.items()
+        if metric == name and value - before.get((metric, labels), 0.0)
+    }
+
+
+async def run_phase(client: httpx.AsyncClient, api_url: str, questions: list[str], seconds: float,
+                    concurrency: int, phase: str) -> dict:
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + seconds
+
+    async def worker(n: int):
+        nonlocal errors
+        i = n
+        while time.perf_counter() < deadline:
+            text = questions[i % len(questions)]
+            i += concurrency
+            start = time.perf_counter()
+            try:
+                # Osobna sesja na pytanie - historia nie rośnie w trakcie testu
+                response = await client.post(f"{api_url}/chat", json={"text": text, "session_id": f"{phase}_{i}"})
+                response.raise_for_status()
+                latencies.append((time.perf_counter() - start) * 1000)
+            except httpx.HTTPError:
+                errors += 1
+
+    await asyncio.gather(*(worker(n) for n in range(concurrency)))
+    return {
+        "turns": len(latencies),
+        "errors": errors,
+        "p50_ms": percentile(latencies, 50) if latencies else None,
+        "p95_ms": percentile(latencies, 95) if latencies else None,
+        "max_ms": max(latencies) if latencies else None,
+    }
+
+
+async def run_phases(api_url: str, stub_url: str, questions: list[str], args) -> list[dict]:
+    results = []
+    async with httpx.AsyncClient(timeout=args.timeout) as client:
+        for phase, faults in PHASES:
+            await client.post(f"{stub_url}/faults", json={**faults, "hang_seconds": args.hang_seconds})
+            before, _ = parse_metrics((await client.get(f"{api_url}/metrics")).text)
+            result = await run_phase(client, api_url, questions, args.phase_seconds, args.concurrency, phase)
+            after, breakers = parse_metrics((await client.get(f"{api_url}/metrics")).text)
+            result.update(
+                phase=phase,
+                answers=counter_delta(before, after, "wafam_chat_requests_total"),
+                upstream=counter_delta(before, after, "wafam_upstream_events_total"),
+                breakers=breakers,
+            )
+            results.append(result)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Test odporności API na awarie OpenAI")
+    parser.add_argument("--phase-seconds", type=float, default=15)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--hang-seconds", type=float, default=60, help="jak długo wisi zawieszone zapytanie stuba")
+    parser.add_argument("--api-port", type=int, default=8012)
+    parser.add_argument("--stub-port", type=int, default=8112)
+    parser.add_argument("--env", action="append", default=[], help="dodatkowa zmienna dla API, np. WAFAM_CHAT_TIMEOUT=5")
+    args = parser.parse_args()
+
+    with open(os.path.join(script_dir, 'conversations.json'), 'r', encoding='utf-8') as f:
+        questions = [turn for conversation in json.load(f) for turn in conversation]
+
+    workdir = tempfile.mkdtemp(prefix="wafam_chaos_")
+    stub_url = f"http://127.0.0.1:{args.stub_port}"
+    api_url = f"http://127.0.0.1:{args.api_port}"
+    env = dict(os.environ)
+    env.update({
+        "OPENAI_API_KEY": "sk-stub",
+        "OPENAI_BASE_URL": f"{stub_url}/v1",
+        "ANONYMIZED_TELEMETRY": "False",
+        "STUB_CHAT_LATENCY_MS": "300",
+        "WAFAM_LEADS_DB": os.path.join(workdir, "leads.db"),
+        "WAFAM_SESSION_PATH": os.path.join(workdir, "sessions.db"),
+        "WAFAM_CONVERSATION_LOG": os.path.join(workdir, "conversations"),
+        "WAFAM_EMBEDDING_CACHE_PATH": "",
+        # Bez cache odpowiedzi - każde pytanie idzie do modelu
+        "WAFAM_CACHE_BACKEND": "off",
+        "WAFAM_SEARCH_MODE": "hybrid",
+        "WAFAM_METRICS": "1",
+        # Cały ruch z jednego adresu i szybkie tury sesji - limity zapytań wyłączone (kolejka zostaje)
+        "WAFAM_RATE_IP_PER_MIN": "0",
+        "WAFAM_RATE_SESSION_PER_MIN": "0",
+        # Krótsze limity niż produkcyjne - faza trwa kilkanaście sekund
+        "WAFAM_CHAT_TIMEOUT": "5",
+        "WAFAM_EMBED_TIMEOUT": "2",
+        "WAFAM_BREAKER_RESET": "5",
+    })
+    for item in args.env:
+        key, _, value = item.partition("=")
+        env[key] = value
+
+    stub = start_process(["stub_openai:app", "--port", str(args.stub_port)], script_dir, env,
+                         os.path.join(workdir, "stub.log"))
+    api = None
+    try:
+        wait_ready(f"{stub_url}/stats", stub)
+        api = start_process(["api:app", "--port", str(args.api_port)], src_dir, env,
+                            os.path.join(workdir, "api.log"))
+        wait_ready(f"{api_url}/ready", api)
+        results = asyncio.run(run_phases(api_url, stub_url, questions, args))
+    finally:
+        for process in (api, stub):
+            if process is not None:
+                process.terminate()
+                try:
+                    process.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    # Stub czeka na zawieszone zapytania z fazy "slow"
+                    process.kill()
+                    process.wait()
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    print("=" * 60)
+    print(f"Fazy po {args.phase_seconds:.0f} s, {args.concurrency} naraz")
+    for result in results:
+        latency = (f"p50 {result['p50_ms']:6.0f} ms, p95 {result['p95_ms']:6.0f} ms, max {result['max_ms']:6.0f} ms"
+                   if result["turns"] else "brak odpowiedzi")
+        answers = ", ".join(f"{labels.partition('=')[2].strip(QUOTE)} {value:.0f}"
+                            for labels, value in sorted(result["answers"].items()))
+        upstream = ", ".join(f"{labels} {value:.0f}" for labels, value in sorted(result["upstream"].items()))
+        print(f"{result['phase']:>8}: {result['turns']:4d} tur, błędy HTTP {result['errors']}, {latency}")
+        print(f"          odpowiedzi: {answers or '-'} | bezpieczniki: {result['breakers']}")
+        if upstream:
+            print(f"          upstream: {upstream}")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Ocena wyszukiwania: trafność (recall@k) i czas dla trybów vector / hybrid.
+
+Zestaw pytań z oznaczonymi fragmentami: data/eval_queries.json.
+Fragment uznajemy za trafiony, gdy zawiera któryś z podanych cytatów.
+
+Uruchomienie (API OpenAI albo stub_openai.py pod OPENAI_BASE_URL):
+    python eval_retrieval.py --k 2
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(script_dir, '..', 'src'))
+
+# Bez trwałego cache embeddingów - każdy tryb startuje "na zimno"
+os.environ["WAFAM_EMBEDDING_CACHE_PATH"] = ""
+
+import api  # noqa: E402
+
+eval_file = os.path.join(script_dir, '..', 'data', 'eval_queries.json')
+
+
+async def evaluate(mode: str, queries: list[dict], k: int) -> dict:
+    api.SEARCH_MODE = mode
+    api.embedding_cache.entries.clear()
+    api.embedding_cache.stats = {"hits": 0, "misses": 0}
+
+    found = 0
+    latencies = []
+    for item in queries:
+        start = time.perf_counter()
+        contexts, _ = await api.search_knowledge(item["query"], k=k)
+        latencies.append(time.perf_counter() - start)
+        if any(snippet in ctx for ctx in contexts for snippet in item["relevant"]):
+            found += 1
+
+    return {
+        "recall": found / len(queries),
+        "p50_ms": statistics.median(latencies) * 1000,
+        "mean_ms": statistics.mean(latencies) * 1000,
+        "embedding_calls": api.embedding_cache.stats["misses"],
+    }
+
+
+async def run_all(queries: list[dict], k: int):
+    # Jedna pętla zdarzeń dla wszystkich trybów (klient HTTP jest z nią związany)
+    await api.wait_ready()
+    return {mode: await evaluate(mode, queries, k) for mode in ["vector", "hybrid"]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ocena wyszukiwania vector vs hybrid")
+    parser.add_argument("--k", type=int, default=2)
+    args = parser.parse_args()
+
+    with open(eval_file, 'r', encoding='utf-8') as f:
+        queries = json.load(f)
+
+    print("=" * 60)
+    print(f"Pytania: {len(queries)}, k={args.k}, backend: {api.RETRIEVAL_BACKEND}")
+    print("=" * 60)
+    for mode, result in asyncio.run(run_all(queries, args.k)).items():
+        print(
+            f"{mode:7} recall@{args.k}: {result['recall']:.2f} | "
+            f"p50: {result['p50_ms']:.1f} ms | średnio: {result['mean_ms']:.1f} ms | "
+            f"embeddingi: {result['embedding_calls']}/{len(queries)}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Prosty test obciążeniowy endpointu /chat (lub /chat/stream).
+
+Wymaga uruchomionego API (najlepiej podpiętego pod stub_openai.py):
+    python load_test.py --url http://127.0.0.1:8000 --requests 400 --concurrency 100
+    python load_test.py --stream   # mierzy też czas do pierwszego tokenu
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+import httpx
+
+QUESTIONS = [
+    "Ile kosztują okna DECCO 82?",
+    "Czym różni się Salamander od DECCO 82?",
+    "Chcę umówić pomiar w Chorzowie",
+    "Jakie macie rolety?",
+    "Jakie są godziny otwarcia?",
+    "Czy robicie ciepły montaż?",
+    "Jakie kolory drzwi są dostępne?",
+    "Polecacie system HST czy PSK?",
+]
+
+
+def percentile(values: list[float], p: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+async def post_chat(client: httpx.AsyncClient, url: str, payload: dict):
+    response = await client.post(f"{url}/chat", json=payload)
+    response.raise_for_status()
+
+
+async def post_chat_stream(client: httpx.AsyncClient, url: str, payload: dict):
+    """Zwraca czas do pierwszego fragmentu odpowiedzi (event: delta)"""
+    start = time.perf_counter()
+    first_token = None
+    async with client.stream("POST", f"{url}/chat/stream", json=payload) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if first_token is None and line == "event: delta":
+                first_token = time.perf_counter() - start
+    return first_token
+
+
+async def run(url: str, total: int, concurrency: int, timeout: float, stream: bool = False):
+    latencies = []
+    first_tokens = []
+    errors = 0
+    queue = asyncio.Queue()
+    for i in range(total):
+        queue.put_nowait(i)
+
+    async def worker(client: httpx.AsyncClient):
+        nonlocal errors
+        while True:
+            try:
+                i = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            payload = {"text": random.choice(QUESTIONS), "session_id": f"bench_{i}"}
+            start = time.perf_counter()
+            try:
+                if stream:
+                    first_token = await post_chat_stream(client, url, payload)
+                    if first_token is not None:
+                        first_tokens.append(first_token)
+                else:
+                    await post_chat(client, url, payload)
+                latencies.append(time.perf_counter() - start)
+            except httpx.HTTPError:
+                errors += 1
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return latencies, first_tokens, errors, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Test obciążeniowy /chat")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--stream", action="store_true", help="użyj /chat/stream")
+    args = parser.parse_args()
+
+    latencies, first_tokens, errors, elapsed = asyncio.run(
+        run(args.url, args.requests, args.concurrency, args.timeout, args.stream)
+    )
+
+    print("=" * 50)
+    print(f"Zapytania: {len(latencies)} OK, {errors} błędów")
+    print(f"Czas: {elapsed:.2f} s")
+    if latencies:
+        print(f"Przepustowość: {len(latencies) / elapsed:.1f} req/s")
+        print(f"p50: {statistics.median(latencies) * 1000:.0f} ms")
+        print(f"p95: {percentile(latencies, 95) * 1000:.0f} ms")
+        print(f"p99: {percentile(latencies, 99) * 1000:.0f} ms")
+    if first_tokens:
+        print(f"Pierwszy token p50: {statistics.median(first_tokens) * 1000:.0f} ms")
+        print(f"Pierwszy token p99: {percentile(first_tokens, 99) * 1000:.0f} ms")
+    print("=" * 50)
+
+
+if __name__ == "__main__":
+    main()
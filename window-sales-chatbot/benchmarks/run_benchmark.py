@@ -0,0 +1,309 @@
+"""Powtarzalny benchmark całego API bez dostępu do sieci.
+
+Skrypt sam uruchamia stub_openai.py i api:app (osobne procesy, osobne
+porty, bazy leadów / sesji / cache w katalogu tymczasowym), po czym
+odtwarza rozmowy z conversations.json - każda rozmowa to jedna sesja,
+tury wysyłane po kolei. Na koniec raport:
+    - przepustowość i p50/p95/p99 pojedynczej tury,
+    - czasy etapów z /metrics (embedding, retrieval, llm, session_save...),
+    - przyrost pamięci procesu API na 1000 sesji.
+
+Uruchomienie:
+    cd window-sales-chatbot/benchmarks
+    python run_benchmark.py --conversations 400 --concurrency 50
+    python run_benchmark.py --chat-latency 100 --env WAFAM_SEARCH_MODE=hybrid --output wynik.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from load_test import percentile
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+src_dir = os.path.join(script_dir, '..', 'src')
+chroma_dir = os.path.join(script_dir, '..', 'knowledge_base')
+conversations_file = os.path.join(script_dir, 'conversations.json')
+
+COUNTER_RE = re.compile(r'^(wafam_llm_tokens_total|wafam_prompt_tokens_total|wafam_chat_requests_total)\{\w+="(\w+)"\} (\S+)$')
+METRIC_RE = re.compile(r'^wafam_stage_seconds_(sum|count|bucket)\{stage="(\w+)"(?:,le="([^"]+)")?\} (\S+)$')
+
+
+def rss_mb(pid: int):
+    """Pamięć rezydentna procesu w MB (tylko Linux, inaczej None)"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+
+def parse_stages(text: str) -> dict:
+    """Wyciągnij z /metrics sumę, liczbę i kubełki histogramu dla każdego etapu"""
+    stages = {}
+    for line in text.splitlines():
+        match = METRIC_RE.match(line)
+        if not match:
+            continue
+        kind, name, bound, value = match.groups()
+        stage = stages.setdefault(name, {"sum": 0.0, "count": 0, "buckets": {}})
+        if kind == "bucket":
+            stage["buckets"][bound] = float(value)
+        else:
+            stage[kind] = float(value)
+    return stages
+
+
+def parse_counters(text: str) -> dict:
+    """Liczniki tokenów i zapytań z /metrics: {(nazwa, etykieta): wartość}"""
+    counters = {}
+    for line in text.splitlines():
+        match = COUNTER_RE.match(line)
+        if match:
+            name, label, value = match.groups()
+            counters[(name, label)] = float(value)
+    return counters
+
+
+def token_report(before: dict, after: dict) -> dict:
+    """Średnia liczba tokenów promptu na jedno wywołanie modelu (całość i części)"""
+    def delta(key):
+        return after.get(key, 0) - before.get(key, 0)
+
+    calls = delta(("wafam_chat_requests_total", "llm"))
+    if not calls:
+        return {}
+    report = {
+        "llm_calls": int(calls),
+        "prompt_tokens": delta(("wafam_llm_tokens_total", "prompt")) / calls,
+        "cached_tokens": delta(("wafam_llm_tokens_total", "cached")) / calls,
+    }
+    for name, part in after:
+        if name == "wafam_prompt_tokens_total":
+            report[f"budget_{part}"] = delta((name, part)) / calls
+    return report
+
+
+def stage_report(before: dict, after: dict) -> dict:
+    """Różnica liczników z /metrics: średni czas i p95 (górna granica kubełka)"""
+    report = {}
+    for name, stage in after.items():
+        old = before.get(name, {"sum": 0.0, "count": 0, "buckets": {}})
+        count = stage["count"] - old["count"]
+        if count <= 0:
+            continue
+        p95 = None
+        for bound, value in stage["buckets"].items():
+            if value - old["buckets"].get(bound, 0) >= 0.95 * count:
+                p95 = bound
+                break
+        report[name] = {
+            "count": int(count),
+            "mean_ms": (stage["sum"] - old["sum"]) / count * 1000,
+            "p95_le": p95,
+        }
+    return report
+
+
+def start_process(args: list[str], cwd: str, env: dict, log_path: str):
+    log = open(log_path, "w")
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", *args, "--log-level", "warning"],
+        cwd=cwd, env=env, stdout=log, stderr=subprocess.STDOUT
+    )
+
+
+def wait_ready(url: str, process: subprocess.Popen, timeout: float = 120):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Proces {url} zakończył się (kod {process.returncode})")
+        try:
+            if httpx.get(url, timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.3)
+    raise RuntimeError(f"{url} nie odpowiada po {timeout} s")
+
+
+async def replay(url: str, conversations: list[list[str]], total: int, concurrency: int, timeout: float):
+    """Odtwórz `total` rozmów; równolegle najwyżej `concurrency` sesji"""
+    latencies = []
+    errors = 0
+    queue = asyncio.Queue()
+    for i in range(total):
+        queue.put_nowait(i)
+
+    async def worker(client: httpx.AsyncClient):
+        nonlocal errors
+        while True:
+            try:
+                i = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            session_id = f"bench_{i}"
+            for text in conversations[i % len(conversations)]:
+                start = time.perf_counter()
+                try:
+                    response = await client.post(f"{url}/chat", json={"text": text, "session_id": session_id})
+                    response.raise_for_status()
+                    latencies.append(time.perf_counter() - start)
+                except httpx.HTTPError:
+                    errors += 1
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return latencies, errors, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark API na lokalnym stubie OpenAI")
+    parser.add_argument("--conversations", type=int, default=400, help="liczba odtworzonych rozmów (= sesji)")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--api-port", type=int, default=8010)
+    parser.add_argument("--stub-port", type=int, default=8110)
+    parser.add_argument("--chat-latency", type=float, default=300, help="ms do pierwszego tokenu")
+    parser.add_argument("--tokens-per-sec", type=float, default=100)
+    parser.add_argument("--reply-tokens", type=int, default=60)
+    parser.add_argument("--embed-latency", type=float, default=40, help="ms na zapytanie o embeddingi")
+    parser.add_argument("--prefill-tokens-per-sec", type=float, default=0,
+                        help="czas czytania promptu przez stub (0 = bez wpływu długości promptu)")
+    parser.add_argument("--env", action="append", default=[], help="dodatkowa zmienna dla API, np. WAFAM_SEARCH_MODE=hybrid")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="zapisz wynik do pliku JSON (porównywanie między wersjami)")
+    args = parser.parse_args()
+
+    with open(conversations_file, 'r', encoding='utf-8') as f:
+        conversations = json.load(f)
+    random.Random(args.seed).shuffle(conversations)
+
+    workdir = tempfile.mkdtemp(prefix="wafam_bench_")
+    stub_url = f"http://127.0.0.1:{args.stub_port}"
+    api_url = f"http://127.0.0.1:{args.api_port}"
+
+    env = dict(os.environ)
+    env.update({
+        "OPENAI_API_KEY": "sk-stub",
+        "OPENAI_BASE_URL": f"{stub_url}/v1",
+        "ANONYMIZED_TELEMETRY": "False",
+        "STUB_CHAT_LATENCY_MS": str(args.chat_latency),
+        "STUB_TOKENS_PER_SEC": str(args.tokens_per_sec),
+        "STUB_REPLY_TOKENS": str(args.reply_tokens),
+        "STUB_EMBED_LATENCY_MS": str(args.embed_latency),
+        "STUB_PREFILL_TOKENS_PER_SEC": str(args.prefill_tokens_per_sec),
+        # Świeże bazy przy każdym przebiegu - wyniki nie zależą od poprzednich
+        "WAFAM_LEADS_DB": os.path.join(workdir, "leads.db"),
+        "WAFAM_SESSION_PATH": os.path.join(workdir, "sessions.db"),
+        "WAFAM_CACHE_PATH": os.path.join(workdir, "response_cache.db"),
+        "WAFAM_CONVERSATION_LOG": os.path.join(workdir, "conversations"),
+        "WAFAM_EMBEDDING_CACHE_PATH": "",
+        "WAFAM_METRICS": "1",
+        # Cały ruch z jednego adresu i szybkie tury sesji - limity zapytań wyłączone (kolejka zostaje)
+        "WAFAM_RATE_IP_PER_MIN": "0",
+        "WAFAM_RATE_SESSION_PER_MIN": "0",
+    })
+    for item in args.env:
+        key, _, value = item.partition("=")
+        env[key] = value
+
+    stub = start_process(["stub_openai:app", "--port", str(args.stub_port)], script_dir, env,
+                         os.path.join(workdir, "stub.log"))
+    api = None
+    try:
+        wait_ready(f"{stub_url}/stats", stub)
+        if not os.path.isdir(chroma_dir):
+            print("Brak bazy wektorowej - buduję ją na stubie...")
+            subprocess.run([sys.executable, "build_vectordb.py"], cwd=src_dir, env=env, check=True,
+                           stdout=subprocess.DEVNULL)
+
+        api = start_process(["api:app", "--port", str(args.api_port)], src_dir, env,
+                            os.path.join(workdir, "api.log"))
+        wait_ready(f"{api_url}/", api)
+
+        # Rozgrzewka: pierwsze zapytanie ładuje leniwe części klientów i indeksów
+        httpx.post(f"{api_url}/chat", json={"text": "Dzień dobry", "session_id": "warmup"}, timeout=args.timeout)
+        metrics_before = httpx.get(f"{api_url}/metrics").text
+        memory_before = rss_mb(api.pid)
+
+        latencies, errors, elapsed = asyncio.run(
+            replay(api_url, conversations, args.conversations, args.concurrency, args.timeout)
+        )
+
+        memory_after = rss_mb(api.pid)
+        metrics_after = httpx.get(f"{api_url}/metrics").text
+        stages = stage_report(parse_stages(metrics_before), parse_stages(metrics_after))
+        tokens = token_report(parse_counters(metrics_before), parse_counters(metrics_after))
+    finally:
+        for process in (api, stub):
+            if process is not None:
+                process.terminate()
+                process.wait(timeout=10)
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    result = {
+        "conversations": args.conversations,
+        "concurrency": args.concurrency,
+        "turns_ok": len(latencies),
+        "errors": errors,
+        "elapsed_s": elapsed,
+        "throughput_rps": len(latencies) / elapsed if elapsed else 0,
+        "p50_ms": statistics.median(latencies) * 1000 if latencies else None,
+        "p95_ms": percentile(latencies, 95) * 1000 if latencies else None,
+        "p99_ms": percentile(latencies, 99) * 1000 if latencies else None,
+        "memory_before_mb": memory_before,
+        "memory_after_mb": memory_after,
+        "memory_per_1k_sessions_mb": (
+            (memory_after - memory_before) / args.conversations * 1000
+            if memory_before is not None and memory_after is not None else None
+        ),
+        "stages": stages,
+        "tokens": tokens,
+        "env": args.env,
+    }
+
+    print("=" * 60)
+    print(f"Rozmowy: {args.conversations} (równolegle {args.concurrency}), "
+          f"tury: {result['turns_ok']} OK, {errors} błędów, czas {elapsed:.1f} s")
+    if latencies:
+        print(f"Przepustowość: {result['throughput_rps']:.1f} tur/s | "
+              f"p50 {result['p50_ms']:.0f} ms | p95 {result['p95_ms']:.0f} ms | p99 {result['p99_ms']:.0f} ms")
+    if result["memory_per_1k_sessions_mb"] is not None:
+        print(f"Pamięć API: {memory_before:.1f} -> {memory_after:.1f} MB "
+              f"({result['memory_per_1k_sessions_mb']:.1f} MB / 1000 sesji)")
+    if tokens:
+        parts = ", ".join(f"{k[7:]} {v:.0f}" for k, v in tokens.items() if k.startswith("budget_"))
+        print(f"Prompt: {tokens['prompt_tokens']:.0f} tokenów / wywołanie modelu, z cache {tokens['cached_tokens']:.0f} "
+              f"({tokens['llm_calls']} wywołań)"
+              + (f" | budżet: {parts}" if parts else ""))
+    print("-" * 60)
+    print(f"{'etap':16} {'liczba':>7} {'średnio':>10} {'p95 <=':>8}")
+    for name, stage in sorted(stages.items(), key=lambda item: -item[1]["mean_ms"]):
+        print(f"{name:16} {stage['count']:>7} {stage['mean_ms']:>8.1f} ms {stage['p95_le'] or '-':>8}")
+    print("=" * 60)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"Wynik zapisany w: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+"""Lokalny serwer udający API OpenAI (chat + embeddings) do testów obciążeniowych.
+
+Uruchomienie:
+    cd window-sales-chatbot/benchmarks
+    uvicorn stub_openai:app --port 8100
+
+Parametry (zmienne środowiskowe):
+    STUB_CHAT_LATENCY_MS   - opóźnienie przed pierwszym tokenem odpowiedzi (domyślnie 300)
+    STUB_TOKENS_PER_SEC    - szybkość generowania tokenów (domyślnie 100)
+    STUB_REPLY_TOKENS      - liczba tokenów w odpowiedzi (domyślnie 60)
+    STUB_EMBED_LATENCY_MS  - opóźnienie zapytania o embeddingi (domyślnie 40)
+    STUB_EMBED_INPUT_MS    - dodatkowe opóźnienie na każdy tekst w zapytaniu (domyślnie 0)
+    STUB_PREFILL_TOKENS_PER_SEC - szybkość "czytania" promptu; dłuższy prompt = później
+                             pierwszy token (domyślnie 0 - bez tego opóźnienia)
+    STUB_CACHE_MIN_TOKENS  - cache promptów jak w OpenAI: prefiks od tylu tokenów,
+                             dalej co 128 (domyślnie 1024, 0 = wyłączony). Tokeny
+                             z cache nie wliczają się do czasu czytania promptu.
+    STUB_EMBED_DIM         - wymiar wektorów (domyślnie 1536)
+
+Wstrzykiwanie awarii (też w trakcie działania: POST /faults z tymi polami):
+    STUB_FAIL_RATE         - odsetek zapytań kończonych błędem (domyślnie 0)
+    STUB_FAIL_STATUS       - kod tego błędu (domyślnie 503; np. 429, 500)
+    STUB_HANG_RATE         - odsetek zapytań zawieszanych (domyślnie 0)
+    STUB_HANG_SECONDS      - jak długo wisi zawieszone zapytanie (domyślnie 60)
+    STUB_FAULT_TARGET      - czego dotyczą awarie: all / chat / embeddings (domyślnie all)
+"""
+import asyncio
+import base64
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import struct
+import time
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+CHAT_LATENCY_MS = float(os.getenv("STUB_CHAT_LATENCY_MS", "300"))
+TOKENS_PER_SEC = float(os.getenv("STUB_TOKENS_PER_SEC", "100"))
+REPLY_TOKENS = int(os.getenv("STUB_REPLY_TOKENS", "60"))
+EMBED_LATENCY_MS = float(os.getenv("STUB_EMBED_LATENCY_MS", "40"))
+EMBED_INPUT_MS = float(os.getenv("STUB_EMBED_INPUT_MS", "0"))
+EMBED_DIM = int(os.getenv("STUB_EMBED_DIM", "1536"))
+PREFILL_TOKENS_PER_SEC = float(os.getenv("STUB_PREFILL_TOKENS_PER_SEC", "0"))
+CACHE_MIN_TOKENS = int(os.getenv("STUB_CACHE_MIN_TOKENS", "1024"))
+CACHE_STEP_TOKENS = 128
+
+REPLY_WORDS = (
+    "Dziękuję za pytanie. Nasze okna DECCO 82 i Salamander dobrze trzymają ciepło, "
+    "a wycenę przygotujemy bezpłatnie po pomiarze. Z jakiej miejscowości Pan dzwoni "
+    "i ile okien planuje wymienić? Handlowiec chętnie doradzi najlepsze rozwiązanie."
+).split()
+
+app = FastAPI(title="Stub OpenAI")
+
+stats = {"chat": 0, "embeddings": 0, "embedding_inputs": 0, "cached_tokens": 0, "failed": 0, "hung": 0}
+faults = {
+    "fail_rate": float(os.getenv("STUB_FAIL_RATE", "0")),
+    "fail_status": int(os.getenv("STUB_FAIL_STATUS", "503")),
+    "hang_rate": float(os.getenv("STUB_HANG_RATE", "0")),
+    "hang_seconds": float(os.getenv("STUB_HANG_SECONDS", "60")),
+    "target": os.getenv("STUB_FAULT_TARGET", "all"),
+}
+# Hasze prefiksów promptów widzianych wcześniej (symulacja cache promptów)
+seen_prefixes = set()
+
+
+def fake_embedding(text: str) -> list[float]:
+    """Deterministyczny wektor z haszowania słów (podobne teksty -> podobne wektory)"""
+    vector = [0.0] * EMBED_DIM
+    for word in re.findall(r"\w+", text.lower()):
+        digest = hashlib.md5(word.encode("utf-8")).digest()
+        index = int.from_bytes(digest[:4], "little") % EMBED_DIM
+        vector[index] += 1.0 if digest[4] % 2 else -1.0
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+async def inject_fault(endpoint: str):
+    """Odpowiedź z błędem albo zawieszenie zapytania wg `faults`; None = obsłuż normalnie"""
+    if faults["target"] not in ("all", endpoint):
+        return None
+    if random.random() < faults["hang_rate"]:
+        stats["hung"] += 1
+        await asyncio.sleep(faults["hang_seconds"])
+    if random.random() < faults["fail_rate"]:
+        stats["failed"] += 1
+        error = {"message": "Stub: wstrzyknięta awaria", "type": "server_error", "code": None}
+        return JSONResponse({"error": error}, status_code=faults["fail_status"])
+    return None
+
+
+def reply_tokens() -> list[str]:
+    words = (REPLY_WORDS * (REPLY_TOKENS // len(REPLY_WORDS) + 1))[:REPLY_TOKENS]
+    return [w if i == 0 else " " + w for i, w in enumerate(words)]
+
+
+def prompt_text(body: dict) -> str:
+    return "".join(f"{m.get('role')}:{m.get('content') or ''}\n" for m in body.get("messages", []))
+
+
+def cached_prefix_tokens(prompt: str) -> int:
+    """Najdłuższy wcześniej widziany prefiks (1 token = 4 znaki); zapamiętaj prefiksy tego promptu"""
+    if not CACHE_MIN_TOKENS:
+        return 0
+    cached = 0
+    length = CACHE_MIN_TOKENS
+    while length * 4 <= len(prompt):
+        digest = hashlib.md5(prompt[:length * 4].encode("utf-8")).digest()
+        if digest in seen_prefixes:
+            cached = length
+        else:
+            seen_prefixes.add(digest)
+        length += CACHE_STEP_TOKENS
+    return cached
+
+
+def first_token_delay(prompt_tokens: int, cached_tokens: int) -> float:
+    delay = CHAT_LATENCY_MS / 1000
+    if PREFILL_TOKENS_PER_SEC:
+        delay += (prompt_tokens - cached_tokens) / PREFILL_TOKENS_PER_SEC
+    return delay
+
+
+def usage(prompt_tokens: int, cached_tokens: int, completion_tokens: int) -> dict:
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+        "prompt_tokens_details": {"cached_tokens": cached_tokens},
+    }
+
+
+@app.post("/v1/embeddings")
+async def embeddings(request: Request):
+    if fault := await inject_fault("embeddings"):
+        return fault
+    body = await request.json()
+    inputs = body["input"]
+    if isinstance(inputs, str):
+        inputs = [inputs]
+
+    stats["embeddings"] += 1
+    stats["embedding_inputs"] += len(inputs)
+    await asyncio.sleep((EMBED_LATENCY_MS + EMBED_INPUT_MS * len(inputs)) / 1000)
+
+    data = []
+    for i, text in enumerate(inputs):
+        vector = fake_embedding(str(text))
+        if body.get("encoding_format") == "base64":
+            vector = base64.b64encode(struct.pack(f"<{len(vector)}f", *vector)).decode()
+        data.append({"object": "embedding", "index": i, "embedding": vector})
+
+    return {
+        "object": "list",
+        "data": data,
+        "model": body.get("model", "stub"),
+        "usage": {"prompt_tokens": 0, "total_tokens": 0},
+    }
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    if fault := await inject_fault("chat"):
+        return fault
+    body = await request.json()
+    stats["chat"] += 1
+    prompt = prompt_text(body)
+    prompt_tokens = len(prompt) // 4
+    cached_tokens = cached_prefix_tokens(prompt)
+    stats["cached_tokens"] += cached_tokens
+    tokens = reply_tokens()
+
+    if body.get("stream"):
+        include_usage = (body.get("stream_options") or {}).get("include_usage")
+        return StreamingResponse(
+            stream_chunks(body, tokens, prompt_tokens, cached_tokens, include_usage),
+            media_type="text/event-stream",
+        )
+
+    await asyncio.sleep(first_token_delay(prompt_tokens, cached_tokens))
+    await asyncio.sleep(len(tokens) / TOKENS_PER_SEC)
+
+    return {
+        "id": f"chatcmpl-stub-{stats['chat']}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "stub"),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": "".join(tokens)},
+            "finish_reason": "stop",
+        }],
+        "usage": usage(prompt_tokens, cached_tokens, len(tokens)),
+    }
+
+
+async def stream_chunks(body: dict, tokens: list[str], prompt_tokens: int, cached_tokens: int,
+                        include_usage: bool):
+    """Odpowiedź strumieniowa w formacie SSE, token po tokenie"""
+    base = {
+        "id": f"chatcmpl-stub-{stats['chat']}",
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": body.get("model", "stub"),
+    }
+
+    def chunk(delta: dict, finish_reason=None) -> str:
+        choices = [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+        return f"data: {json.dumps({**base, 'choices': choices})}\n\n"
+
+    await asyncio.sleep(first_token_delay(prompt_tokens, cached_tokens))
+    yield chunk({"role": "assistant", "content": ""})
+    for token in tokens:
+        yield chunk({"content": token})
+        await asyncio.sleep(1 / TOKENS_PER_SEC)
+    yield chunk({}, "stop")
+    if include_usage:
+        payload = {**base, "choices": [], "usage": usage(prompt_tokens, cached_tokens, len(tokens))}
+        yield f"data: {json.dumps(payload)}\n\n"
+    yield "data: [DONE]\n\n"
+
+
+@app.get("/stats")
+def get_stats():
+    return stats
+
+
+@app.get("/faults")
+def get_faults():
+    return faults
+
+
+@app.post("/faults")
+async def set_faults(request: Request):
+    """Zmiana awarii w trakcie testu, np. {"fail_rate": 1.0} - pełna awaria"""
+    faults.update(await request.json())
+    return faults
@@ -0,0 +1,277 @@
+"""Kontrola przyjęć /chat: limity zapytań i kolejka z priorytetami.
+
+Przy nagłym ruchu każde zapytanie czekało tak samo (na pulę wątków, na
+limit OpenAI) - klient wpisujący numer telefonu stał za botami i spamem.
+Teraz wiadomość przechodzi najpierw przez limity (token bucket na sesję
+i na adres IP), potem dostaje jedno z `max_active` miejsc. Gdy miejsc
+brak, czeka w kolejce ograniczonej do `max_queue`. Pełna kolejka albo
+szacowane czekanie dłuższe niż `queue_timeout` kończy się od razu błędem
+Overloaded (API: 429 z Retry-After) zamiast coraz dłuższych odpowiedzi
+dla wszystkich.
+
+Kolejka ma priorytety: wiadomość z telefonem/e-mailem, potem sesja, która
+już coś zebrała (produkt, kontakt), na końcu reszta. Przy pełnej kolejce
+wiadomość z wyższym priorytetem wypiera ostatnią z najniższym. Wiadomości
+z kontaktem mają dodatkowo `contact_reserve` miejsc ponad `max_active` -
+nie czekają, aż zwolni się miejsce zajęte przez wywołanie modelu.
+
+Każda grupa (tenant) ma własną kolejkę i najwyżej `group_limit` z
+`max_active` miejsc, a jej kolejka - proporcjonalną część `max_queue`.
+Zalew u jednego dealera zapełnia tylko jego kolejkę, a zwolnione miejsce
+dostaje najlepszy czekający z grup, które nie wyczerpały swojej części.
+"""
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from collections import OrderedDict
+
+# Priorytety kolejki (mniejszy - wcześniej)
+PRIORITY_CONTACT = 0
+PRIORITY_LEAD = 1
+PRIORITY_DEFAULT = 2
+# Odtwarzanie rozmów (/chat/batch) - zawsze za ruchem klientów
+PRIORITY_BATCH = 3
+PRIORITY_NAMES = {PRIORITY_CONTACT: "contact", PRIORITY_LEAD: "lead", PRIORITY_DEFAULT: "default",
+                  PRIORITY_BATCH: "batch"}
+
+
+class Overloaded(Exception):
+    """Wiadomość nieprzyjęta: limit zapytań, pełna kolejka albo za długie czekanie"""
+
+    def __init__(self, reason: str, retry_after: float):
+        self.reason = reason
+        self.retry_after = max(1, math.ceil(retry_after))
+        super().__init__(f"{reason}: spróbuj ponownie za {self.retry_after} s")
+
+
+class RateLimiter:
+    """Token bucket na klucz (sesja, adres IP): `per_minute` zapytań na minutę, najwyżej `burst` naraz"""
+
+    def __init__(self, per_minute: float, burst: int, max_keys: int = 100000):
+        self.rate = per_minute / 60
+        self.burst = burst
+        self.max_keys = max_keys
+        self.buckets = OrderedDict()
+
+    def take(self, key: str, now: float = None) -> float:
+        """0 - zapytanie mieści się w limicie; inaczej sekundy do kolejnego żetonu"""
+        if self.rate <= 0:
+            return 0.0
+        now = time.monotonic() if now is None else now
+        tokens, last = self.buckets.pop(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - last) * self.rate)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / self.rate
+        self.buckets[key] = (tokens, now)
+        if len(self.buckets) > self.max_keys:
+            # Najdawniej widziany klucz - jego kubełek zdążył się już zwykle napełnić
+            self.buckets.popitem(last=False)
+        return wait
+
+    def __len__(self):
+        return len(self.buckets)
+
+
+class Ticket:
+    """Zajęte miejsce; release() (albo koniec bloku with) oddaje je następnemu w kolejce"""
+
+    def __init__(self, admission: "Admission", group=None):
+        self.admission = admission
+        self.group = group
+        self.started = time.monotonic()
+        self.released = False
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self.admission.release(self.group, time.monotonic() - self.started)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class Admission:
+    """Limity zapytań i kolejka z priorytetami przed obsługą wiadomości.
+
+    `on_event(event, priority)` dostaje: admitted, queued, rate_limited,
+    queue_full, too_slow, shed, timeout (np. do liczników w /metrics).
+    """
+
+    def __init__(self, max_active: int, max_queue: int, queue_timeout: float, contact_reserve: int = 0,
+                 session_limiter: RateLimiter = None, ip_limiter: RateLimiter = None,
+                 max_lead_sessions: int = 100000, on_event=None):
+        self.max_active = max_active
+        self.contact_reserve = contact_reserve
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.session_limiter = session_limiter
+        self.ip_limiter = ip_limiter
+        self.max_lead_sessions = max_lead_sessions
+        self.on_event = on_event or (lambda event, priority: None)
+        self.active = 0
+        # Na grupę: kopiec [priorytet, kolejność, future] (kolejność rozstrzyga remisy - FIFO),
+        # zajęte miejsca i limit miejsc
+        self.queues = {}
+        self.group_active = {}
+        self.group_limits = {}
+        self.order = itertools.count()
+        # Średni czas zajęcia miejsca (EWMA) - do szacowania Retry-After
+        self.service_time = 1.0
+        # Sesje z zebranymi danymi (klucz sesji -> None, LRU)
+        self.lead_sessions = OrderedDict()
+
+    def remember(self, session_key: str):
+        """Sesja zebrała dane (produkt, kontakt) - jej kolejne wiadomości mają pierwszeństwo"""
+        self.lead_sessions[session_key] = None
+        self.lead_sessions.move_to_end(session_key)
+        if len(self.lead_sessions) > self.max_lead_sessions:
+            self.lead_sessions.popitem(last=False)
+
+    def forget(self, session_key: str):
+        self.lead_sessions.pop(session_key, None)
+
+    def priority(self, session_key: str, has_contact: bool) -> int:
+        if has_contact:
+            return PRIORITY_CONTACT
+        if session_key in self.lead_sessions:
+            return PRIORITY_LEAD
+        return PRIORITY_DEFAULT
+
+    def check_limits(self, session_key: str, client: str, priority: int):
+        """Overloaded, gdy sesja albo adres IP przekroczy limit.
+
+        Wiadomość z kontaktem omija limit sesji (klient po kilku szybkich
+        pytaniach podaje numer), limit adresu IP obowiązuje zawsze.
+        """
+        wait = 0.0
+        if self.ip_limiter is not None:
+            wait = self.ip_limiter.take(client)
+        if not wait and self.session_limiter is not None and priority != PRIORITY_CONTACT:
+            wait = self.session_limiter.take(session_key)
+        if wait:
+            self.on_event("rate_limited", priority)
+            raise Overloaded("rate_limited", wait)
+
+    async def admit(self, session_key: str, client: str, has_contact: bool = False,
+                    group=None, group_limit: int = 0, priority: int = None) -> Ticket:
+        """Miejsce na obsługę wiadomości (po limitach i ewentualnym czekaniu w kolejce grupy).
+
+        `group_limit` - ile z `max_active` miejsc może zająć grupa (0 - wszystkie).
+        `priority` podany wprost (np. PRIORITY_BATCH) - bez limitów zapytań, grupa ma własny limit miejsc.
+        """
+        if priority is None:
+            priority = self.priority(session_key, has_contact)
+            self.check_limits(session_key, client, priority)
+        self.group_limits[group] = min(group_limit, self.max_active) if group_limit > 0 else self.max_active
+        await self.acquire(priority, group)
+        self.on_event("admitted", priority)
+        return Ticket(self, group)
+
+    def reserve(self, priority: int) -> int:
+        return self.contact_reserve if priority == PRIORITY_CONTACT else 0
+
+    def has_room(self, priority: int, group) -> bool:
+        return (self.active < self.max_active + self.reserve(priority)
+                and self.group_active.get(group, 0) < self.group_limits[group] + self.reserve(priority))
+
+    def take(self, group):
+        self.active += 1
+        self.group_active[group] = self.group_active.get(group, 0) + 1
+
+    async def acquire(self, priority: int, group=None):
+        queue = self.queues.setdefault(group, [])
+        if self.max_active <= 0 or (self.has_room(priority, group) and not (queue and queue[0][0] <= priority)):
+            self.take(group)
+            return
+        wait = self.expected_wait(priority, group)
+        if wait > self.queue_timeout:
+            # I tak skończyłoby się timeoutem - lepiej od razu
+            self.on_event("too_slow", priority)
+            raise Overloaded("too_slow", wait)
+        if len(queue) >= self.group_max_queue(group):
+            worst = max(queue) if queue else None
+            if worst is None or worst[0] <= priority:
+                self.on_event("queue_full", priority)
+                raise Overloaded("queue_full", self.retry_after(group))
+            # Ostatni z najniższym priorytetem w tej grupie ustępuje miejsca
+            queue.remove(worst)
+            heapq.heapify(queue)
+            self.on_event("shed", worst[0])
+            worst[2].set_exception(Overloaded("shed", self.retry_after(group)))
+
+        future = asyncio.get_running_loop().create_future()
+        entry = [priority, next(self.order), future]
+        heapq.heappush(queue, entry)
+        self.on_event("queued", priority)
+        try:
+            await asyncio.wait_for(future, self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.remove(entry, group)
+            self.on_event("timeout", priority)
+            raise Overloaded("timeout", self.retry_after(group))
+        except asyncio.CancelledError:
+            # Klient się rozłączył - miejsce przydzielone w ostatniej chwili idzie dalej
+            if future.done() and not future.cancelled() and future.exception() is None:
+                self.release(group)
+            else:
+                self.remove(entry, group)
+            raise
+
+    def remove(self, entry: list, group=None):
+        queue = self.queues.get(group, [])
+        if entry in queue:
+            queue.remove(entry)
+            heapq.heapify(queue)
+
+    def release(self, group=None, elapsed: float = None):
+        if elapsed is not None:
+            self.service_time += 0.1 * (elapsed - self.service_time)
+        self.active -= 1
+        self.group_active[group] -= 1
+        # Wolne miejsca dla czekających - najlepszy z grup, które mają jeszcze miejsce
+        while True:
+            heads = [(queue[0], name) for name, queue in self.queues.items()
+                     if queue and self.has_room(queue[0][0], name)]
+            if not heads:
+                return
+            entry, name = min(heads, key=lambda head: head[0][:2])
+            heapq.heappop(self.queues[name])
+            if not entry[2].done():
+                self.take(name)
+                entry[2].set_result(None)
+
+    def group_max_queue(self, group) -> int:
+        """Część `max_queue` proporcjonalna do części miejsc grupy"""
+        return max(1, self.max_queue * self.group_limits[group] // self.max_active)
+
+    def expected_wait(self, priority: int, group=None) -> float:
+        """Szacowane czekanie w kolejce: czekający z tym samym albo wyższym priorytetem są pierwsi"""
+        ahead = sum(1 for entry in self.queues.get(group, []) if entry[0] <= priority)
+        return self.service_time * (ahead + 1) / self.group_limits.get(group, self.max_active)
+
+    def retry_after(self, group=None) -> float:
+        """Szacowany czas do zwolnienia miejsca dla nowej wiadomości w grupie"""
+        slots = self.group_limits.get(group, self.max_active) if self.max_active > 0 else 1
+        return self.service_time * (len(self.queues.get(group, [])) + 1) / slots
+
+    def get_stats(self) -> dict:
+        queued = {name: 0 for name in PRIORITY_NAMES.values()}
+        for queue in self.queues.values():
+            for priority, _, _ in queue:
+                queued[PRIORITY_NAMES[priority]] += 1
+        return {
+            "active": self.active,
+            "max_active": self.max_active,
+            **{f"queued_{name}": count for name, count in queued.items()},
+            "max_queue": self.max_queue,
+            "service_seconds": round(self.service_time, 3),
+            "lead_sessions": len(self.lead_sessions),
+        }
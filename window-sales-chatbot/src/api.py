@@ -1,45 +1,284 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask
 from pydantic import BaseModel
-from openai import OpenAI
 from dotenv import load_dotenv
-from langchain_openai import OpenAIEmbeddings
-from langchain_community.vectorstores import Chroma
+from contextlib import asynccontextmanager
 from datetime import datetime
 import os
-import re
+import hashlib
+import secrets
 import json
+import asyncio
+import csv
+import io
+import time
+
+from response_cache import create_response_cache
+from retrieval import INDEX_FILE, EmbeddingCache, MmapIndex, NumpyIndex
+from embedding_batcher import EmbeddingBatcher
+from knowledge_base import KnowledgeBase, active_dir, check_embedder
+from embedders import embedder_from_env
+from upstream import CircuitBreaker, RetryBudget, Upstream, UpstreamUnavailable
+from lexical import BM25Index, fuse
+from extractor import Extraction, Extractor, load_keywords
+from prompt_builder import PromptBuilder, TokenCounter, build_catalogue, fold_summary
+from lead_store import COLUMNS as LEAD_COLUMNS, LeadStore
+from session_store import create_session_store
+from replay import group_sessions, replay_sessions
+from metrics import current_timings, inc, record_stage, registry, server_timing, stage, start_request
+from metrics import ENABLED as METRICS_ENABLED
+from conversation_log import ConversationLog
+from fast_path import FastPath
+from admission import PRIORITY_BATCH, PRIORITY_NAMES, Admission, Overloaded, RateLimiter
+from tenants import Tenant, TenantRegistry, UnknownTenant, tenant_paths
 
 # Wczytaj klucz API
 env_path = os.path.join(os.path.dirname(__file__), '..', '.env')
 load_dotenv(env_path)
 
-# Klient OpenAI
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# Klient OpenAI, embedder, baza wektorowa (domyślnego tenanta) i cache embeddingów -
+# ładowane w tle po starcie serwera (load_components); import modułu zostaje szybki
+client = None
+http_client = None
+embeddings = None
+knowledge_base = None
+embedding_cache = None
+
+# Limity współbieżności (ile zapytań naraz do OpenAI i do bazy wektorowej)
+LLM_CONCURRENCY = int(os.getenv("WAFAM_LLM_CONCURRENCY", "64"))
+RETRIEVAL_CONCURRENCY = int(os.getenv("WAFAM_RETRIEVAL_CONCURRENCY", "32"))
+
+llm_semaphore = asyncio.Semaphore(LLM_CONCURRENCY)
+retrieval_semaphore = asyncio.Semaphore(RETRIEVAL_CONCURRENCY)
+
+# Połączenia z OpenAI: wspólna pula (keep-alive) i limity czasu w sekundach
+HTTP_MAX_CONNECTIONS = int(os.getenv("WAFAM_HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("WAFAM_HTTP_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("WAFAM_HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("WAFAM_HTTP_CONNECT_TIMEOUT", "3"))
+CHAT_TIMEOUT = float(os.getenv("WAFAM_CHAT_TIMEOUT", "30"))
+EMBED_TIMEOUT = float(os.getenv("WAFAM_EMBED_TIMEOUT", "5"))
+
+# Ponowienia (z losowym opóźnieniem, najwyżej WAFAM_RETRY_BUDGET wywołań)
+# i bezpiecznik - po WAFAM_BREAKER_FAILURES błędach z rzędu odpowiedź awaryjna
+# przez WAFAM_BREAKER_RESET s (patrz upstream.py)
+RETRY_ATTEMPTS = int(os.getenv("WAFAM_RETRY_ATTEMPTS", "3"))
+RETRY_BASE_DELAY = float(os.getenv("WAFAM_RETRY_BASE_DELAY", "0.2"))
+RETRY_BUDGET = float(os.getenv("WAFAM_RETRY_BUDGET", "0.2"))
+BREAKER_FAILURES = int(os.getenv("WAFAM_BREAKER_FAILURES", "5"))
+BREAKER_RESET = float(os.getenv("WAFAM_BREAKER_RESET", "15"))
+
+# Funkcja rozpoznająca błędy przejściowe (warto ponowić): timeout, połączenie, 429, 5xx
+def is_transient(error: Exception) -> bool:
+    import openai
+    if isinstance(error, (openai.APITimeoutError, openai.APIConnectionError, openai.RateLimitError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+# Funkcja rozpoznająca błędy trwałe (zły lub unieważniony klucz, brak uprawnień) - odpowiedź awaryjna
+def is_fatal(error: Exception) -> bool:
+    import openai
+    return isinstance(error, (openai.AuthenticationError, openai.PermissionDeniedError))
+
+# Funkcja zliczająca zdarzenia wywołań OpenAI (błędy, ponowienia, odrzucenia)
+def count_upstream_event(name: str, event: str):
+    inc("wafam_upstream_events_total", upstream=name, event=event)
+
+def create_upstream(name: str) -> Upstream:
+    return Upstream(
+        name,
+        is_transient,
+        attempts=RETRY_ATTEMPTS,
+        base_delay=RETRY_BASE_DELAY,
+        budget=RetryBudget(RETRY_BUDGET),
+        breaker=CircuitBreaker(BREAKER_FAILURES, BREAKER_RESET),
+        on_event=count_upstream_event,
+        fatal=is_fatal
+    )
+
+chat_upstream = create_upstream("chat")
+embedding_upstream = create_upstream("embedding")
 
 # Wczytaj bazę wektorową
 script_dir = os.path.dirname(os.path.abspath(__file__))
 chroma_dir = os.path.join(script_dir, '..', 'knowledge_base')
 leads_file = os.path.join(script_dir, '..', 'data', 'leads.json')
+leads_db = os.getenv("WAFAM_LEADS_DB", os.path.join(script_dir, '..', 'data', 'leads.db'))
+
+# Próg odległości wektorowej (WAFAM_VECTOR_MAX_DISTANCE albo domyślny dla embeddera)
+VECTOR_MAX_DISTANCE = None
+
+# Backend wyszukiwania: "chroma" (zapytanie do Chroma), "numpy" (wszystkie
+# wektory raz wczytane do macierzy w pamięci) albo "mmap" (plik index.bin
+# wersji bazy zmapowany w pamięci - jedna kopia dla wszystkich workerów)
+RETRIEVAL_BACKEND = os.getenv("WAFAM_RETRIEVAL_BACKEND", "chroma")
+
+def open_vectorstore(path: str):
+    """Otwórz wersję bazy wektorowej: (vectorstore albo None, indeks NumPy albo None)"""
+    # Wektory innego modelu są nieporównywalne - taka wersja jest odrzucana
+    check_embedder(path, embeddings.name)
+    index_path = os.path.join(path, INDEX_FILE)
+    if RETRIEVAL_BACKEND == "mmap" and os.path.exists(index_path):
+        # Bez Chroma - wersja bazy to tylko zmapowany plik
+        index = MmapIndex(index_path)
+        if index.meta["embedder"] != embeddings.name:
+            raise ValueError(f"{index_path} zbudowany embedderem {index.meta['embedder']}")
+        return None, index
+    if RETRIEVAL_BACKEND == "mmap":
+        print(f"Brak {index_path} (baza sprzed indeksu mmap) - wektory z Chroma w pamięci procesu")
+    from langchain_community.vectorstores import Chroma
+    store = Chroma(
+        persist_directory=path,
+        embedding_function=embeddings,
+        collection_name="wafam_knowledge"
+    )
+    index = NumpyIndex.from_chroma(store) if RETRIEVAL_BACKEND in ("numpy", "mmap") else None
+    return store, index
+
+# Tryb wyszukiwania: "vector" albo "hybrid" (BM25 + wektory)
+SEARCH_MODE = os.getenv("WAFAM_SEARCH_MODE", "vector")
+LEXICAL_STRONG_SCORE = float(os.getenv("WAFAM_LEXICAL_STRONG_SCORE", "6.0"))
+LEXICAL_MIN_SCORE = float(os.getenv("WAFAM_LEXICAL_MIN_SCORE", "3.0"))
+HYBRID_ALPHA = float(os.getenv("WAFAM_HYBRID_ALPHA", "0.5"))
+# Górna granica długości fragmentu w prompcie (prepare_knowledge.py tnie już do 120 tokenów;
+# dotyczy baz zbudowanych starszą wersją z długimi fragmentami)
+CONTEXT_MAX_TOKENS = int(os.getenv("WAFAM_CONTEXT_MAX_TOKENS", "150"))
+
+bm25_file = os.path.join(script_dir, '..', 'data', 'wafam_bm25.json')
+KB_RELOAD_INTERVAL = float(os.getenv("WAFAM_KB_RELOAD_INTERVAL", "5"))
+
+# Funkcja ładująca ciężkie komponenty (w wątku, w tle po starcie serwera)
+def load_components():
+    global client, http_client, embeddings, knowledge_base, embedding_cache, VECTOR_MAX_DISTANCE
+    global token_counter, prompt_builder, default_tenant
+    import httpx
+    from openai import AsyncOpenAI
+
+    # Budżet tokenów promptu: prompt systemowy + dane + fragmenty z bazy + historia
+    # (wczytanie kodowania tiktoken trwa - nie przy imporcie modułu)
+    token_counter = TokenCounter(CHAT_MODEL)
+    prompt_builder = PromptBuilder(
+        token_counter,
+        budget=int(os.getenv("WAFAM_PROMPT_TOKEN_BUDGET", "350")),
+        context_share=float(os.getenv("WAFAM_PROMPT_CONTEXT_SHARE", "0.7")),
+        summary_tokens=int(os.getenv("WAFAM_SUMMARY_TOKENS", "80")),
+        message_tokens=int(os.getenv("WAFAM_HISTORY_MESSAGE_TOKENS", "50")),
+        recent_messages=int(os.getenv("WAFAM_HISTORY_RECENT_MESSAGES", "2"))
+    )
+
+    # Domyślny tenant: prompt, indeks BM25, baza leadów (i jednorazowe przeniesienie leads.json)
+    default_tenant = tenant_registry.get()
+
+    # Jedna pula połączeń dla czatu i embeddingów (bez nowego TLS przy każdym pytaniu)
+    http_client = httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+        ),
+        timeout=httpx.Timeout(CHAT_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT)
+    )
 
-embeddings = OpenAIEmbeddings(
-    model="text-embedding-3-small",
-    openai_api_key=os.getenv("OPENAI_API_KEY")
+    # Klient OpenAI (asynchroniczny - nie blokuje wątków w trakcie odpowiedzi modelu).
+    # Własne ponowienia SDK wyłączone - ponawia Upstream (z budżetem i bezpiecznikiem)
+    client = AsyncOpenAI(
+        api_key=os.getenv("OPENAI_API_KEY"),
+        http_client=http_client,
+        max_retries=0,
+        timeout=CHAT_TIMEOUT
+    )
+
+    # Embedder pytań: OpenAI albo lokalny model (WAFAM_EMBEDDER, patrz embedders.py).
+    # Lokalny model liczy pierwszą paczkę przed przyjęciem ruchu.
+    embeddings = embedder_from_env(
+        timeout=EMBED_TIMEOUT,
+        max_retries=0,
+        http_async_client=http_client
+    )
+    embeddings.warmup()
+    VECTOR_MAX_DISTANCE = float(os.getenv("WAFAM_VECTOR_MAX_DISTANCE") or embeddings.max_distance)
+
+    # Aktywna wersja bazy - po przebudowie (build_vectordb.py) przeładowywana bez restartu
+    knowledge_base = KnowledgeBase(chroma_dir, open_vectorstore, check_every=KB_RELOAD_INTERVAL)
+    tenant_registry.add(DEFAULT_TENANT, knowledge_base)
+
+    # Cache embeddingów pytań (pusta ścieżka = tylko pamięć)
+    embedding_cache = EmbeddingCache(
+        max_entries=int(os.getenv("WAFAM_EMBEDDING_CACHE_SIZE", "5000")),
+        path=os.getenv("WAFAM_EMBEDDING_CACHE_PATH", os.path.join(script_dir, '..', 'data', 'embedding_cache.db')) or None,
+        model=embeddings.name
+    )
+    print("Baza wektorowa załadowana!")
+
+# Stan rozgrzewki (czas w sekundach od startu procesu do gotowości)
+startup = {"ready": False, "error": None, "seconds": None}
+startup_task = None
+process_start = time.perf_counter()
+
+async def warm_up():
+    try:
+        await asyncio.to_thread(load_components)
+        # Bazy najczęściej używanych tenantów (z poprzedniego uruchomienia) - przed ruchem
+        warmed = await tenant_registry.warm_up(TENANT_WARMUP)
+        if warmed:
+            print(f"Wczytano bazy tenantów: {', '.join(warmed)}")
+        startup["ready"] = True
+    except Exception as e:
+        startup["error"] = f"{type(e).__name__}: {e}"
+        print(f"Błąd ładowania komponentów: {startup['error']}")
+    startup["seconds"] = round(time.perf_counter() - process_start, 2)
+
+def start_warm_up():
+    global startup_task
+    if startup_task is None:
+        startup_task = asyncio.create_task(warm_up())
+    return startup_task
+
+# Funkcja czekająca na koniec rozgrzewki (startuje ją, jeśli moduł użyto bez serwera)
+async def wait_ready():
+    await asyncio.shield(start_warm_up())
+    if not startup["ready"]:
+        raise HTTPException(status_code=503, detail=f"API niegotowe: {startup['error']}")
+
+@asynccontextmanager
+async def lifespan(app):
+    # Serwer przyjmuje połączenia od razu; /ready odpowiada 200 po rozgrzewce
+    start_warm_up()
+    yield
+    if conversation_log is not None:
+        await asyncio.to_thread(conversation_log.close)
+    await asyncio.to_thread(tenant_registry.save_usage)
+    if http_client is not None:
+        await http_client.aclose()
+
+# Pytania o embeddingi z kilku ms zbierane w jedno zapytanie (rozmiar 1 = bez paczek)
+embedding_batcher = EmbeddingBatcher(
+    lambda texts: embedding_upstream.call(lambda: embeddings.aembed_queries(texts)),
+    max_batch=int(os.getenv("WAFAM_QUERY_EMBED_BATCH_SIZE", "64")),
+    max_wait=float(os.getenv("WAFAM_QUERY_EMBED_WAIT_MS", "5")) / 1000,
+    max_concurrency=int(os.getenv("WAFAM_QUERY_EMBED_CONCURRENCY", "8"))
 )
 
-vectorstore = Chroma(
-    persist_directory=chroma_dir,
-    embedding_function=embeddings,
-    collection_name="wafam_knowledge"
+# Cache odpowiedzi dla powtarzających się pytań (memory / sqlite / off)
+response_cache = create_response_cache(
+    os.getenv("WAFAM_CACHE_BACKEND", "memory"),
+    os.getenv("WAFAM_CACHE_PATH", os.path.join(script_dir, '..', 'data', 'response_cache.db')),
+    threshold=float(os.getenv("WAFAM_CACHE_THRESHOLD", "0.95")),
+    ttl=float(os.getenv("WAFAM_CACHE_TTL", "86400")),
+    max_entries=int(os.getenv("WAFAM_CACHE_MAX_ENTRIES", "1000"))
 )
 
-print("Baza wektorowa załadowana!")
+# Dane sesji, które zmieniają odpowiedź - przy nich cache jest pomijany
+CACHE_BYPASS_FIELDS = ("telefon", "email", "miejscowosc")
 
 # FastAPI
 app = FastAPI(
     title="WAFAM Chatbot API",
     description="AI Chatbot with Advanced RAG",
-    version="2.7"
+    version="2.7",
+    lifespan=lifespan
 )
 
 app.add_middleware(
@@ -48,6 +287,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Widget osadzony na stronie dealera musi odczytać czas z odpowiedzi 429
+    expose_headers=["Retry-After"],
 )
 
 # System prompt
@@ -84,136 +325,354 @@ POMIAR: Umawiamy bezpłatny pomiar. Potrzebujemy: miejscowość, kontakt, kiedy
 
 GDY KLIENT PODA TELEFON LUB EMAIL: Podziękuj i potwierdź że handlowiec oddzwoni/odpisze w ciągu 24h."""
 
-# Pamięć rozmów
-conversations = {}
+# Funkcja wyciągająca dane kontaktowe z promptu - do odpowiedzi awaryjnej, gdy model jest niedostępny
+def contact_line(system_prompt: str) -> str:
+    return next((line for line in system_prompt.splitlines() if line.startswith("KONTAKT:")), "")
 
-# Pamięć tematów
-conversation_topics = {}
+# Model odpowiedzi
+CHAT_MODEL = "gpt-4o-mini"
 
-# Pamięć zebranych danych do wyceny
-collected_data = {}
+# Licznik tokenów i budżet promptu - tworzone w load_components()
+token_counter = None
+prompt_builder = None
+HISTORY_LIMIT = 8
 
-# LEADY
+# Stała część promptu: prompt systemowy + skrót katalogu. Musi być identyczna
+# co do bajtu w każdym zapytaniu - wtedy OpenAI bierze ją z cache promptów
+# (od 1024 tokenów; tańsze i szybsze tokeny wejściowe). Wszystko, co zależy
+# od sesji, idzie za nią.
+chunks_file = os.path.join(script_dir, '..', 'data', 'wafam_chunks.json')
+CATALOGUE_TOKENS = int(os.getenv("WAFAM_CATALOGUE_TOKENS", "1100"))
+
+def build_static_prompt(system_prompt: str, chunks_path: str) -> str:
+    if CATALOGUE_TOKENS and os.path.exists(chunks_path):
+        with open(chunks_path, 'r', encoding='utf-8') as f:
+            catalogue = build_catalogue(json.load(f), token_counter, CATALOGUE_TOKENS)
+        return f"{system_prompt}\n\nKATALOG (skrót bazy wiedzy):\n{catalogue}"
+    return system_prompt
+
+# Klucz grupujący zapytania z tym samym prefiksem (lepsze trafienia cache promptów;
+# tenanci mają własne prefiksy, więc i własne klucze)
+PROMPT_CACHE_KEY = os.getenv("WAFAM_PROMPT_CACHE_KEY", "wafam-chat")
+
+# Pamięć sesji: historia rozmowy, temat i dane do wyceny (memory / sqlite / redis)
+session_store = create_session_store(
+    os.getenv("WAFAM_SESSION_BACKEND", "memory"),
+    path=os.getenv("WAFAM_SESSION_PATH", os.path.join(script_dir, '..', 'data', 'sessions.db')),
+    url=os.getenv("WAFAM_SESSION_URL", "redis://127.0.0.1:6379/0"),
+    max_sessions=int(os.getenv("WAFAM_MAX_SESSIONS", "10000")),
+    ttl=float(os.getenv("WAFAM_SESSION_TTL", "1800"))
+)
+
+# Odtwarzanie rozmów (/chat/batch, replay.py): osobne sesje, limity wielkości
+REPLAY_SESSION_PREFIX = "replay:"
+BATCH_MAX_TURNS = int(os.getenv("WAFAM_BATCH_MAX_TURNS", "10000"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("WAFAM_BATCH_MAX_CONCURRENCY", "16"))
+# /chat/batch tylko z nagłówkiem "Authorization: Bearer <token>" (pusta wartość = endpoint wyłączony)
+ADMIN_TOKEN = os.getenv("WAFAM_ADMIN_TOKEN", "")
+# Część miejsc kontroli przyjęć dla odtwarzania (własna grupa, najniższy priorytet)
+BATCH_ADMISSION_SHARE = float(os.getenv("WAFAM_BATCH_ADMISSION_SHARE", "0.25"))
+
+# Dziennik rozmów: katalog segmentów JSONL.gz (pusta wartość = wyłączony), patrz conversation_log.py
+CONVERSATION_LOG_DIR = os.getenv("WAFAM_CONVERSATION_LOG", os.path.join(script_dir, '..', 'data', 'conversations'))
+conversation_log = ConversationLog(
+    CONVERSATION_LOG_DIR,
+    max_queue=int(os.getenv("WAFAM_CONVERSATION_LOG_QUEUE", "10000")),
+    segment_records=int(os.getenv("WAFAM_CONVERSATION_LOG_SEGMENT_RECORDS", "100000")),
+    segment_seconds=float(os.getenv("WAFAM_CONVERSATION_LOG_SEGMENT_SECONDS", "3600"))
+) if CONVERSATION_LOG_DIR else None
+
+# Czasy etapów w nagłówku Server-Timing odpowiedzi /chat (tryb debug)
+DEBUG_TIMINGS = os.getenv("WAFAM_DEBUG_TIMINGS", "0") == "1"
+
+# Funkcja zliczająca decyzje kontroli przyjęć (przyjęte, w kolejce, odrzucone - wg priorytetu)
+def count_admission_event(event: str, priority: int):
+    inc("wafam_admission_total", event=event, priority=PRIORITY_NAMES[priority])
+
+# Kontrola przyjęć /chat i /chat/stream (patrz admission.py): limity na sesję i adres IP
+# (zapytań na minutę, 0 = bez limitu), WAFAM_ADMISSION_MAX_ACTIVE wiadomości obsługiwanych
+# naraz (0 = bez kolejki; wiadomości z kontaktem - dodatkowe miejsca), reszta czeka
+# w kolejce z priorytetami albo dostaje 429
+admission = Admission(
+    max_active=int(os.getenv("WAFAM_ADMISSION_MAX_ACTIVE", str(LLM_CONCURRENCY))),
+    max_queue=int(os.getenv("WAFAM_ADMISSION_QUEUE", str(LLM_CONCURRENCY * 4))),
+    queue_timeout=float(os.getenv("WAFAM_ADMISSION_QUEUE_TIMEOUT", "5")),
+    contact_reserve=int(os.getenv("WAFAM_ADMISSION_CONTACT_RESERVE", str(max(1, LLM_CONCURRENCY // 4)))),
+    session_limiter=RateLimiter(
+        float(os.getenv("WAFAM_RATE_SESSION_PER_MIN", "30")),
+        int(os.getenv("WAFAM_RATE_SESSION_BURST", "10"))
+    ),
+    ip_limiter=RateLimiter(
+        float(os.getenv("WAFAM_RATE_IP_PER_MIN", "120")),
+        int(os.getenv("WAFAM_RATE_IP_BURST", "30"))
+    ),
+    max_lead_sessions=int(os.getenv("WAFAM_MAX_SESSIONS", "10000")),
+    on_event=count_admission_event
+)
 
-def load_leads():
-    """Wczytaj leady z pliku JSON"""
-    if os.path.exists(leads_file):
-        with open(leads_file, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return []
+# Funkcja wywołująca operację na magazynie sesji (wspólny backend - w osobnym wątku)
+async def run_session_store(method, *args):
+    if session_store.shared:
+        return await asyncio.to_thread(method, *args)
+    return method(*args)
 
-def save_leads(leads_list):
-    """Zapisz leady do pliku JSON"""
-    with open(leads_file, 'w', encoding='utf-8') as f:
-        json.dump(leads_list, f, ensure_ascii=False, indent=2)
+# Funkcja wczytania sesji. Sesje domyślnego tenanta zapisane przed prefiksem tenanta (klucz
+# "<session_id>", nie "wafam:<session_id>") są przenoszone przy pierwszej turze po aktualizacji
+async def load_session(tenant: Tenant, session_id: str):
+    session = await run_session_store(session_store.get, tenant.session_key(session_id))
+    if (session_store.shared and tenant.id == tenant_registry.default_id and ":" not in session_id
+            and not (session.history or session.data or session.summary)):
+        legacy = await run_session_store(session_store.get, session_id)
+        if legacy.history or legacy.data or legacy.summary:
+            # Nowy klucz zapisze finish_chat; stary usuwamy, żeby /clear go nie wskrzesił
+            await run_session_store(session_store.delete, session_id)
+            session = legacy
+    return session
 
-def add_lead(phone: str = None, email: str = None, product: str = None, session_id: str = None):
+# LEADY
+
+# Baza leadów (SQLite, osobna dla każdego tenanta); stary leads.json przenoszony jednorazowo przy starcie
+LEADS_PAGE_MAX = int(os.getenv("WAFAM_LEADS_PAGE_MAX", "500"))
+
+def add_lead(tenant: Tenant, phone: str = None, email: str = None, product: str = None, session_id: str = None):
     """Dodaj nowy lead"""
-    leads_list = load_leads()
-    
-    # Sprawdź czy lead już istnieje
-    for lead in leads_list:
-        if phone and lead.get("phone") == phone:
-            return False
-        if email and lead.get("email") == email:
-            return False
-    
-    # Dodaj nowy lead
-    new_lead = {
-        "id": len(leads_list) + 1,
-        "phone": phone,
-        "email": email,
-        "product": product or "nieznany",
-        "session_id": session_id,
-        "created_at": datetime.now().strftime("%Y-%m-%d %H:%M"),
-        "status": "nowy"
-    }
+    with stage("lead_write"):
+        new_lead = tenant.lead_store.add(phone=phone, email=email, product=product, session_id=session_id)
+    
+    # Lead z tym telefonem/emailem już istnieje
+    if new_lead is None:
+        return False
     
-    leads_list.append(new_lead)
-    save_leads(leads_list)
-    print(f"Nowy lead #{new_lead['id']}: {phone or email} - {product}")
+    inc("wafam_leads_total")
+    inc("wafam_tenant_leads_total", tenant=tenant.id)
+    print(f"Nowy lead #{new_lead['id']} ({tenant.id}): {phone or email} - {product}")
     return True
 
-def detect_contact_info(message: str):
-    """Wykryj telefon lub email w wiadomości"""
-    result = {"phone": None, "email": None}
-    
-    # Wykryj telefon (9 cyfr, różne formaty)
-    phone_patterns = [
-        r'\b\d{3}[\s-]?\d{3}[\s-]?\d{3}\b',
-        r'\b\d{9}\b',
-        r'\+48[\s-]?\d{3}[\s-]?\d{3}[\s-]?\d{3}\b'
-    ]
-    
-    for pattern in phone_patterns:
-        phone_match = re.search(pattern, message)
-        if phone_match:
-            phone = re.sub(r'[\s\-\+]', '', phone_match.group())
-            if phone.startswith('48'):
-                phone = phone[2:]
-            result["phone"] = phone
-            break
+# Rozpoznawanie intencji, produktu i kontaktu - jedno przejście po wiadomości
+extractor = Extractor(load_keywords(os.getenv("WAFAM_KEYWORDS_FILE")))
+
+# Szybka ścieżka: pytania o kontakt i potwierdzenie danych z szablonu, bez modelu (patrz fast_path.py)
+FAST_PATH = os.getenv("WAFAM_FAST_PATH", "1") == "1"
+FAST_PATH_OPTIONS = {
+    "min_confidence": float(os.getenv("WAFAM_FAST_PATH_MIN_CONFIDENCE", "0.7")),
+    "max_words": int(os.getenv("WAFAM_FAST_PATH_MAX_WORDS", "12"))
+}
+
+# TENANCI (wielu dealerów w jednym wdrożeniu, patrz tenants.py)
+
+# Tenant domyślny: dotychczasowe pliki (data/, knowledge_base/) i SYSTEM_PROMPT
+DEFAULT_TENANT = os.getenv("WAFAM_DEFAULT_TENANT", "wafam")
+# Limit pamięci baz wektorowych tenantów (LRU) i ile najczęściej używanych wczytać po starcie
+TENANT_CACHE_BYTES = int(float(os.getenv("WAFAM_TENANT_CACHE_MB", "512")) * 1024 * 1024)
+TENANT_WARMUP = int(os.getenv("WAFAM_TENANT_WARMUP", "2"))
+# Część LLM_CONCURRENCY dostępna dla jednego tenanta (gdy jest ich kilku) - duży nie zagłodzi reszty
+TENANT_LLM_SHARE = float(os.getenv("WAFAM_TENANT_LLM_SHARE", "0.5"))
+
+def create_tenant(tenant_id: str) -> Tenant:
+    """Prompt, BM25, szybka ścieżka i leady tenanta (baza wektorowa - przy pierwszym wyszukiwaniu)"""
+    if tenant_id == DEFAULT_TENANT:
+        paths = {"chunks": chunks_file, "bm25": bm25_file, "leads": leads_db, "knowledge_base": chroma_dir}
+        system_prompt = SYSTEM_PROMPT
+        legacy_leads = leads_file
+        cache_key = PROMPT_CACHE_KEY
+        company = "WAFAM"
+    else:
+        paths = tenant_paths(tenant_id, tenant_registry.root)
+        with open(paths["prompt"], 'r', encoding='utf-8') as f:
+            system_prompt = f.read().strip()
+        os.makedirs(paths["data"], exist_ok=True)
+        legacy_leads = None
+        cache_key = f"{PROMPT_CACHE_KEY}-{tenant_id}" if PROMPT_CACHE_KEY else None
+        company = None
     
-    # Wykryj email
-    email_match = re.search(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b', message)
-    if email_match:
-        result["email"] = email_match.group().lower()
+    static_prompt = build_static_prompt(system_prompt, paths["chunks"])
+    contact = contact_line(system_prompt)
+    llm_limit = LLM_CONCURRENCY
+    # Miejsca w kontroli przyjęć w tej samej proporcji (0 - wszystkie) - inaczej zalew u jednego
+    # tenanta zająłby wszystkie miejsca wiadomościami czekającymi na jego własny limit wywołań
+    admission_limit = 0
+    if len(tenant_registry.names()) > 1:
+        llm_limit = max(1, int(LLM_CONCURRENCY * TENANT_LLM_SHARE))
+        admission_limit = max(1, int(admission.max_active * TENANT_LLM_SHARE))
     
-    return result
+    return Tenant(
+        tenant_id,
+        static_prompt=static_prompt,
+        static_prompt_tokens=token_counter.count(static_prompt),
+        # Odcisk promptu i modelu w kluczu cache odpowiedzi - po ich zmianie stare odpowiedzi nie pasują
+        response_fingerprint=hashlib.sha256(f"{CHAT_MODEL}\n{static_prompt}".encode("utf-8")).hexdigest()[:12],
+        contact_line=contact,
+        lexical_index=BM25Index.load(paths["bm25"]) if os.path.exists(paths["bm25"]) else None,
+        fast_path=FastPath.from_chunks_file(
+            paths["chunks"], contact_line=contact, company=company, **FAST_PATH_OPTIONS
+        ) if FAST_PATH and os.path.exists(paths["chunks"]) else None,
+        lead_store=LeadStore(paths["leads"], legacy_json=legacy_leads),
+        kb_root=paths["knowledge_base"],
+        llm_extra_body={"prompt_cache_key": cache_key} if cache_key else None,
+        llm_limit=llm_limit,
+        admission_limit=admission_limit,
+        llm_semaphore=asyncio.Semaphore(llm_limit),
+        llm_inflight=0
+    )
 
+# Funkcja otwierająca bazę wektorową tenanta (None - baza jeszcze niezbudowana, tylko BM25)
+def open_tenant_knowledge(tenant: Tenant):
+    if not os.path.isdir(tenant.kb_root):
+        return None
+    return KnowledgeBase(tenant.kb_root, open_vectorstore, check_every=KB_RELOAD_INTERVAL)
+
+# Funkcja szacująca pamięć bazy: macierz wektorów (numpy / mmap) albo pliki wersji (Chroma)
+def knowledge_base_bytes(kb) -> int:
+    _, index = kb.current
+    if index is not None:
+        return index.vectors.nbytes + index.norms.nbytes
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(active_dir(kb.root)) for name in names
+    )
+
+tenant_registry = TenantRegistry(
+    DEFAULT_TENANT,
+    create_tenant,
+    open_tenant_knowledge,
+    knowledge_base_bytes,
+    max_bytes=TENANT_CACHE_BYTES
+)
+# Tworzony w load_components() (tenant potrzebuje licznika tokenów)
+default_tenant = None
+
+# Funkcja wyboru tenanta zapytania (nieznany - 404, przed rozgrzewką - 503)
+def find_tenant(tenant_id: str = None) -> Tenant:
+    if not startup["ready"]:
+        raise HTTPException(status_code=503, detail="API niegotowe")
+    try:
+        return tenant_registry.get(tenant_id)
+    except UnknownTenant as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+async def resolve_tenant(tenant_id: str = None) -> Tenant:
+    try:
+        return await tenant_registry.resolve(tenant_id)
+    except UnknownTenant as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+# Funkcja zajmująca miejsce na wywołanie modelu: najpierw limit tenanta, potem wspólny
+@asynccontextmanager
+async def llm_slot(tenant: Tenant):
+    async with tenant.llm_semaphore, llm_semaphore:
+        tenant.llm_inflight += 1
+        try:
+            yield
+        finally:
+            tenant.llm_inflight -= 1
 
 # Modele danych
 class Message(BaseModel):
     text: str
     session_id: str = "default"
+    tenant: str = None
+
+class BatchTurn(BaseModel):
+    session_id: str
+    text: str
+
+class BatchRequest(BaseModel):
+    turns: list[BatchTurn]
+    concurrency: int = 8
+    tenant: str = None
 
 class Answer(BaseModel):
     bot: str
     sources: list[str] = []
 
-# Funkcja wyszukiwania w bazie
-def search_knowledge(query: str, k: int = 2):
-    results = vectorstore.similarity_search_with_score(query, k=k)
+# Funkcja tworzenia embeddingu pytania
+async def embed_query(query: str):
+    cached = embedding_cache.get(query)
+    if cached is not None:
+        return cached
+    with stage("embedding"):
+        query_vector = await embedding_batcher.embed(query)
+    await asyncio.to_thread(embedding_cache.put, query, query_vector)
+    return query_vector
+
+# Funkcja wyszukiwania leksykalnego (pusta lista poza trybem hybrydowym)
+def lexical_search(query: str, tenant: Tenant, k: int = 2):
+    if SEARCH_MODE != "hybrid" or tenant.lexical_index is None:
+        return []
+    return tenant.lexical_index.search(query, k=k)
+
+# Funkcja sprawdzająca czy wynik BM25 jest na tyle pewny, że można pominąć embedding
+def lexical_is_strong(query: str, tenant: Tenant) -> bool:
+    results = lexical_search(query, tenant, k=1)
+    return bool(results) and results[0][2] >= LEXICAL_STRONG_SCORE
+
+# Funkcja wyszukiwania wektorowego - lista (treść, tytuł, odległość)
+async def vector_search(query_vector, k: int, tenant: Tenant):
+    # Baza tenanta z LRU (pierwsze użycie - wczytanie w wątku)
+    kb = await tenant_registry.knowledge(tenant)
+    if kb is None:
+        return []
+    if await kb.refresh() and response_cache is not None:
+        # Odpowiedzi z cache mogły opierać się na starej treści bazy
+        response_cache.clear()
+    vectorstore, numpy_index = kb.current
+    if numpy_index is not None:
+        # Indeks w pamięci - jedno mnożenie macierz-wektor, bez wątku
+        with stage("retrieval"):
+            return numpy_index.search(query_vector, k=k)
+    
+    async with retrieval_semaphore:
+        with stage("retrieval"):
+            found = await asyncio.to_thread(
+                vectorstore.similarity_search_by_vector_with_relevance_scores,
+                list(map(float, query_vector)),
+                k=k
+            )
+    return [
+        (doc.page_content, doc.metadata.get('title', 'Nieznane'), score)
+        for doc, score in found
+    ]
+
+# Funkcja wyszukiwania w bazie (use_vectors=False: embeddingi niedostępne, tylko BM25;
+# with_scores=True: dodatkowo lista wyników rankingu dla dziennika rozmów)
+async def search_knowledge(query: str, k: int = 2, query_vector=None, use_vectors: bool = True,
+                           with_scores: bool = False, tenant: Tenant = None):
+    tenant = tenant or default_tenant
+    with stage("lexical"):
+        lexical = lexical_search(query, tenant, k=k * 2)
+    
+    if use_vectors and query_vector is None and not (lexical and lexical[0][2] >= LEXICAL_STRONG_SCORE):
+        # Embedding pytania asynchronicznie (pewne trafienie BM25, np. "HST", go pomija)
+        try:
+            query_vector = await embed_query(query)
+        except UpstreamUnavailable:
+            use_vectors = False
+    
+    if query_vector is not None:
+        vector_results = await vector_search(query_vector, k * 2 if lexical else k, tenant)
+        results = fuse(vector_results, lexical, k, HYBRID_ALPHA, VECTOR_MAX_DISTANCE, LEXICAL_MIN_SCORE, True)
+    else:
+        if not use_vectors and not lexical and tenant.lexical_index is not None:
+            # Awaria embeddingów - BM25 także poza trybem hybrydowym, lepsze to niż nic
+            lexical = tenant.lexical_index.search(query, k=k * 2)
+        results = fuse([], lexical, k, HYBRID_ALPHA, VECTOR_MAX_DISTANCE, LEXICAL_MIN_SCORE, True)
     
     contexts = []
     sources = []
+    scores = []
     
-    for doc, score in results:
-        if score < 0.8:
-            content = doc.page_content[:400]
-            contexts.append(content)
-            title = doc.metadata.get('title', 'Nieznane')
-            sources.append(title)
+    for content, title, score in results:
+        contexts.append(token_counter.truncate(content, CONTEXT_MAX_TOKENS))
+        sources.append(title)
+        scores.append(round(score, 4))
     
+    if with_scores:
+        return contexts, sources, scores
     return contexts, sources
 
-# Funkcja rozpoznawania intencji
-def detect_intent(message: str) -> str:
-    message_lower = message.lower()
-    
-    if any(word in message_lower for word in ["pomiar", "umówić", "wizyta", "przyjechać"]):
-        return "pomiar"
-    elif any(word in message_lower for word in ["cena", "koszt", "ile", "kosztuje", "drogo", "tanio"]):
-        return "cena"
-    elif any(word in message_lower for word in ["kontakt", "telefon", "zadzwonić", "email", "adres", "gdzie jesteście"]):
-        return "kontakt"
-    elif any(word in message_lower for word in ["jakie macie", "co macie", "oferta", "produkty", "asortyment"]):
-        return "produkty"
-    elif any(word in message_lower for word in ["polecasz", "polecacie", "doradzisz", "co wybrać", "która", "który"]):
-        return "rekomendacja"
-    elif any(word in message_lower for word in ["dlaczego", "czemu", "po co"]):
-        return "wyjasnienie"
-    elif any(word in message_lower for word in ["wycena", "ofertę", "przygotuj"]):
-        return "wycena"
-    else:
-        return "ogolne"
-
 # Funkcja budowania kontekstu rozmowy
-def build_conversation_context(session_id: str) -> str:
-    if session_id not in collected_data:
-        collected_data[session_id] = {}
-    
-    data = collected_data[session_id]
+def build_conversation_context(session) -> str:
+    data = session.data
     
     if not data:
         return ""
@@ -233,178 +692,701 @@ def build_conversation_context(session_id: str) -> str:
     return ""
 
 # Funkcja aktualizacji zebranych danych
-def update_collected_data(session_id: str, message: str):
-    if session_id not in collected_data:
-        collected_data[session_id] = {}
-    
-    message_lower = message.lower()
-    
-    # Wykryj produkt
-    if any(word in message_lower for word in ["okna", "okno"]):
-        collected_data[session_id]["produkt"] = "okna"
-    elif any(word in message_lower for word in ["drzwi"]):
-        collected_data[session_id]["produkt"] = "drzwi"
-    elif any(word in message_lower for word in ["rolety", "roleta"]):
-        collected_data[session_id]["produkt"] = "rolety"
-    elif any(word in message_lower for word in ["brama", "bramy", "garaż"]):
-        collected_data[session_id]["produkt"] = "bramy"
-    
-    # Wykryj kontakt (telefon/email)
-    contact_info = detect_contact_info(message)
-    
-    if contact_info["phone"]:
-        collected_data[session_id]["telefon"] = contact_info["phone"]
+def update_collected_data(session_id: str, session, extracted, tenant: Tenant):
+    data = session.data
+    # Odtwarzane rozmowy nie tworzą leadów (kontakty z logów już są w bazie)
+    record_leads = not session_id.startswith(REPLAY_SESSION_PREFIX)
+    
+    if extracted.product:
+        data["produkt"] = extracted.product
+    
+    if extracted.phone:
+        data["telefon"] = extracted.phone
+    if extracted.phone and record_leads:
         add_lead(
-            phone=contact_info["phone"],
-            product=collected_data[session_id].get("produkt"),
+            tenant,
+            phone=extracted.phone,
+            product=data.get("produkt"),
             session_id=session_id
         )
     
-    if contact_info["email"]:
-        collected_data[session_id]["email"] = contact_info["email"]
+    if extracted.email:
+        data["email"] = extracted.email
+    if extracted.email and record_leads:
         add_lead(
-            email=contact_info["email"],
-            product=collected_data[session_id].get("produkt"),
+            tenant,
+            email=extracted.email,
+            product=data.get("produkt"),
             session_id=session_id
         )
 
 # Funkcja rozszerzająca krótkie pytania
-def expand_query_with_context(user_message: str, session_id: str) -> str:
-    short_responses = ["tak", "nie", "podaj", "link", "chcę", "poproszę", "dawaj", "ok", "okej", "dobrze"]
-    message_lower = user_message.lower().strip()
-    is_short = len(message_lower.split()) <= 4 and any(word in message_lower for word in short_responses)
-    
-    if is_short and session_id in conversation_topics:
-        topic = conversation_topics[session_id]
+def expand_query_with_context(user_message: str, session, extracted) -> str:
+    if extracted.short_reply and session.topic:
+        topic = session.topic
         return f"{user_message} (kontekst: {topic})"
     
-    product_keywords = ["okna", "okno", "drzwi", "rolety", "roleta", "bramy", "brama", "żaluzje", "taras", "przesuwne"]
-    for keyword in product_keywords:
-        if keyword in message_lower:
-            conversation_topics[session_id] = user_message
-            break
+    if extracted.topic:
+        session.topic = user_message
     
     return user_message
 
-# Funkcja czatu
-def ask_wafam_bot(user_message: str, session_id: str) -> dict:
-    if session_id not in conversations:
-        conversations[session_id] = []
+# Funkcja sprawdzająca czy odpowiedź z cache jest dopuszczalna dla sesji
+def can_use_cache(user_message: str, expanded_query: str, session) -> bool:
+    if response_cache is None:
+        return False
+    # Krótkie odpowiedzi ("tak", "ok") zależą od poprzedniego pytania bota
+    if expanded_query != user_message:
+        return False
+    return not any(field in session.data for field in CACHE_BYPASS_FIELDS)
+
+# Funkcja przygotowania zapytania do modelu (wspólna dla /chat i /chat/stream)
+async def prepare_chat(user_message: str, session_id: str, tenant: Tenant, extracted: Extraction = None) -> dict:
+    session_key = tenant.session_key(session_id)
+    with stage("session_load"):
+        session = await load_session(tenant, session_id)
+    history = session.history
     
-    history = conversations[session_id]
+    # Intencja, produkt, telefon, e-mail, krótka odpowiedź - naraz (/chat ma je już z kontroli przyjęć)
+    if extracted is None:
+        extracted = extractor.extract(user_message)
+    intent = extracted.intent
     
-    # Aktualizuj zebrane dane (w tym leady)
-    update_collected_data(session_id, user_message)
+    # Aktualizuj zebrane dane (leady zapisywane na dysk poza pętlą zdarzeń)
+    with stage("collect_data"):
+        if extracted.phone or extracted.email:
+            await asyncio.to_thread(update_collected_data, session_id, session, extracted, tenant)
+        else:
+            update_collected_data(session_id, session, extracted, tenant)
     
-    # Rozpoznaj intencję
-    intent = detect_intent(user_message)
+    # Szybka ścieżka - po zapisaniu danych (lead jest już zapisany), przed embeddingiem
+    fast = tenant.fast_path.answer(user_message, extracted, session.data) if tenant.fast_path else None
+    if fast:
+        inc("wafam_fast_path_total", rule=fast["rule"])
+        history.append({"role": "user", "content": user_message})
+        return {"session": session, "session_key": session_key, "cached": fast, "source": "fast_path",
+                "sources": fast["sources"], "intent": intent}
     
     # Rozszerz pytanie o kontekst
-    expanded_query = expand_query_with_context(user_message, session_id)
+    expanded_query = expand_query_with_context(user_message, session, extracted)
+    
+    # Sprawdź cache odpowiedzi (klucz: embedding pytania + tenant, odcisk promptu i modelu,
+    # wersja bazy wiedzy + intencja + produkt - cache w SQLite przetrwa restart po zmianie promptu).
+    # Przy pewnym trafieniu BM25 embedding nie jest potrzebny - pomijamy też cache.
+    query_vector = None
+    use_vectors = True
+    if not lexical_is_strong(expanded_query, tenant):
+        try:
+            query_vector = await embed_query(expanded_query)
+        except UpstreamUnavailable:
+            # Bez embeddingu: bez cache odpowiedzi, wyszukiwanie samym BM25
+            use_vectors = False
+    cache_key = None
+    if query_vector is not None and can_use_cache(user_message, expanded_query, session):
+        product = session.data.get("produkt", "")
+        kb = await tenant_registry.knowledge(tenant)
+        kb_version = kb.version if kb else ""
+        cache_key = f"{tenant.id}|{tenant.response_fingerprint}|{kb_version}|{intent}|{product}"
+        with stage("cache_lookup"):
+            cached = response_cache.lookup(query_vector, cache_key)
+        if cached:
+            history.append({"role": "user", "content": user_message})
+            return {"session": session, "session_key": session_key, "cached": cached, "source": "cache",
+                    "sources": cached["sources"], "intent": intent}
+    elif response_cache is not None:
+        response_cache.bypass()
     
     # Wyszukaj w bazie wiedzy
-    contexts, sources = search_knowledge(expanded_query)
+    contexts, sources, scores = await search_knowledge(
+        expanded_query, query_vector=query_vector, use_vectors=use_vectors, with_scores=True, tenant=tenant
+    )
+    
+    # Dodaj kontekst zebranych danych
+    collected_context = build_conversation_context(session)
+    header = f"INTENCJA KLIENTA: {intent}\n{collected_context}"
+    question = f"""PYTANIE KLIENTA: {user_message}
+
+Odpowiedz KONKRETNIE na pytanie klienta. Nie zmieniaj tematu."""
+    
+    # Rozdziel budżet tokenów: fragmenty z bazy, historia, streszczenie starszej części
+    plan = prompt_builder.allocate([header, question], contexts, history, session.summary)
     
     # Zbuduj kontekst z bazy
-    if contexts:
-        context_text = "\n".join(contexts)
+    if plan["contexts"]:
+        context_text = "\n".join(plan["contexts"])
     else:
         context_text = "Brak szczegółowych danych w bazie."
     
-    # Dodaj kontekst zebranych danych
-    collected_context = build_conversation_context(session_id)
+    summary_text = f"\nWCZEŚNIEJ W ROZMOWIE:\n{plan['summary']}\n" if plan["summary"] else ""
     
     # Zbuduj prompt
-    user_prompt = f"""INTENCJA KLIENTA: {intent}
-{collected_context}
-
+    user_prompt = f"""{header}
+{summary_text}
 DANE Z BAZY:
 {context_text}
 
-PYTANIE KLIENTA: {user_message}
-
-Odpowiedz KONKRETNIE na pytanie klienta. Nie zmieniaj tematu."""
+{question}"""
 
     # Dodaj do historii
     history.append({"role": "user", "content": user_message})
     
     # Zbuduj wiadomości dla API
-    messages = [{"role": "system", "content": SYSTEM_PROMPT}]
+    # Kolejność: stały prefiks, historia, na końcu dane tej sesji i pytanie
+    messages = [{"role": "system", "content": tenant.static_prompt}]
+    messages.extend(plan["history"])
+    messages.append({"role": "user", "content": user_prompt})
     
-    recent_history = history[-4:] if len(history) > 4 else history
-    for msg in recent_history[:-1]:
-        messages.append({"role": msg["role"], "content": msg["content"][:150]})
+    prompt_tokens = {"prefix": tenant.static_prompt_tokens, **plan["tokens"]}
+    prompt_tokens["total"] = sum(prompt_tokens.values())
+    for part, count in prompt_tokens.items():
+        inc("wafam_prompt_tokens_total", count, part=part)
     
-    messages.append({"role": "user", "content": user_prompt})
+    unique_sources = list(dict.fromkeys(sources))
     
-    # Wyślij do OpenAI
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=messages,
-        max_tokens=250,
-        temperature=0.3
-    )
+    return {
+        "session": session,
+        "session_key": session_key,
+        "messages": messages,
+        "sources": unique_sources[:2],
+        "cached": None,
+        "intent": intent,
+        "retrieved": [{"source": title, "score": score} for title, score in zip(sources, scores)],
+        "top_context": contexts[0] if contexts else None,
+        "cache_key": cache_key,
+        "query_vector": query_vector,
+        "prompt_tokens": prompt_tokens
+    }
+
+# Funkcja zapisu odpowiedzi w historii rozmowy (i w cache)
+async def finish_chat(turn: dict, bot_response: str):
+    session = turn["session"]
+    session.history.append({"role": "assistant", "content": bot_response})
     
-    bot_response = response.choices[0].message.content
+    if len(session.history) > HISTORY_LIMIT:
+        # Wypowiedzi wypadające z historii trafiają do krótkiego streszczenia
+        dropped = session.history[:-HISTORY_LIMIT]
+        session.history = session.history[-HISTORY_LIMIT:]
+        session.summary = fold_summary(session.summary, dropped, token_counter, prompt_builder.summary_tokens)
     
-    # Dodaj odpowiedź do historii
-    history.append({"role": "assistant", "content": bot_response})
+    with stage("session_save"):
+        await run_session_store(session_store.save, turn["session_key"], session)
+    if session.data:
+        # Sesja z produktem albo kontaktem - pierwszeństwo w kolejce przy przeciążeniu
+        admission.remember(turn["session_key"])
     
-    if len(history) > 8:
-        conversations[session_id] = history[-8:]
+    if turn.get("cache_key"):
+        await asyncio.to_thread(
+            response_cache.store,
+            turn["query_vector"],
+            turn["cache_key"],
+            {"bot": bot_response, "sources": turn["sources"]}
+        )
+
+# Funkcja liczenia odsetka trafień cache
+def hit_ratio(stats: dict) -> float:
+    lookups = stats["hits"] + stats["misses"]
+    return round(stats["hits"] / lookups, 4) if lookups else 0.0
+
+# Wskaźniki liczone przy odczycie /metrics
+registry.gauge("wafam_active_sessions", "Liczba aktywnych sesji", lambda: len(session_store))
+registry.gauge(
+    "wafam_cache_events",
+    "Trafienia i chybienia cache (odpowiedzi i embeddingów)",
+    lambda: {
+        **{(("cache", "embedding"), ("event", k)): v
+           for k, v in (embedding_cache.stats.items() if embedding_cache else [])},
+        **{(("cache", "response"), ("event", k)): v
+           for k, v in (response_cache.stats.items() if response_cache else [])},
+    }
+)
+
+registry.gauge(
+    "wafam_embedding_batcher",
+    "Paczki zapytań o embeddingi pytań (zapytania, duplikaty, paczki, wysłane teksty)",
+    lambda: {(("stat", k),): v for k, v in embedding_batcher.get_stats().items()}
+)
+
+registry.gauge(
+    "wafam_conversation_log",
+    "Dziennik rozmów (zalogowane, odrzucone przy pełnej kolejce, zapisane, w kolejce, paczki, segmenty, błędy)",
+    lambda: {(("stat", k),): v for k, v in conversation_log.get_stats().items()} if conversation_log else {}
+)
+
+registry.gauge(
+    "wafam_upstream_breaker_open",
+    "Bezpiecznik wywołań OpenAI (0 - zamknięty, 0.5 - próba, 1 - otwarty)",
+    lambda: {
+        (("upstream", upstream.name),): {"closed": 0.0, "half_open": 0.5, "open": 1.0}[upstream.breaker.state]
+        for upstream in (chat_upstream, embedding_upstream)
+    }
+)
+
+registry.gauge(
+    "wafam_fast_path",
+    "Szybka ścieżka (sprawdzone wiadomości, odpowiedzi z szablonu, odrzucone przez próg pewności, odsetek)",
+    lambda: {
+        (("stat", k), ("tenant", tenant.id)): v
+        for tenant in list(tenant_registry.tenants.values()) if tenant.fast_path
+        for k, v in tenant.fast_path.get_stats().items()
+    }
+)
+
+registry.gauge(
+    "wafam_admission",
+    "Kontrola przyjęć (obsługiwane, limit, czekające wg priorytetu, limit kolejki, średni czas obsługi)",
+    lambda: {(("stat", k),): v for k, v in admission.get_stats().items()}
+)
+
+registry.gauge(
+    "wafam_tenant_registry",
+    "Bazy tenantów w LRU (trafienia, wczytania, zwolnienia, błędy, wczytane bazy, bajty, limit)",
+    lambda: {(("stat", k),): v for k, v in tenant_registry.get_stats().items()}
+)
+
+registry.gauge(
+    "wafam_tenant_index_bytes",
+    "Szacowana pamięć wczytanej bazy wektorowej tenanta",
+    lambda: {(("tenant", tenant_id),): size for tenant_id, (_, size) in list(tenant_registry.indexes.items())}
+)
+
+registry.gauge(
+    "wafam_tenant_llm_inflight",
+    "Wywołania modelu w toku (limit tenanta: WAFAM_TENANT_LLM_SHARE)",
+    lambda: {(("tenant", tenant.id),): tenant.llm_inflight for tenant in list(tenant_registry.tenants.values())}
+)
+
+registry.gauge(
+    "wafam_cache_hit_ratio",
+    "Odsetek trafień cache",
+    lambda: {
+        (("cache", "embedding"),): hit_ratio(embedding_cache.stats) if embedding_cache else 0.0,
+        (("cache", "response"),): hit_ratio(response_cache.stats) if response_cache else 0.0,
+    }
+)
+
+# Funkcja zapisu zużycia tokenów z odpowiedzi OpenAI (zwraca je też dla dziennika rozmów)
+def record_usage(usage, tenant: Tenant):
+    if usage is None:
+        return None
+    # Tokeny wejściowe wzięte z cache promptów po stronie OpenAI
+    details = getattr(usage, "prompt_tokens_details", None)
+    tokens = {
+        "prompt": usage.prompt_tokens,
+        "cached": getattr(details, "cached_tokens", None) or 0,
+        "completion": usage.completion_tokens
+    }
+    for kind, count in tokens.items():
+        inc("wafam_llm_tokens_total", count, type=kind)
+        inc("wafam_tenant_llm_tokens_total", count, tenant=tenant.id, type=kind)
+    return tokens
+
+registry.describe("wafam_tenant_seconds", "histogram", "Czas odpowiedzi na wiadomość wg tenanta")
+
+# Funkcja zapisu tury: metryki tenanta i dziennik rozmów (tylko kolejka - zapis w osobnym wątku)
+def log_turn(tenant: Tenant, session_id: str, user_message: str, turn: dict, bot_response: str, source: str,
+             started: float):
+    elapsed = time.perf_counter() - started
+    tenant_registry.record(tenant.id)
+    inc("wafam_tenant_requests_total", tenant=tenant.id, source=source)
+    if METRICS_ENABLED:
+        registry.observe("wafam_tenant_seconds", elapsed, tenant=tenant.id)
+    if conversation_log is None:
+        return
+    timings = current_timings.get()
+    conversation_log.log({
+        "ts": datetime.now().isoformat(timespec="milliseconds"),
+        "tenant": tenant.id,
+        "session_id": session_id,
+        "text": user_message,
+        "bot": bot_response,
+        "source": source,
+        "intent": turn["intent"],
+        "product": turn["session"].data.get("produkt"),
+        "retrieved": turn.get("retrieved", []),
+        "usage": turn.get("usage"),
+        "prompt_tokens": turn.get("prompt_tokens"),
+        "latency_ms": round(elapsed * 1000, 1),
+        "stages": {name: round(seconds * 1000, 1) for name, seconds in timings.items()} if timings else None
+    })
+
+# Funkcja odpowiedzi awaryjnej (model niedostępny): najlepszy fragment z bazy i kontakt.
+# Nie trafia do cache - po powrocie modelu to samo pytanie dostanie pełną odpowiedź.
+def fallback_answer(turn: dict, tenant: Tenant) -> str:
+    turn["cache_key"] = None
+    inc("wafam_chat_requests_total", source="fallback")
+    parts = ["Przepraszam, mam chwilowy problem z przygotowaniem pełnej odpowiedzi."]
+    if turn.get("top_context"):
+        parts.append(f"Z naszej bazy wiedzy: {turn['top_context']}")
+    if tenant.contact_line:
+        parts.append("Najszybciej pomożemy bezpośrednio - " + tenant.contact_line)
+    return "\n\n".join(parts)
+
+# Funkcja wywołania modelu (limit czasu, ponowienia i bezpiecznik - chat_upstream)
+async def create_completion(messages: list, tenant: Tenant, **options):
+    return await chat_upstream.call(lambda: client.chat.completions.create(
+        model=CHAT_MODEL,
+        messages=messages,
+        max_tokens=250,
+        temperature=0.3,
+        extra_body=tenant.llm_extra_body,
+        **options
+    ))
+
+# Funkcja czatu
+async def ask_wafam_bot(user_message: str, session_id: str, tenant: Tenant = None,
+                        extracted: Extraction = None) -> dict:
+    started = time.perf_counter()
+    tenant = tenant or default_tenant
+    turn = await prepare_chat(user_message, session_id, tenant, extracted)
+    
+    if turn["cached"]:
+        bot_response = turn["cached"]["bot"]
+        source = turn["source"]
+        inc("wafam_chat_requests_total", source=source)
     else:
-        conversations[session_id] = history
+        # Wyślij do OpenAI
+        try:
+            async with llm_slot(tenant):
+                with stage("llm"):
+                    response = await create_completion(turn["messages"], tenant)
+        except UpstreamUnavailable:
+            bot_response = fallback_answer(turn, tenant)
+            source = "fallback"
+        else:
+            bot_response = response.choices[0].message.content
+            turn["usage"] = record_usage(response.usage, tenant)
+            source = "llm"
+            inc("wafam_chat_requests_total", source=source)
     
-    unique_sources = list(dict.fromkeys(sources))
+    # Dodaj odpowiedź do historii
+    await finish_chat(turn, bot_response)
+    log_turn(tenant, session_id, user_message, turn, bot_response, source, started)
     
     return {
         "bot": bot_response,
-        "sources": unique_sources[:2]
+        "sources": turn["sources"],
+        "prompt_tokens": turn.get("prompt_tokens")
     }
 
+# Funkcja zapisu tury strumieniowej (także przerwanej)
+async def finish_stream(turn: dict, tenant: Tenant, session_id: str, user_message: str, bot_response: str,
+                        source: str, started: float):
+    if bot_response:
+        await finish_chat(turn, bot_response)
+    else:
+        # Rozłączenie przed pierwszym fragmentem - wycofaj pytanie, żeby nie zostało w historii
+        # bez odpowiedzi (zebrane dane kontaktowe zostają w sesji)
+        session = turn["session"]
+        if session.history and session.history[-1] == {"role": "user", "content": user_message}:
+            session.history.pop()
+        with stage("session_save"):
+            await run_session_store(session_store.save, turn["session_key"], session)
+    log_turn(tenant, session_id, user_message, turn, bot_response, source, started)
+
+# Funkcja czatu strumieniowego - zwraca zdarzenia (typ, dane)
+async def ask_wafam_bot_stream(user_message: str, session_id: str, tenant: Tenant = None,
+                               extracted: Extraction = None):
+    started = time.perf_counter()
+    tenant = tenant or default_tenant
+    turn = await prepare_chat(user_message, session_id, tenant, extracted)
+    sources = turn["sources"]
+    
+    # Źródła znamy przed odpowiedzią modelu - wysyłamy je od razu
+    yield "sources", sources
+    
+    if turn["cached"]:
+        bot_response = turn["cached"]["bot"]
+        inc("wafam_chat_requests_total", source=turn["source"])
+        await finish_chat(turn, bot_response)
+        log_turn(tenant, session_id, user_message, turn, bot_response, turn["source"], started)
+        yield "delta", bot_response
+        yield "done", {"bot": bot_response, "sources": sources, "prompt_tokens": None}
+        return
+    
+    parts = []
+    completed = False
+    source = "llm"
+    try:
+        async with llm_slot(tenant):
+            with stage("llm"):
+                llm_started = time.perf_counter()
+                # Ponawiane jest tylko otwarcie strumienia - po pierwszym tokenie nie
+                try:
+                    stream = await create_completion(
+                        turn["messages"],
+                        tenant,
+                        stream=True,
+                        stream_options={"include_usage": True}
+                    )
+                except UpstreamUnavailable:
+                    stream = None
+                if stream is not None:
+                    inc("wafam_chat_requests_total", source="llm")
+                    async for chunk in stream:
+                        turn["usage"] = record_usage(chunk.usage, tenant) or turn.get("usage")
+                        if not chunk.choices:
+                            continue
+                        delta = chunk.choices[0].delta.content
+                        if delta:
+                            if not parts:
+                                record_stage("llm_first_token", time.perf_counter() - llm_started)
+                            parts.append(delta)
+                            yield "delta", delta
+        if stream is None:
+            source = "fallback"
+            parts.append(fallback_answer(turn, tenant))
+            yield "delta", parts[0]
+        completed = True
+    finally:
+        # Zapisz odpowiedź także gdy klient rozłączy się w trakcie
+        # (niepełnej odpowiedzi nie zapisujemy w cache)
+        if not completed:
+            turn["cache_key"] = None
+        # Rozłączenie anuluje zadanie (także każde kolejne await) - zapis w osobnym zadaniu
+        await asyncio.shield(finish_stream(turn, tenant, session_id, user_message, "".join(parts),
+                                           source if completed else "interrupted", started))
+    
+    yield "done", {"bot": "".join(parts), "sources": sources, "prompt_tokens": turn["prompt_tokens"]}
+
+# Funkcja jednej tury odtwarzanej rozmowy (sesja z prefiksem, od zera przy pierwszej turze)
+async def ask_replay_turn(session_id: str, turn: int, text: str, tenant: Tenant = None) -> dict:
+    session_id = REPLAY_SESSION_PREFIX + session_id
+    tenant = tenant or default_tenant
+    if turn == 0:
+        await run_session_store(session_store.delete, tenant.session_key(session_id))
+    answer = await ask_wafam_bot(text, session_id, tenant)
+    inc("wafam_replay_turns_total")
+    return answer
+
+# Funkcja sprzątająca po odtworzonej rozmowie (inaczej duży log wyparłby z LRU sesje klientów)
+async def end_replay_session(session_id: str, tenant: Tenant = None):
+    session_key = (tenant or default_tenant).session_key(REPLAY_SESSION_PREFIX + session_id)
+    await run_session_store(session_store.delete, session_key)
+    admission.forget(session_key)
+
+# Funkcja formatowania zdarzenia SSE
+def format_sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
 # ENDPOINT: Strona główna
 @app.get("/")
 def home():
     return {
         "status": "online",
+        "ready": startup["ready"],
         "message": "WAFAM Chatbot API",
         "version": "2.7"
     }
 
+# ENDPOINT: Gotowość (sonda dla load balancera / Kubernetesa)
+@app.get("/ready")
+def ready():
+    status = 200 if startup["ready"] else 503
+    return JSONResponse(dict(startup), status_code=status)
+
+# Funkcja przyjęcia wiadomości: limity zapytań, potem miejsce (z kolejki z priorytetami).
+# Przeciążenie - od razu 429 z Retry-After, zanim powstanie jakikolwiek koszt.
+async def admit(request: Request, message: Message, tenant: Tenant, extracted: Extraction):
+    client_ip = request.client.host if request.client else "unknown"
+    try:
+        with stage("admission"):
+            return await admission.admit(
+                tenant.session_key(message.session_id),
+                client_ip,
+                has_contact=bool(extracted.phone or extracted.email),
+                group=tenant.id,
+                group_limit=tenant.admission_limit
+            )
+    except Overloaded as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+# Funkcja sprawdzająca token administratora (endpointy poza widgetem)
+def require_admin(request: Request):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Endpoint wyłączony - ustaw WAFAM_ADMIN_TOKEN")
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not secrets.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="Nieprawidłowy token administratora",
+                            headers={"WWW-Authenticate": "Bearer"})
+
 # ENDPOINT: Czat
 @app.post("/chat", response_model=Answer)
-def chat(message: Message):
-    response = ask_wafam_bot(message.text, message.session_id)
-    return response
+async def chat(message: Message, request: Request, response: Response):
+    await wait_ready()
+    tenant = await resolve_tenant(message.tenant)
+    timings = start_request()
+    with stage("total"):
+        extracted = extractor.extract(message.text)
+        with await admit(request, message, tenant, extracted):
+            answer = await ask_wafam_bot(message.text, message.session_id, tenant, extracted)
+    prompt_tokens = answer.pop("prompt_tokens")
+    if DEBUG_TIMINGS and timings:
+        response.headers["Server-Timing"] = server_timing(timings)
+    if DEBUG_TIMINGS and prompt_tokens:
+        response.headers["X-Prompt-Tokens"] = ", ".join(f"{k}={v}" for k, v in prompt_tokens.items())
+    return answer
+
+# ENDPOINT: Czat strumieniowy (Server-Sent Events)
+@app.post("/chat/stream")
+async def chat_stream(message: Message, request: Request):
+    await wait_ready()
+    tenant = await resolve_tenant(message.tenant)
+    # Przyjęcie przed wysłaniem nagłówków (429 musi być statusem odpowiedzi)
+    extracted = extractor.extract(message.text)
+    ticket = await admit(request, message, tenant, extracted)
+
+    async def event_stream():
+        timings = start_request()
+        with stage("total"), ticket:
+            async for event, data in ask_wafam_bot_stream(message.text, message.session_id, tenant, extracted):
+                # Czasy etapów i tokeny promptu dołączane do ostatniego zdarzenia (nagłówki już wysłane)
+                if event == "done":
+                    prompt_tokens = data.pop("prompt_tokens")
+                    if DEBUG_TIMINGS and timings:
+                        data = {**data, "timings": server_timing(timings), "prompt_tokens": prompt_tokens}
+                yield format_sse(event, data)
+    
+    # Miejsce oddawane też wtedy, gdy klient rozłączy się przed pierwszym zdarzeniem
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(ticket.release)
+    )
+
+# ENDPOINT: Czat wsadowy - wiele rozmów naraz, wyniki jako NDJSON w kolejności ukończenia
+@app.post("/chat/batch")
+async def chat_batch(batch: BatchRequest, request: Request):
+    require_admin(request)
+    await wait_ready()
+    if len(batch.turns) > BATCH_MAX_TURNS:
+        raise HTTPException(status_code=413, detail=f"Najwyżej {BATCH_MAX_TURNS} tur w jednym zapytaniu")
+    tenant = await resolve_tenant(batch.tenant)
+    sessions = group_sessions({"session_id": t.session_id, "text": t.text} for t in batch.turns)
+    concurrency = max(1, min(batch.concurrency, BATCH_MAX_CONCURRENCY))
+
+    async def ask_turn(session_id: str, turn: int, text: str):
+        # Każda tura przez kontrolę przyjęć, we własnej grupie - odtwarzanie nie zajmie miejsc klientów
+        while True:
+            try:
+                ticket = await admission.admit(
+                    tenant.session_key(REPLAY_SESSION_PREFIX + session_id), None,
+                    group=f"{tenant.id}/batch",
+                    group_limit=max(1, int(admission.max_active * BATCH_ADMISSION_SHARE)),
+                    priority=PRIORITY_BATCH
+                )
+                break
+            except Overloaded as e:
+                # Odtwarzanie może poczekać - bez błędu w wynikach
+                await asyncio.sleep(e.retry_after)
+        with ticket:
+            return await ask_replay_turn(session_id, turn, text, tenant)
+
+    async def end_session(session_id: str):
+        await end_replay_session(session_id, tenant)
+
+    async def rows():
+        async for row in replay_sessions(sessions, ask_turn, concurrency, done=end_session):
+            yield json.dumps(row, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(rows(), media_type="application/x-ndjson")
+
+# ENDPOINT: Metryki w formacie Prometheusa
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+# ENDPOINT: Przeładuj bazę wiedzy (np. zaraz po build_vectordb.py; ?tenant= - baza tenanta
+# razem z promptem i BM25, wczytywana od nowa przy kolejnym zapytaniu)
+@app.post("/reload")
+async def reload_knowledge_base(tenant: str = None):
+    await wait_ready()
+    tenant = await resolve_tenant(tenant)
+    if tenant.id != DEFAULT_TENANT:
+        tenant_registry.discard(tenant.id)
+        tenant = await resolve_tenant(tenant.id)
+    kb = await tenant_registry.knowledge(tenant)
+    if kb is not None and tenant.id == DEFAULT_TENANT:
+        await kb.refresh(force=True)
+    if response_cache is not None:
+        response_cache.clear()
+    return {"status": "Baza wiedzy przeładowana", "tenant": tenant.id, "version": kb.version if kb else None}
+
+# ENDPOINT: Statystyki cache odpowiedzi
+@app.get("/cache")
+def cache_stats():
+    if response_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **response_cache.get_stats()}
 
 # ENDPOINT: Wyczyść rozmowę
 @app.post("/clear")
-def clear_conversation(session_id: str = "default"):
-    if session_id in conversations:
-        del conversations[session_id]
-    if session_id in conversation_topics:
-        del conversation_topics[session_id]
-    if session_id in collected_data:
-        del collected_data[session_id]
+async def clear_conversation(session_id: str = "default", tenant: str = None):
+    await wait_ready()
+    tenant = await resolve_tenant(tenant)
+    await run_session_store(session_store.delete, tenant.session_key(session_id))
+    admission.forget(tenant.session_key(session_id))
     return {"status": "Rozmowa wyczyszczona", "session_id": session_id}
 
-# ENDPOINT: Lista leadów
+# ENDPOINT: Lista leadów (strona po created_at; kolejna strona: ?cursor=next_cursor)
 @app.get("/leads")
-def get_leads(status: str = None):
-    leads_list = load_leads()
-    
-    if status:
-        leads_list = [l for l in leads_list if l.get("status") == status]
+def get_leads(status: str = None, product: str = None, date_from: str = None, date_to: str = None,
+              order: str = "desc", limit: int = 50, cursor: str = None, tenant: str = None):
+    if order not in ("asc", "desc"):
+        raise HTTPException(status_code=400, detail="order: asc albo desc")
+    lead_store = find_tenant(tenant).lead_store
+    try:
+        leads, next_cursor = lead_store.page(
+            status=status, product=product, date_from=date_from, date_to=date_to,
+            order=order, limit=max(1, min(limit, LEADS_PAGE_MAX)), cursor=cursor
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
     return {
-        "total": len(leads_list),
-        "leads": leads_list
+        # Z liczników tylko bez filtrów produktu i dat (inaczej liczenie = przegląd tabeli)
+        "total": lead_store.count(status) if not (product or date_from or date_to) else None,
+        "leads": leads,
+        "next_cursor": next_cursor
     }
 
+# ENDPOINT: Eksport leadów (NDJSON albo CSV, strumieniowo - dowolna liczba leadów)
+@app.get("/leads/export")
+def export_leads(format: str = "ndjson", status: str = None, product: str = None,
+                 date_from: str = None, date_to: str = None, order: str = "asc", tenant: str = None):
+    if format not in ("ndjson", "csv") or order not in ("asc", "desc"):
+        raise HTTPException(status_code=400, detail="format: ndjson albo csv, order: asc albo desc")
+    tenant = find_tenant(tenant)
+    pages = tenant.lead_store.pages(status=status, product=product, date_from=date_from, date_to=date_to, order=order)
+    
+    def ndjson_rows():
+        for leads in pages:
+            yield "".join(json.dumps(lead, ensure_ascii=False) + "\n" for lead in leads)
+    
+    def csv_rows():
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=LEAD_COLUMNS)
+        writer.writeheader()
+        for leads in pages:
+            writer.writerows(leads)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue()
+    
+    filename = f"leads-{tenant.id}-{datetime.now().strftime('%Y%m%d-%H%M')}.{format}"
+    return StreamingResponse(
+        csv_rows() if format == "csv" else ndjson_rows(),
+        media_type="text/csv; charset=utf-8" if format == "csv" else "application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
 # ENDPOINT: Szukaj w bazie
 @app.get("/search")
-def search(query: str, limit: int = 2):
-    contexts, sources = search_knowledge(query, k=limit)
+async def search(query: str, limit: int = 2, tenant: str = None):
+    await wait_ready()
+    tenant = await resolve_tenant(tenant)
+    contexts, sources = await search_knowledge(query, k=limit, tenant=tenant)
     return {
         "query": query,
         "results": [
@@ -413,14 +1395,34 @@ def search(query: str, limit: int = 2):
         ]
     }
 
+# ENDPOINT: Tenanci (wczytana baza i jej rozmiar, liczba zapytań, limit wywołań modelu)
+@app.get("/tenants")
+def list_tenants():
+    loaded = dict(tenant_registry.indexes)
+    tenants = []
+    for tenant_id in tenant_registry.names():
+        tenant = tenant_registry.tenants.get(tenant_id)
+        kb, size = loaded.get(tenant_id, (None, 0))
+        tenants.append({
+            "id": tenant_id,
+            "active": tenant is not None,
+            "knowledge_base": kb.version if kb else None,
+            "index_bytes": size,
+            "requests": tenant_registry.usage.get(tenant_id, 0),
+            "llm_limit": tenant.llm_limit if tenant else None
+        })
+    return {"default": DEFAULT_TENANT, "tenants": tenants, **tenant_registry.get_stats()}
+
 # ENDPOINT: Info
 @app.get("/info")
 def info():
-    leads_list = load_leads()
     return {
         "project": "WAFAM Sales Chatbot",
         "author": "Kajetan Holdan",
         "version": "2.7",
         "features": ["RAG", "Intent Detection", "Context Memory", "Lead Collection"],
-        "total_leads": len(leads_list)
+        "total_leads": default_tenant.lead_store.count() if default_tenant else None,
+        "knowledge_base": knowledge_base.version if knowledge_base else None,
+        "embedder": embeddings.name if embeddings else None,
+        "upstream": {upstream.name: upstream.breaker.state for upstream in (chat_upstream, embedding_upstream)}
     }
\ No newline at end of file
@@ -1,8 +1,17 @@
+import argparse
+import asyncio
 import json
 import os
+import time
+import chromadb
 from dotenv import load_dotenv
-from langchain_openai import OpenAIEmbeddings
-from langchain_community.vectorstores import Chroma
+
+from embedders import embedder_from_env
+from knowledge_base import active_dir, chunk_hash, new_version_dir, publish, read_embedder, write_embedder
+import prepare_knowledge
+from prepare_knowledge import iter_chunks, load_manifest
+from retrieval import INDEX_FILE, write_index
+from tenants import tenant_paths
 
 # Wczytaj klucz API
 env_path = os.path.join(os.path.dirname(__file__), '..', '.env')
@@ -12,58 +21,212 @@ load_dotenv(env_path)
 script_dir = os.path.dirname(os.path.abspath(__file__))
 chunks_file = os.path.join(script_dir, '..', 'data', 'wafam_chunks.json')
 chroma_dir = os.path.join(script_dir, '..', 'knowledge_base')
+manifest_path, shards_path = prepare_knowledge.manifest_file, prepare_knowledge.shards_dir
+COLLECTION = "wafam_knowledge"
+# Kopia manifestu w katalogu wersji i klucze fragmentów każdego pliku - przy następnej budowie
+# pliki bez zmian biorą fragmenty i wektory z poprzedniej wersji, bez czytania ich JSONL
+VERSION_MANIFEST = "manifest.json"
+VERSION_KEYS = "keys.json"
+
+parser = argparse.ArgumentParser(description="Budowa bazy wektorowej WAFAM (przyrostowo)")
+parser.add_argument("--batch-size", type=int, default=int(os.getenv("WAFAM_EMBED_BATCH_SIZE", "64")),
+                    help="fragmentów w jednym zapytaniu o embeddingi")
+parser.add_argument("--concurrency", type=int, default=int(os.getenv("WAFAM_EMBED_CONCURRENCY", "4")),
+                    help="równoległych zapytań o embeddingi")
+parser.add_argument("--full", action="store_true", help="policz embeddingi wszystkich fragmentów od nowa")
+parser.add_argument("--tenant", help="zbuduj bazę tenanta (tenants/<id>/knowledge_base)")
+args = parser.parse_args()
+
+# Tenant: fragmenty z tenants/<id>/data, wersje bazy w tenants/<id>/knowledge_base
+if args.tenant:
+    paths = tenant_paths(args.tenant)
+    chunks_file, chroma_dir = paths["chunks"], paths["knowledge_base"]
+    manifest_path, shards_path = paths["manifest"], paths["shards"]
 
 print("=" * 50)
 print("WAFAM Vector Database Builder")
 print("=" * 50)
 
-# Krok 1: Wczytaj chunki
-print("\n[1/4] Wczytywanie fragmentów...")
-with open(chunks_file, 'r', encoding='utf-8') as f:
-    chunks = json.load(f)
-print(f"Wczytano {len(chunks)} fragmentów")
-
-# Krok 2: Przygotuj teksty i metadane
-print("\n[2/4] Przygotowywanie danych...")
-texts = []
-metadatas = []
-
-for chunk in chunks:
-    texts.append(chunk['content'])
-    metadatas.append({
-        'id': chunk['id'],
-        'title': chunk['title'],
-        'char_count': chunk['char_count']
-    })
-
-print(f"Przygotowano {len(texts)} tekstów z metadanymi")
-
-# Krok 3: Utwórz embeddingi
-print("\n[3/4] Tworzenie embeddingów (to może chwilę potrwać)...")
-embeddings = OpenAIEmbeddings(
-    model="text-embedding-3-small",
-    openai_api_key=os.getenv("OPENAI_API_KEY")
-)
-
-# Krok 4: Zapisz do ChromaDB
-print("\n[4/4] Zapisywanie do bazy wektorowej...")
-
-# Usuń starą bazę jeśli istnieje
-if os.path.exists(chroma_dir):
-    import shutil
-    shutil.rmtree(chroma_dir)
-
-vectorstore = Chroma.from_texts(
-    texts=texts,
-    embedding=embeddings,
-    metadatas=metadatas,
-    persist_directory=chroma_dir,
-    collection_name="wafam_knowledge"
-)
+# Krok 1: Manifest prepare_knowledge.py (pliki JSONL czytane strumieniowo), bez manifestu - wafam_chunks.json
+print("\n[1/5] Wczytywanie manifestu...")
+manifest = load_manifest(manifest_path)
+if manifest and all(os.path.exists(os.path.join(shards_path, entry["shard"])) for entry in manifest["files"]):
+    print(f"Manifest: {len(manifest['files'])} plików, {sum(entry['chunks'] for entry in manifest['files'])} fragmentów")
+else:
+    manifest = None
+    print("Brak manifestu - fragmenty z wafam_chunks.json")
+
+# Embedder z WAFAM_EMBEDDER (ten sam, którego używa API)
+embeddings = embedder_from_env()
+print(f"Embedder: {embeddings.name}")
+
+# Krok 2: Obecna wersja bazy - fragmenty i wektory (id = hash treści)
+print("\n[2/5] Wczytywanie obecnej bazy...")
+previous = {}
+current_dir = active_dir(chroma_dir)
+
+
+def read_json(path: str) -> dict:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+built = read_json(os.path.join(current_dir, VERSION_MANIFEST))
+built_keys = read_json(os.path.join(current_dir, VERSION_KEYS))
+same_embedder = read_embedder(current_dir) == embeddings.name
+if not same_embedder:
+    print(f"Obecna baza zbudowana embedderem {read_embedder(current_dir)} - pełna przebudowa")
+if not args.full and same_embedder and os.path.exists(os.path.join(current_dir, "chroma.sqlite3")):
+    try:
+        old = chromadb.PersistentClient(path=current_dir).get_collection(COLLECTION)
+        data = old.get(include=["embeddings", "documents", "metadatas"])
+        for key, document, metadata, vector in zip(data["ids"], data["documents"], data["metadatas"], data["embeddings"]):
+            if not built_keys:
+                # Baza sprzed keys.json - hash liczony z treści (stare wersje skryptu miały inne id)
+                key = chunk_hash((metadata or {}).get('title', ''), document)
+            previous[key] = (document, metadata, list(vector))
+    except Exception as e:
+        print(f"Nie udało się odczytać obecnej bazy ({e}) - pełna przebudowa")
+        previous = {}
+print(f"Fragmentów w obecnej bazie: {len(previous)}")
+
+# Krok 3: Fragmenty - pliki bez zmian (ten sam sha256 i ustawienia dzielenia) z obecnej bazy,
+# pozostałe z ich plików JSONL
+print("\n[3/5] Przygotowywanie fragmentów...")
+records = {}
+shard_keys = {}
+
+
+def add_chunks(chunks) -> list[str]:
+    keys = []
+    for chunk in chunks:
+        metadata = {
+            'id': chunk['id'],
+            'title': chunk['title'],
+            'char_count': chunk['char_count']
+        }
+        if chunk.get('source'):
+            metadata['source'] = chunk['source']
+        key = chunk.get('hash') or chunk_hash(chunk['title'], chunk['content'])
+        records[key] = {'document': chunk['content'], 'metadata': metadata}
+        keys.append(key)
+    return keys
+
+
+if manifest:
+    built_files = {}
+    if built.get("settings") == manifest["settings"]:
+        built_files = {entry["source"]: entry["sha256"] for entry in built.get("files", [])}
+    skipped = 0
+    for entry in manifest["files"]:
+        keys = built_keys.get(entry["source"])
+        if (built_files.get(entry["source"]) == entry["sha256"] and keys is not None
+                and all(key in previous for key in keys)):
+            for key in keys:
+                document, metadata, _ = previous[key]
+                records[key] = {'document': document, 'metadata': metadata}
+            shard_keys[entry["source"]] = keys
+            skipped += 1
+        else:
+            shard_keys[entry["source"]] = add_chunks(iter_chunks({"files": [entry]}, shards_path))
+    gone = set(built_files) - set(shard_keys)
+    print(f"Pliki: bez zmian {skipped}, nowe/zmienione {len(manifest['files']) - skipped}, usunięte {len(gone)}")
+else:
+    with open(chunks_file, 'r', encoding='utf-8') as f:
+        add_chunks(json.load(f))
+print(f"Przygotowano {len(records)} unikalnych fragmentów")
+if not records:
+    # Pusta baza nie ma wymiaru wektorów (embedder.json) ani czego szukać - obecna wersja zostaje
+    raise SystemExit("Brak fragmentów do zapisania - dodaj pliki z treścią i uruchom prepare_knowledge.py")
+
+reused = [key for key in records if key in previous]
+to_embed = [key for key in records if key not in previous]
+removed = [key for key in previous if key not in records]
+print(f"Bez zmian: {len(reused)}, nowe/zmienione: {len(to_embed)}, usunięte: {len(removed)}")
+
+
+def save_index(version_dir: str, keys: list[str], vectors: dict):
+    """Plik index.bin dla WAFAM_RETRIEVAL_BACKEND=mmap (wektory, treści i tytuły)"""
+    write_index(
+        os.path.join(version_dir, INDEX_FILE),
+        [vectors[key] for key in keys],
+        [records[key]['document'] for key in keys],
+        [records[key]['metadata']['title'] for key in keys],
+        build=os.path.basename(os.path.normpath(version_dir)),
+        embedder=embeddings.name
+    )
+
+
+def save_manifest(version_dir: str):
+    """Manifest i klucze fragmentów plików - podstawa następnej budowy przyrostowej"""
+    if not manifest:
+        return
+    for name, content in ((VERSION_MANIFEST, manifest), (VERSION_KEYS, shard_keys)):
+        with open(os.path.join(version_dir, name), 'w', encoding='utf-8') as f:
+            json.dump(content, f, ensure_ascii=False)
+
+
+if previous and not to_embed and not removed:
+    if not os.path.exists(os.path.join(current_dir, INDEX_FILE)):
+        # Wersja zbudowana przed plikiem indeksu - dopisz go bez przebudowy
+        save_index(current_dir, list(records), {key: entry[2] for key, entry in previous.items()})
+        print(f"\nDopisano {INDEX_FILE} do obecnej wersji bazy.")
+    if manifest and (built != manifest or not built_keys):
+        save_manifest(current_dir)
+    print("\nBaza jest aktualna - nic do zrobienia.")
+    raise SystemExit(0)
+
+# Krok 4: Embeddingi tylko dla nowych fragmentów, w paczkach
+print("\n[4/5] Tworzenie embeddingów...")
+
+
+async def embed_all(keys: list[str]) -> dict:
+    semaphore = asyncio.Semaphore(args.concurrency)
+    batches = [keys[i:i + args.batch_size] for i in range(0, len(keys), args.batch_size)]
+
+    async def embed_batch(batch):
+        async with semaphore:
+            vectors = await embeddings.aembed_documents([records[key]['document'] for key in batch])
+        print(f"  paczka {len(batch)} fragmentów gotowa")
+        return dict(zip(batch, vectors))
+
+    vectors = {}
+    for result in await asyncio.gather(*(embed_batch(batch) for batch in batches)):
+        vectors.update(result)
+    return vectors
+
+
+start = time.perf_counter()
+vectors = {key: previous[key][2] for key in reused}
+if to_embed:
+    vectors.update(asyncio.run(embed_all(to_embed)))
+print(f"Embeddingi gotowe w {time.perf_counter() - start:.1f} s")
+
+# Krok 5: Zapisz nową wersję obok starej i przełącz wskaźnik
+print("\n[5/5] Zapisywanie do bazy wektorowej...")
+os.makedirs(chroma_dir, exist_ok=True)
+version_dir = new_version_dir(chroma_dir)
+collection = chromadb.PersistentClient(path=version_dir).create_collection(COLLECTION)
+keys = list(records)
+for i in range(0, len(keys), 1000):
+    batch = keys[i:i + 1000]
+    collection.add(
+        ids=batch,
+        embeddings=[vectors[key] for key in batch],
+        documents=[records[key]['document'] for key in batch],
+        metadatas=[records[key]['metadata'] for key in batch]
+    )
+save_index(version_dir, keys, vectors)
+save_manifest(version_dir)
+write_embedder(version_dir, embeddings.name, len(vectors[keys[0]]))
+publish(chroma_dir, version_dir)
 
 print("\n" + "=" * 50)
 print("SUKCES!")
 print("=" * 50)
-print(f"Baza wektorowa zapisana w: {chroma_dir}")
-print(f"Liczba fragmentów: {len(texts)}")
-print("\nGotowe! Możesz teraz używać zaawansowanego RAG.")
\ No newline at end of file
+print(f"Baza wektorowa zapisana w: {version_dir}")
+print(f"Liczba fragmentów: {len(keys)} (nowe embeddingi: {len(to_embed)})")
+print("\nGotowe! Działające API przełączy się na nową wersję samo.")
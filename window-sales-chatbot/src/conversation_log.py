@@ -0,0 +1,235 @@
+"""Dziennik rozmów: każda tura jako rekord JSON w skompresowanych segmentach.
+
+Zapis nigdy nie blokuje obsługi zapytania: log() tylko wkłada rekord do
+ograniczonej kolejki (pełna kolejka = rekord odrzucony i policzony w
+"dropped"), a osobny wątek zapisuje to, co się zebrało, jedną paczką.
+Segmenty to pliki JSONL w gzip:
+    conversations-20261018-091837-12345-0001.jsonl.gz
+Otwarty segment ma końcówkę ".part"; po `segment_records` rekordach albo
+`segment_seconds` sekundach (i przy zamknięciu) jest zamykany i dostaje
+ostateczną nazwę. Przy bezczynności strumień gzip jest opróżniany, więc
+także ".part" da się odczytać do ostatniego opróżnienia.
+
+Odczyt strumieniowy (rekord po rekordzie, bez wczytywania całości):
+    python conversation_log.py ../data/conversations --since 2026-10-01 --summary
+"""
+import argparse
+import atexit
+import glob
+import gzip
+import json
+import os
+import queue
+import threading
+import time
+import zlib
+
+PREFIX = "conversations-"
+SUFFIX = ".jsonl.gz"
+PART = ".part"
+
+# Znacznik końca pracy wątku zapisującego
+STOP = object()
+
+
+class ConversationLog:
+    def __init__(self, directory: str, max_queue: int = 10000, batch_size: int = 500,
+                 flush_interval: float = 1.0, segment_records: int = 100000, segment_seconds: float = 3600):
+        self.directory = directory
+        self.queue = queue.Queue(max_queue)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.segment_records = segment_records
+        self.segment_seconds = segment_seconds
+        self.stats = {"logged": 0, "dropped": 0, "written": 0, "batches": 0, "segments": 0, "errors": 0}
+        self.lock = threading.Lock()
+        self.thread = None
+        self.segment = None
+        self.sequence = 0
+
+    def log(self, record: dict) -> bool:
+        """Dodaj rekord do kolejki (bez czekania); False, gdy kolejka jest pełna"""
+        self.start()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.stats["dropped"] += 1
+            return False
+        self.stats["logged"] += 1
+        return True
+
+    def start(self):
+        with self.lock:
+            if self.thread is None:
+                os.makedirs(self.directory, exist_ok=True)
+                self.thread = threading.Thread(target=self.run, name="conversation-log", daemon=True)
+                self.thread.start()
+                atexit.register(self.close)
+
+    def close(self, timeout: float = 10.0):
+        """Zapisz kolejkę do końca i zamknij segment"""
+        with self.lock:
+            thread, self.thread = self.thread, None
+        if thread is None:
+            return
+        try:
+            self.queue.put(STOP, timeout=timeout)
+        except queue.Full:
+            return
+        thread.join(timeout)
+
+    def get_stats(self) -> dict:
+        return {**self.stats, "queued": self.queue.qsize()}
+
+    def run(self):
+        pending = []
+        while True:
+            try:
+                item = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                # Bezczynność: dane z bufora gzip na dysk, stary segment zamknięty
+                self.flush(idle=True)
+                continue
+            if item is not STOP:
+                pending.append(item)
+            # Paczka = wszystko, co zebrało się w czasie zapisu poprzedniej
+            if pending and (item is STOP or len(pending) >= self.batch_size or self.queue.empty()):
+                self.write(pending)
+                pending = []
+            if item is STOP:
+                self.close_segment()
+                return
+
+    def write(self, records: list[dict]):
+        data = "".join(json.dumps(record, ensure_ascii=False, default=str) + "\n" for record in records)
+        try:
+            segment = self.open_segment()
+            segment["file"].write(data.encode("utf-8"))
+            segment["records"] += len(records)
+            self.stats["written"] += len(records)
+            self.stats["batches"] += 1
+            if segment["records"] >= self.segment_records:
+                self.close_segment()
+        except OSError as e:
+            self.stats["errors"] += 1
+            print(f"Błąd zapisu dziennika rozmów: {e}")
+
+    def flush(self, idle: bool = False):
+        segment = self.segment
+        if segment is None:
+            return
+        try:
+            if idle and time.monotonic() - segment["opened"] >= self.segment_seconds:
+                self.close_segment()
+            else:
+                segment["file"].flush(zlib.Z_SYNC_FLUSH)
+        except OSError as e:
+            self.stats["errors"] += 1
+            print(f"Błąd zapisu dziennika rozmów: {e}")
+
+    def open_segment(self) -> dict:
+        if self.segment is not None and time.monotonic() - self.segment["opened"] >= self.segment_seconds:
+            self.close_segment()
+        if self.segment is None:
+            self.sequence += 1
+            name = f"{PREFIX}{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{self.sequence:04d}{SUFFIX}"
+            path = os.path.join(self.directory, name)
+            self.segment = {
+                "path": path,
+                "file": gzip.open(path + PART, "wb", compresslevel=6),
+                "records": 0,
+                "opened": time.monotonic(),
+            }
+            self.stats["segments"] += 1
+        return self.segment
+
+    def close_segment(self):
+        segment, self.segment = self.segment, None
+        if segment is not None:
+            segment["file"].close()
+            os.replace(segment["path"] + PART, segment["path"])
+
+
+def segment_paths(directory: str, include_open: bool = False) -> list[str]:
+    """Segmenty w kolejności zapisu (nazwa zaczyna się od czasu otwarcia)"""
+    paths = glob.glob(os.path.join(directory, f"{PREFIX}*{SUFFIX}"))
+    if include_open:
+        paths += glob.glob(os.path.join(directory, f"{PREFIX}*{SUFFIX}{PART}"))
+    return sorted(paths, key=os.path.basename)
+
+
+def read_segment(path: str):
+    """Rekordy jednego segmentu; urwany koniec (otwarty albo uszkodzony plik) jest pomijany"""
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+    except (EOFError, gzip.BadGzipFile, zlib.error):
+        return
+
+
+def read_log(directory: str, since: str = None, until: str = None, session_id: str = None,
+             include_open: bool = False):
+    """Rekordy ze wszystkich segmentów, po kolei (generator).
+
+    `since` / `until` - granice znacznika czasu "ts" (ISO, np. "2026-10-01").
+    """
+    for path in segment_paths(directory, include_open):
+        for record in read_segment(path):
+            ts = record.get("ts", "")
+            if since and ts < since or until and ts >= until:
+                continue
+            if session_id and record.get("session_id") != session_id:
+                continue
+            yield record
+
+
+def summarize(records) -> dict:
+    """Zestawienie liczone w jednym przejściu: tury, sesje, źródła odpowiedzi, intencje, czasy, tokeny"""
+    summary = {"turns": 0, "sessions": set(), "source": {}, "intent": {}, "tokens": {}}
+    latencies = []
+    for record in records:
+        summary["turns"] += 1
+        summary["sessions"].add(record.get("session_id"))
+        for field in ("source", "intent"):
+            value = record.get(field) or "-"
+            summary[field][value] = summary[field].get(value, 0) + 1
+        for kind, count in (record.get("usage") or {}).items():
+            summary["tokens"][kind] = summary["tokens"].get(kind, 0) + (count or 0)
+        if record.get("latency_ms") is not None:
+            latencies.append(record["latency_ms"])
+
+    latencies.sort()
+    summary["sessions"] = len(summary["sessions"])
+    if latencies:
+        summary["latency_ms"] = {
+            "p50": latencies[len(latencies) // 2],
+            "p95": latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)],
+            "max": latencies[-1],
+        }
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Odczyt dziennika rozmów")
+    parser.add_argument("directory", help="katalog z segmentami (WAFAM_CONVERSATION_LOG)")
+    parser.add_argument("--since", help="od znacznika czasu, np. 2026-10-01")
+    parser.add_argument("--until", help="do znacznika czasu (bez niego)")
+    parser.add_argument("--session", help="tylko ta sesja")
+    parser.add_argument("--include-open", action="store_true", help="także otwarty segment (.part)")
+    parser.add_argument("--summary", action="store_true", help="zestawienie zamiast rekordów")
+    args = parser.parse_args()
+
+    records = read_log(args.directory, args.since, args.until, args.session, args.include_open)
+    if args.summary:
+        print(json.dumps(summarize(records), ensure_ascii=False, indent=2))
+        return
+    for record in records:
+        print(json.dumps(record, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+"""Backendy embeddingów: OpenAI albo lokalny model na CPU.
+
+WAFAM_EMBEDDER wybiera backend (ten sam dla api.py i build_vectordb.py):
+    openai  - text-embedding-3-small przez API (domyślnie),
+    hashing - haszowane rdzenie słów (jak w BM25) i n-gramy znaków;
+              bez sieci i bez pliku modelu, słabsze od modelu, ale zawsze działa,
+    onnx    - model sentence-embedding w ONNX (np. skwantyzowany
+              multilingual-e5-small) z katalogu WAFAM_ONNX_MODEL
+              (model.onnx + tokenizer.json), mean pooling.
+
+Każdy backend ma `name` - build_vectordb.py zapisuje ją przy wersji bazy,
+a API nie wczyta wersji zbudowanej innym embedderem (wektory różnych
+modeli nie są porównywalne). Lokalne modele liczą w paczkach, w wątku
+(nie blokują pętli zdarzeń).
+
+Klasy mają interfejs embeddingów LangChain (embed_documents, embed_query
+i wersje async), więc nadają się jako embedding_function dla Chroma, a
+ciężkie biblioteki importują dopiero przy tworzeniu.
+"""
+import asyncio
+import hashlib
+import math
+import os
+import zlib
+from collections import Counter
+
+import numpy as np
+
+from lexical import tokenize
+
+
+class OpenAIEmbedder:
+    # Fragment bliżej niż ten próg (kwadrat odległości) uznajemy za trafiony
+    max_distance = 0.8
+
+    def __init__(self, model: str = "text-embedding-3-small", timeout: float = None, max_retries: int = 2,
+                 http_async_client=None):
+        from langchain_openai import OpenAIEmbeddings
+        # API podaje własny klient HTTP (pula połączeń), limit czasu i max_retries=0
+        # (ponowienia robi upstream.py); build_vectordb.py zostaje przy domyślnych
+        self.client = OpenAIEmbeddings(
+            model=model,
+            openai_api_key=os.getenv("OPENAI_API_KEY"),
+            check_embedding_ctx_length=False,
+            request_timeout=timeout,
+            max_retries=max_retries,
+            http_async_client=http_async_client
+        )
+        self.name = f"openai:{model}"
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self.client.embed_documents(texts)
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.client.embed_query(text)
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        return await self.client.aembed_documents(texts)
+
+    async def aembed_query(self, text: str) -> list[float]:
+        return await self.client.aembed_query(text)
+
+    async def aembed_queries(self, texts: list[str]) -> list[list[float]]:
+        """Wiele pytań naraz (paczki z EmbeddingBatcher)"""
+        return await self.client.aembed_documents(texts)
+
+    def warmup(self):
+        # Zdalny model nie wymaga rozgrzewki
+        pass
+
+
+class LocalEmbedder:
+    """Wspólna część modeli liczonych lokalnie: paczki, wątek, rozgrzewka"""
+    max_distance = 0.8
+
+    def __init__(self, batch_size: int = 32):
+        self.batch_size = batch_size
+
+    def embed_batch(self, texts: list[str], query: bool) -> np.ndarray:
+        """Macierz znormalizowanych wektorów (jeden wiersz na tekst)"""
+        raise NotImplementedError
+
+    def embed_many(self, texts: list[str], query: bool = False) -> list[list[float]]:
+        vectors = []
+        for i in range(0, len(texts), self.batch_size):
+            vectors.extend(self.embed_batch(texts[i:i + self.batch_size], query).tolist())
+        return vectors
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self.embed_many(texts)
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_many([text], query=True)[0]
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        return await asyncio.to_thread(self.embed_many, texts)
+
+    async def aembed_query(self, text: str) -> list[float]:
+        return (await self.aembed_queries([text]))[0]
+
+    async def aembed_queries(self, texts: list[str]) -> list[list[float]]:
+        return await asyncio.to_thread(self.embed_many, texts, True)
+
+    def warmup(self):
+        """Pierwsze wywołanie (alokacje, inicjalizacja sesji ONNX) przed ruchem"""
+        self.embed_many(["Dzień dobry, ile kosztują okna PCV z montażem?"] * min(self.batch_size, 8), query=True)
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+class HashingEmbedder(LocalEmbedder):
+    """Haszowane cechy tekstu (feature hashing) z wagą log(1 + tf).
+
+    Cechy: rdzenie słów (polska normalizacja z lexical.py) i n-gramy
+    znaków tych rdzeni, więc "okna", "okno" i "oknami" są blisko.
+    Bez IDF - wektor pytania nie zależy od zawartości bazy, więc
+    przebudowa bazy nie unieważnia wektorów w cache.
+    """
+    max_distance = 1.6
+
+    def __init__(self, dim: int = 1024, ngram: int = 4, ngram_weight: float = 0.5, batch_size: int = 256):
+        super().__init__(batch_size)
+        self.dim = dim
+        self.ngram = ngram
+        self.ngram_weight = ngram_weight
+        self.name = f"hashing:{dim}:{ngram}:{ngram_weight}"
+
+    def features(self, text: str) -> Counter:
+        features = Counter()
+        for token in tokenize(text):
+            features["w:" + token] += 1.0
+            padded = f"<{token}>"
+            for i in range(len(padded) - self.ngram + 1):
+                features["g:" + padded[i:i + self.ngram]] += self.ngram_weight
+        return features
+
+    def embed_batch(self, texts: list[str], query: bool) -> np.ndarray:
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature, weight in self.features(text).items():
+                digest = zlib.crc32(feature.encode("utf-8"))
+                # Najwyższy bit skrótu wybiera znak - kolizje częściowo się znoszą
+                sign = 1.0 if digest & 0x80000000 else -1.0
+                matrix[row, digest % self.dim] += sign * math.log1p(weight)
+        return normalize_rows(matrix)
+
+
+class OnnxEmbedder(LocalEmbedder):
+    """Model sentence-embedding w ONNX (CPU), mean pooling po tokenach"""
+
+    def __init__(self, model_dir: str, batch_size: int = 32, max_length: int = 256, threads: int = 0,
+                 query_prefix: str = "", document_prefix: str = ""):
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        super().__init__(batch_size)
+        model_path = os.path.join(model_dir, "model.onnx")
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length)
+        if self.tokenizer.padding is None:
+            # Własny token wypełnienia modelu (np. XLM-R) zostaje, jeśli jest w tokenizer.json
+            self.tokenizer.enable_padding()
+
+        options = onnxruntime.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {item.name for item in self.session.get_inputs()}
+        # Modele typu e5 oczekują przedrostków "query: " / "passage: "
+        self.query_prefix = query_prefix
+        self.document_prefix = document_prefix
+
+        # Nazwa zależy od zawartości pliku - podmiana modelu = inna nazwa
+        digest = hashlib.sha256()
+        with open(model_path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        self.name = f"onnx:{os.path.basename(os.path.normpath(model_dir))}:{digest.hexdigest()[:12]}"
+
+    def embed_batch(self, texts: list[str], query: bool) -> np.ndarray:
+        prefix = self.query_prefix if query else self.document_prefix
+        encodings = self.tokenizer.encode_batch([prefix + text for text in texts])
+        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feed = {"input_ids": input_ids, "attention_mask": mask}
+        if "token_type_ids" in self.input_names:
+            feed["token_type_ids"] = np.zeros_like(input_ids)
+
+        output = self.session.run(None, feed)[0]
+        if output.ndim == 3:
+            # (paczka, tokeny, wymiar) -> średnia po tokenach bez paddingu
+            weights = mask[:, :, None].astype(np.float32)
+            output = (output * weights).sum(axis=1) / np.maximum(weights.sum(axis=1), 1e-9)
+        return normalize_rows(output.astype(np.float32))
+
+
+def create_embedder(backend: str = "openai", **options):
+    if backend == "openai":
+        return OpenAIEmbedder(
+            options.get("model", "text-embedding-3-small"),
+            timeout=options.get("timeout"),
+            max_retries=options.get("max_retries", 2),
+            http_async_client=options.get("http_async_client")
+        )
+    if backend == "hashing":
+        return HashingEmbedder(dim=options.get("dim", 1024))
+    if backend == "onnx":
+        if not options.get("model_dir"):
+            raise ValueError("WAFAM_EMBEDDER=onnx wymaga katalogu modelu (WAFAM_ONNX_MODEL)")
+        return OnnxEmbedder(
+            options["model_dir"],
+            batch_size=options.get("batch_size", 32),
+            threads=options.get("threads", 0),
+            query_prefix=options.get("query_prefix", ""),
+            document_prefix=options.get("document_prefix", "")
+        )
+    raise ValueError(f"Nieznany embedder: {backend}")
+
+
+def embedder_from_env(**overrides):
+    """Embedder wg zmiennych środowiskowych (wspólne dla API i budowy bazy)"""
+    options = dict(
+        model=os.getenv("WAFAM_OPENAI_EMBED_MODEL", "text-embedding-3-small"),
+        dim=int(os.getenv("WAFAM_HASHING_DIM", "1024")),
+        model_dir=os.getenv("WAFAM_ONNX_MODEL"),
+        batch_size=int(os.getenv("WAFAM_ONNX_BATCH_SIZE", "32")),
+        threads=int(os.getenv("WAFAM_ONNX_THREADS", "0")),
+        query_prefix=os.getenv("WAFAM_ONNX_QUERY_PREFIX", ""),
+        document_prefix=os.getenv("WAFAM_ONNX_DOCUMENT_PREFIX", "")
+    )
+    options.update(overrides)
+    return create_embedder(os.getenv("WAFAM_EMBEDDER", "openai"), **options)
@@ -0,0 +1,87 @@
+"""Zbieranie pytań o embeddingi w paczki (micro-batching).
+
+Przy wielu równoczesnych /chat każde pytanie szło osobnym zapytaniem
+HTTP do OpenAI. EmbeddingBatcher zbiera pytania przez krótkie okno
+(`max_wait`, kilka ms) albo do `max_batch` sztuk, wysyła je jednym
+zapytaniem i każdemu wywołującemu oddaje jego wektor. Te same pytania
+(po normalizacji jak w cache embeddingów) trafiają do paczki raz.
+
+`embed_many(texts)` to dowolna funkcja async zwracająca listę wektorów
+w kolejności tekstów (np. OpenAIEmbeddings.aembed_documents).
+"""
+import asyncio
+
+from retrieval import normalize_query
+
+
+class EmbeddingBatcher:
+    def __init__(self, embed_many, max_batch: int = 64, max_wait: float = 0.005, max_concurrency: int = 8):
+        self.embed_many = embed_many
+        self.max_batch = max(max_batch, 1)
+        self.max_wait = max_wait
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        # Pytania czekające na wysłanie: klucz -> (tekst, future)
+        self.pending = {}
+        self.timer = None
+        self.tasks = set()
+        self.stats = {"requests": 0, "deduplicated": 0, "batches": 0, "inputs": 0, "errors": 0}
+
+    async def embed(self, text: str):
+        """Wektor jednego pytania - wysłany razem z innymi z tego samego okna"""
+        self.stats["requests"] += 1
+        key = normalize_query(text)
+        entry = self.pending.get(key)
+        if entry is not None:
+            self.stats["deduplicated"] += 1
+            future = entry[1]
+        else:
+            future = asyncio.get_running_loop().create_future()
+            self.pending[key] = (text, future)
+            if len(self.pending) >= self.max_batch:
+                self.flush()
+            elif self.timer is None:
+                self.timer = asyncio.get_running_loop().call_later(self.max_wait, self.flush)
+        # shield - przerwane zapytanie nie anuluje wyniku innym czekającym
+        return await asyncio.shield(future)
+
+    def flush(self):
+        """Wyślij zebraną paczkę (bez czekania na koniec okna)"""
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        if not self.pending:
+            return
+        batch, self.pending = list(self.pending.values()), {}
+        task = asyncio.create_task(self.send(batch))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def send(self, batch: list):
+        self.stats["batches"] += 1
+        self.stats["inputs"] += len(batch)
+        try:
+            async with self.semaphore:
+                vectors = await self.embed_many([text for text, _ in batch])
+            if len(vectors) != len(batch):
+                # Bez tego część wywołujących czekałaby na swój wektor w nieskończoność
+                raise ValueError(f"embed_many zwróciło {len(vectors)} wektorów dla {len(batch)} tekstów")
+        except Exception as e:
+            self.stats["errors"] += 1
+            self.fail(batch, e)
+            return
+        except asyncio.CancelledError:
+            self.fail(batch, RuntimeError("paczka embeddingów przerwana"))
+            raise
+        for (_, future), vector in zip(batch, vectors):
+            if not future.done():
+                future.set_result(vector)
+
+    @staticmethod
+    def fail(batch: list, error: BaseException):
+        for _, future in batch:
+            if not future.done():
+                future.set_exception(error)
+
+    def get_stats(self) -> dict:
+        batches = self.stats["batches"]
+        return {**self.stats, "avg_batch": round(self.stats["inputs"] / batches, 2) if batches else 0.0}
@@ -0,0 +1,155 @@
+"""Jednoprzebiegowe rozpoznawanie intencji, produktu i danych kontaktowych.
+
+Wszystkie słowa kluczowe są w jednym skompilowanym wyrażeniu ułożonym
+jak drzewo prefiksów (ko(?:szt(?:uje)?|ntakt)...), więc na każdej pozycji
+silnik sprawdza tylko gałąź pasującą do bieżącej litery - działa to jak
+automat Aho-Corasick, ale w całości w C. Słowa dopasowujemy jako podciągi
+(tak jak wcześniejsze `word in message_lower`): wyrażenie zagląda naprzód
+(?=...) i bierze najdłuższe słowo zaczynające się w danym miejscu, a słowa
+w nim zawarte (np. "koszt" w "kosztuje") dolicza gotowa tabela.
+
+Telefon i e-mail szukamy tylko wtedy, gdy w wiadomości jest cyfra lub "@"
+(sprawdzenie `in` kosztuje ułamek mikrosekundy, a większość wiadomości
+nie zawiera danych kontaktowych).
+
+Tabele słów można nadpisać plikiem JSON (WAFAM_KEYWORDS_FILE) o tych
+samych kluczach co DEFAULT_KEYWORDS; brakujące klucze zostają domyślne.
+"""
+import functools
+import json
+import operator
+import re
+from dataclasses import dataclass
+
+DEFAULT_KEYWORDS = {
+    # Kolejność intencji = priorytet (pierwsza pasująca wygrywa)
+    "intents": {
+        "pomiar": ["pomiar", "umówić", "wizyta", "przyjechać"],
+        "cena": ["cena", "koszt", "ile", "kosztuje", "drogo", "tanio"],
+        "kontakt": ["kontakt", "telefon", "zadzwonić", "email", "adres", "gdzie jesteście"],
+        "produkty": ["jakie macie", "co macie", "oferta", "produkty", "asortyment"],
+        "rekomendacja": ["polecasz", "polecacie", "doradzisz", "co wybrać", "która", "który"],
+        "wyjasnienie": ["dlaczego", "czemu", "po co"],
+        "wycena": ["wycena", "ofertę", "przygotuj"],
+    },
+    # Produkt zapisywany w danych sesji (też wg kolejności)
+    "products": {
+        "okna": ["okna", "okno"],
+        "drzwi": ["drzwi"],
+        "rolety": ["rolety", "roleta"],
+        "bramy": ["brama", "bramy", "garaż"],
+    },
+    # Słowa, po których pytanie staje się tematem rozmowy
+    "topic": ["okna", "okno", "drzwi", "rolety", "roleta", "bramy", "brama", "żaluzje", "taras", "przesuwne"],
+    # Krótkie odpowiedzi ("tak", "ok") rozszerzane o temat rozmowy
+    "short_replies": ["tak", "nie", "podaj", "link", "chcę", "poproszę", "dawaj", "ok", "okej", "dobrze"],
+    "short_reply_max_words": 4,
+}
+
+EMAIL_PATTERN = r"\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b"
+# Numer z opcjonalnym +48 (9 cyfr, spacje lub myślniki między grupami)
+PHONE_PATTERN = r"\+48[\s-]?\d{3}[\s-]?\d{3}[\s-]?\d{3}\b|\b\d{3}[\s-]?\d{3}[\s-]?\d{3}\b"
+EMAIL_RE = re.compile(EMAIL_PATTERN)
+PHONE_RE = re.compile(PHONE_PATTERN)
+PHONE_SEPARATORS = re.compile(r"[\s\-\+]")
+DIGIT_RE = re.compile(r"\d")
+
+
+@dataclass(slots=True)
+class Extraction:
+    intent: str = "ogolne"
+    product: str = None
+    topic: bool = False
+    phone: str = None
+    email: str = None
+    short_reply: bool = False
+
+
+def load_keywords(path: str = None) -> dict:
+    """Domyślne tabele słów, nadpisane zawartością pliku JSON (jeśli podany)"""
+    keywords = dict(DEFAULT_KEYWORDS)
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            keywords.update(json.load(f))
+    return keywords
+
+
+def keyword_pattern(words) -> str:
+    """Alternatywa słów jako drzewo prefiksów; dłuższe dopasowanie ma pierwszeństwo"""
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node) -> str:
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        # Koniec słowa w środku gałęzi - kontynuacja opcjonalna (zachłanna = najdłuższe słowo)
+        return f"(?:{body})?" if "" in node else body
+
+    return build(trie)
+
+
+class Extractor:
+    def __init__(self, keywords: dict = None):
+        keywords = keywords or DEFAULT_KEYWORDS
+        self.intents = list(keywords["intents"])
+        self.products = list(keywords["products"])
+        self.short_reply_max_words = keywords["short_reply_max_words"]
+
+        # Każda etykieta to jeden bit: najpierw intencje i produkty wg priorytetu,
+        # potem temat i krótka odpowiedź. Najniższy ustawiony bit = najważniejsza.
+        self.product_shift = len(self.intents)
+        self.topic_bit = 1 << (self.product_shift + len(self.products))
+        self.short_bit = self.topic_bit << 1
+
+        masks = {}
+        for bit, words in enumerate(list(keywords["intents"].values()) + list(keywords["products"].values())):
+            for word in words:
+                masks[word.lower()] = masks.get(word.lower(), 0) | 1 << bit
+        for word in keywords["topic"]:
+            masks[word.lower()] = masks.get(word.lower(), 0) | self.topic_bit
+        for word in keywords["short_replies"]:
+            masks[word.lower()] = masks.get(word.lower(), 0) | self.short_bit
+
+        # Domknięcie: dopasowane słowo niesie też etykiety słów w nim zawartych
+        self.masks = {
+            word: functools.reduce(operator.or_, (masks[other] for other in masks if other in word))
+            for word in masks
+        }
+        self.intent_mask = (1 << self.product_shift) - 1
+        self.product_mask = (1 << len(self.products)) - 1
+
+        self.pattern = re.compile(f"(?=({keyword_pattern(masks)}))")
+
+    def extract(self, message: str) -> Extraction:
+        """Jedno przejście po wiadomości: intencja, produkt, temat, telefon, e-mail"""
+        text = message.lower()
+        found = 0
+        for word in self.pattern.findall(text):
+            found |= self.masks[word]
+
+        result = Extraction(topic=bool(found & self.topic_bit))
+        intents = found & self.intent_mask
+        if intents:
+            result.intent = self.intents[(intents & -intents).bit_length() - 1]
+        products = found >> self.product_shift & self.product_mask
+        if products:
+            result.product = self.products[(products & -products).bit_length() - 1]
+        if found & self.short_bit:
+            result.short_reply = len(text.split()) <= self.short_reply_max_words
+
+        if "@" in text:
+            match = EMAIL_RE.search(text)
+            if match:
+                result.email = match.group()
+        if DIGIT_RE.search(text):
+            match = PHONE_RE.search(text)
+            if match:
+                phone = PHONE_SEPARATORS.sub("", match.group())
+                result.phone = phone[2:] if phone.startswith("48") else phone
+        return result
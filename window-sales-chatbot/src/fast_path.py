@@ -0,0 +1,168 @@
+"""Szybka ścieżka: stałe odpowiedzi bez modelu (kontakt, social media, potwierdzenie danych).
+
+Pytania o telefon, adres, e-mail, godziny otwarcia czy Facebooka mają
+zawsze tę samą odpowiedź - dane z bazy wiedzy (fragmenty "Dane kontaktowe"
+i "Social media"). Tak samo podziękowanie, gdy klient poda telefon lub
+e-mail. Takie wiadomości dostają odpowiedź z szablonu w mikrosekundach.
+
+Każda reguła liczy pewność (0-1): krótka wiadomość tylko o kontakcie ma
+1.0, dodatkowe pytania, nazwy produktów albo długa treść ją obniżają.
+Poniżej progu (WAFAM_FAST_PATH_MIN_CONFIDENCE) odpowiada model.
+"""
+import json
+import re
+
+# Początki słów wskazujące, o którą daną kontaktową chodzi (frazy ze spacją - podciąg)
+SLOT_KEYWORDS = {
+    "address": ["adres", "gdzie jesteście", "gdzie się znajduj", "dojecha", "dojazd", "lokalizacj", "siedzib"],
+    # Samo "numer" / "dzwonić" to też numer zamówienia, NIP, "czy dzwonić przed dostawą" - tylko frazy o telefonie
+    "phone": ["telefon", "numer tel", "numeru tel", "nr tel", "zadzwoni", "jak dzwoni", "gdzie dzwoni"],
+    "email": ["email", "mail"],
+    "hours": ["godzin", "otwarc", "otwart", "czynn"],
+    "social": ["facebook", "opini", "recenzj"],
+}
+# "kontakt" bez szczegółów = wszystkie dane kontaktowe
+GENERAL_CONTACT = ["kontakt", "skontaktow"]
+# Wiadomość zaczynająca się od nich to odpowiedź na pytanie bota ("Tak, na maila"), nie pytanie
+REPLY_WORDS = {"tak", "nie", "ok", "okej", "dobrze", "chętnie"}
+
+PHONE_LINE = re.compile(r"^([A-ZĄĆĘŁŃÓŚŹŻ][a-ząćęłńóśźż]+): (\d{3} \d{3} \d{3})$")
+LINK_LINE = re.compile(r"^(Facebook|Google Maps): (\[.+\]\(.+\))$")
+EMAIL_RE = re.compile(r"[\w.+-]+@[\w-]+\.[\w.]+")
+WORD_RE = re.compile(r"\w+")
+
+# Źródła odpowiedzi (tytuły fragmentów bazy wiedzy) dla każdej reguły
+SOURCES = {"contact": ["Dane kontaktowe"], "social": ["Social media i opinie"], "confirmation": []}
+
+
+def mentions(text: str, words: list[str], keywords: list[str]) -> bool:
+    """Czy któreś słowo wiadomości zaczyna się od słowa kluczowego (fraza - podciąg tekstu)"""
+    return any(keyword in text if " " in keyword else any(word.startswith(keyword) for word in words)
+               for keyword in keywords)
+
+
+def parse_contact_facts(chunks: list[dict], contact_line: str = None) -> dict:
+    """Adres, e-mail, telefony handlowców, godziny i linki z fragmentów bazy wiedzy.
+
+    Brakujący e-mail jest brany z `contact_line` (linia KONTAKT promptu systemowego).
+    """
+    facts = {"phones": [], "hours": [], "links": {}}
+    for chunk in chunks:
+        for line in chunk["content"].splitlines():
+            line = line.strip()
+            if line.startswith("Adres:"):
+                facts["address"] = line.split(":", 1)[1].strip()
+            elif line.startswith("E-mail:"):
+                facts["email"] = line.split(":", 1)[1].strip()
+            elif line.startswith(("Poniedziałek", "Sobota")):
+                facts["hours"].append(line)
+            elif match := PHONE_LINE.match(line):
+                if match.groups() not in facts["phones"]:
+                    facts["phones"].append(match.groups())
+            elif match := LINK_LINE.match(line):
+                facts["links"].setdefault(match.group(1), match.group(2))
+    if "email" not in facts and contact_line and (match := EMAIL_RE.search(contact_line)):
+        facts["email"] = match.group(0)
+    return facts
+
+
+class FastPath:
+    def __init__(self, facts: dict, min_confidence: float = 0.7, max_words: int = 12, company: str = "WAFAM"):
+        self.facts = facts
+        self.company = company
+        self.min_confidence = min_confidence
+        self.max_words = max_words
+        self.stats = {"checked": 0, "answered": 0, "declined": 0}
+
+    @classmethod
+    def from_chunks_file(cls, path: str, contact_line: str = None, **options):
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(parse_contact_facts(json.load(f), contact_line), **options)
+
+    def confidence(self, text: str, extracted, extra_words: int = 0) -> float:
+        """Pewność, że wiadomość dotyczy tylko danych kontaktowych"""
+        score = 1.0
+        words = WORD_RE.findall(text)
+        if len(words) - extra_words > self.max_words:
+            score -= 0.4
+        if text.count("?") > 1:
+            score -= 0.3
+        if extracted.product or extracted.topic:
+            # Pytanie o produkt przy okazji - tego szablon nie obsłuży
+            score -= 0.4
+        if extracted.intent not in ("kontakt", "ogolne"):
+            score -= 0.4
+        if words and words[0] in REPLY_WORDS and not extra_words:
+            score -= 0.5
+        return max(score, 0.0)
+
+    def answer(self, message: str, extracted, data: dict):
+        """{"rule", "bot", "sources"} albo None - wtedy odpowiada model"""
+        self.stats["checked"] += 1
+        rule, text, confidence = self.match(message, extracted, data)
+        if text is None:
+            return None
+        if confidence < self.min_confidence:
+            self.stats["declined"] += 1
+            return None
+        self.stats["answered"] += 1
+        return {"rule": rule, "bot": text, "sources": SOURCES[rule]}
+
+    def match(self, message: str, extracted, data: dict):
+        text = message.lower()
+        if extracted.phone or extracted.email:
+            # Klient podał kontakt - słowa numeru / adresu nie liczą się do długości
+            contact_words = sum(len(WORD_RE.findall(value)) for value in (extracted.phone, extracted.email) if value)
+            confidence = self.confidence(text, extracted, contact_words)
+            if "?" in text:
+                confidence -= 0.4
+            return "confirmation", self.confirmation(data, extracted), confidence
+
+        words = WORD_RE.findall(text)
+        slots = [slot for slot, keywords in SLOT_KEYWORDS.items() if mentions(text, words, keywords)]
+        if not slots and (extracted.intent == "kontakt" or mentions(text, words, GENERAL_CONTACT)):
+            slots = ["address", "phone", "email", "hours"]
+        if not slots:
+            return None, None, 0.0
+        answer = self.contact(slots)
+        if answer is None:
+            # Brak danych w bazie wiedzy (np. zmieniony układ tekstu)
+            return None, None, 0.0
+        return ("social" if slots == ["social"] else "contact"), answer, self.confidence(text, extracted)
+
+    def contact(self, slots: list[str]):
+        facts = self.facts
+        lines = []
+        if "address" in slots and facts.get("address"):
+            lines.append(f"- Adres: {facts['address']}")
+        if "phone" in slots and facts["phones"]:
+            lines.append("- Telefon: " + ", ".join(f"{name} {number}" for name, number in facts["phones"]))
+        if "email" in slots and facts.get("email"):
+            lines.append(f"- E-mail: {facts['email']}")
+        if "hours" in slots and facts["hours"]:
+            lines.append("- Godziny otwarcia: " + ", ".join(facts["hours"]))
+        if "social" in slots and facts["links"]:
+            lines.extend(f"- {name}: {link}" for name, link in facts["links"].items())
+        if len(lines) < len(slots):
+            return None
+        if slots == ["social"]:
+            return "Mamy bardzo pozytywne opinie od klientów - zajrzyj:\n" + "\n".join(lines)
+        header = f"Dane kontaktowe {self.company}:" if self.company else "Dane kontaktowe:"
+        return (header + "\n" + "\n".join(lines) +
+                "\n\nMożesz też zostawić tu telefon lub e-mail - handlowiec odezwie się w ciągu 24h.")
+
+    def confirmation(self, data: dict, extracted) -> str:
+        if extracted.phone:
+            phone = extracted.phone
+            if len(phone) == 9 and phone.isdigit():
+                phone = f"{phone[:3]} {phone[3:6]} {phone[6:]}"
+            text = f"Dziękuję! Zapisałem numer {phone} - handlowiec oddzwoni w ciągu 24h"
+        else:
+            text = f"Dziękuję! Zapisałem adres {extracted.email} - handlowiec odpisze w ciągu 24h"
+        if data.get("produkt"):
+            return f"{text} w sprawie: {data['produkt']}. Czy mogę jeszcze w czymś pomóc?"
+        return f"{text}. Napisz jeszcze, jakie produkty Cię interesują - handlowiec przygotuje się do rozmowy."
+
+    def get_stats(self) -> dict:
+        checked = self.stats["checked"]
+        return {**self.stats, "ratio": round(self.stats["answered"] / checked, 4) if checked else 0.0}
@@ -0,0 +1,144 @@
+"""Wersje bazy wiedzy i przełączanie bez przestojów.
+
+build_vectordb.py buduje każdą wersję w nowym katalogu
+knowledge_base/kb-<data>, a na koniec podmienia plik wskaźnika
+knowledge_base/CURRENT (os.replace - zmiana atomowa). API sprawdza
+wskaźnik co kilka sekund i po zmianie wczytuje nową wersję w tle;
+do tego czasu odpowiada ze starej.
+
+Stary układ (Chroma bezpośrednio w knowledge_base/) nadal działa,
+dopóki nie powstanie pierwszy plik CURRENT.
+
+Każda wersja ma plik embedder.json z nazwą embeddera, który ją zbudował;
+wersję zbudowaną innym embedderem API odrzuca (zostaje przy poprzedniej).
+"""
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import time
+
+POINTER = "CURRENT"
+VERSION_PREFIX = "kb-"
+EMBEDDER_FILE = "embedder.json"
+# Wersje sprzed zapisu embedder.json budował zawsze text-embedding-3-small
+LEGACY_EMBEDDER = "openai:text-embedding-3-small"
+
+
+def chunk_hash(title: str, content: str) -> str:
+    """Identyfikator fragmentu zależny tylko od treści"""
+    return hashlib.sha256(f"{title}\n{content}".encode("utf-8")).hexdigest()[:32]
+
+
+def current_version(root: str):
+    """Nazwa aktywnej wersji albo None (stary układ bez wskaźnika)"""
+    try:
+        with open(os.path.join(root, POINTER), "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def active_dir(root: str) -> str:
+    version = current_version(root)
+    return os.path.join(root, version) if version else root
+
+
+def new_version_dir(root: str) -> str:
+    name = VERSION_PREFIX + time.strftime("%Y%m%d-%H%M%S")
+    path = os.path.join(root, name)
+    suffix = 1
+    while os.path.exists(path):
+        suffix += 1
+        path = os.path.join(root, f"{name}-{suffix}")
+    return path
+
+
+def write_embedder(version_dir: str, name: str, dim: int):
+    with open(os.path.join(version_dir, EMBEDDER_FILE), "w", encoding="utf-8") as f:
+        json.dump({"name": name, "dim": dim}, f)
+
+
+def read_embedder(path: str) -> str:
+    """Nazwa embeddera, którym zbudowano wersję bazy"""
+    try:
+        with open(os.path.join(path, EMBEDDER_FILE), "r", encoding="utf-8") as f:
+            return json.load(f)["name"]
+    except FileNotFoundError:
+        return LEGACY_EMBEDDER
+
+
+def check_embedder(path: str, name: str):
+    built_with = read_embedder(path)
+    if built_with != name:
+        raise ValueError(
+            f"Baza {path} zbudowana embedderem {built_with}, a skonfigurowany jest {name} "
+            f"- przebuduj bazę (build_vectordb.py) albo zmień WAFAM_EMBEDDER"
+        )
+
+
+def publish(root: str, version_dir: str, keep: int = 2):
+    """Ustaw wersję jako aktywną i usuń najstarsze (zostaje `keep` ostatnich)"""
+    tmp = os.path.join(root, POINTER + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(os.path.basename(version_dir))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, os.path.join(root, POINTER))
+
+    # Poprzednia wersja zostaje - workery, które jeszcze jej nie porzuciły,
+    # mogą z niej czytać
+    versions = sorted(
+        (name for name in os.listdir(root)
+         if name.startswith(VERSION_PREFIX) and os.path.isdir(os.path.join(root, name))),
+        key=lambda name: os.path.getmtime(os.path.join(root, name))
+    )
+    for name in versions[:-keep]:
+        shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+
+
+class KnowledgeBase:
+    """Aktywna wersja bazy wiedzy z automatycznym przeładowaniem.
+
+    `loader(path)` otwiera katalog wersji i zwraca dowolny obiekt
+    (np. krotkę: vectorstore, indeks NumPy) dostępny jako `current`.
+    """
+
+    def __init__(self, root: str, loader, check_every: float = 5.0):
+        self.root = root
+        self.loader = loader
+        self.check_every = check_every
+        self.version = current_version(root)
+        self.current = loader(active_dir(root))
+        self.last_check = time.monotonic()
+        self.reloads = 0
+        # Ostatnia wersja, której nie udało się wczytać (nie próbujemy jej co chwilę)
+        self.rejected = None
+        self.lock = asyncio.Lock()
+
+    async def refresh(self, force: bool = False) -> bool:
+        """Przeładuj, jeśli wskaźnik CURRENT zmienił się od ostatniego wczytania"""
+        now = time.monotonic()
+        if not force and now - self.last_check < self.check_every:
+            return False
+        self.last_check = now
+        version = current_version(self.root)
+        if version in (self.version, self.rejected) and not force:
+            return False
+
+        async with self.lock:
+            if version in (self.version, self.rejected) and not force:
+                return False
+            path = os.path.join(self.root, version) if version else self.root
+            # Wczytanie trwa - w tym czasie zapytania korzystają ze starej wersji
+            try:
+                self.current = await asyncio.to_thread(self.loader, path)
+            except Exception as e:
+                self.rejected = version
+                print(f"Nie wczytano bazy wiedzy {version or path}: {e}")
+                return False
+            self.version = version
+            self.reloads += 1
+            print(f"Baza wiedzy przeładowana: {version or path}")
+            return True
@@ -0,0 +1,215 @@
+"""Baza leadów w SQLite (tryb WAL).
+
+Unikalne indeksy na telefonie i e-mailu dają sprawdzanie duplikatów bez
+skanowania całej listy, a AUTOINCREMENT - unikalne id także przy
+równoległych zapisach z wielu wątków i procesów.
+
+Lista leadów jest stronicowana kursorem (created_at, id) - kolejna strona
+to jedno zapytanie po indeksie, niezależnie od tego, jak daleko od
+początku. Liczby leadów na status utrzymują wyzwalacze (lead_counts),
+więc count() nie przegląda tabeli.
+"""
+import base64
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS leads (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    phone TEXT,
+    email TEXT,
+    product TEXT NOT NULL,
+    session_id TEXT,
+    created_at TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'nowy'
+);
+CREATE UNIQUE INDEX IF NOT EXISTS leads_phone ON leads(phone) WHERE phone IS NOT NULL;
+CREATE UNIQUE INDEX IF NOT EXISTS leads_email ON leads(email) WHERE email IS NOT NULL;
+CREATE INDEX IF NOT EXISTS leads_status ON leads(status);
+CREATE INDEX IF NOT EXISTS leads_created ON leads(created_at, id);
+CREATE INDEX IF NOT EXISTS leads_status_created ON leads(status, created_at, id);
+CREATE INDEX IF NOT EXISTS leads_product_created ON leads(product, created_at, id);
+CREATE TABLE IF NOT EXISTS migrations (name TEXT PRIMARY KEY, applied_at TEXT NOT NULL);
+"""
+
+# Liczniki leadów na status, aktualizowane w tej samej transakcji co zmiana w leads
+COUNTS_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS lead_counts (status TEXT PRIMARY KEY, n INTEGER NOT NULL)",
+    """CREATE TRIGGER IF NOT EXISTS lead_counts_insert AFTER INSERT ON leads BEGIN
+        INSERT INTO lead_counts VALUES (NEW.status, 1) ON CONFLICT(status) DO UPDATE SET n = n + 1;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS lead_counts_delete AFTER DELETE ON leads BEGIN
+        UPDATE lead_counts SET n = n - 1 WHERE status = OLD.status;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS lead_counts_update AFTER UPDATE OF status ON leads
+    WHEN OLD.status IS NOT NEW.status BEGIN
+        UPDATE lead_counts SET n = n - 1 WHERE status = OLD.status;
+        INSERT INTO lead_counts VALUES (NEW.status, 1) ON CONFLICT(status) DO UPDATE SET n = n + 1;
+    END""",
+)
+
+COLUMNS = ("id", "phone", "email", "product", "session_id", "created_at", "status")
+
+
+class LeadStore:
+    def __init__(self, path: str, legacy_json: str = None):
+        self.path = path
+        self.local = threading.local()
+        self.db.executescript(SCHEMA)
+        self.migrate_counts()
+        if legacy_json:
+            self.migrate_json(legacy_json)
+
+    @property
+    def db(self):
+        """Osobne połączenie dla każdego wątku"""
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.row_factory = sqlite3.Row
+            self.local.connection = connection
+        return connection
+
+    def migrate_json(self, json_path: str):
+        """Jednorazowe przeniesienie leadów z dawnego leads.json"""
+        if not os.path.exists(json_path):
+            return
+        db = self.db
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            if db.execute("SELECT 1 FROM migrations WHERE name = 'leads_json'").fetchone():
+                db.execute("ROLLBACK")
+                return
+            with open(json_path, 'r', encoding='utf-8') as f:
+                leads_list = json.load(f)
+            now = datetime.now().strftime("%Y-%m-%d %H:%M")
+            moved = 0
+            for lead in leads_list:
+                # Nowe id z AUTOINCREMENT - dawny zapis do pliku potrafił nadać dwóm leadom to samo id;
+                # pomijane są tylko powtórzone telefony/e-maile
+                cursor = db.execute(
+                    "INSERT OR IGNORE INTO leads (phone, email, product, session_id, created_at, status) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (lead.get("phone"), lead.get("email"), lead.get("product") or "nieznany",
+                     lead.get("session_id"), lead.get("created_at") or now, lead.get("status") or "nowy")
+                )
+                moved += cursor.rowcount
+            db.execute(
+                "INSERT INTO migrations VALUES ('leads_json', ?)",
+                (datetime.now().strftime("%Y-%m-%d %H:%M"),)
+            )
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+        os.replace(json_path, json_path + ".migrated")
+        print(f"Przeniesiono {moved} leadów z {json_path}, pominięto {len(leads_list) - moved} (powtórzony telefon/e-mail)")
+
+    def migrate_counts(self):
+        """Wyzwalacze liczników i ich jednorazowe wypełnienie dla istniejącej bazy"""
+        db = self.db
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            if db.execute("SELECT 1 FROM migrations WHERE name = 'lead_counts'").fetchone():
+                db.execute("ROLLBACK")
+                return
+            for statement in COUNTS_SCHEMA:
+                db.execute(statement)
+            db.execute("DELETE FROM lead_counts")
+            db.execute("INSERT INTO lead_counts SELECT status, COUNT(*) FROM leads GROUP BY status")
+            db.execute(
+                "INSERT INTO migrations VALUES ('lead_counts', ?)",
+                (datetime.now().strftime("%Y-%m-%d %H:%M"),)
+            )
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+
+    def add(self, phone: str = None, email: str = None, product: str = None, session_id: str = None):
+        """Dodaj lead; zwraca zapisany lead albo None, gdy telefon/e-mail już jest w bazie"""
+        created_at = datetime.now().strftime("%Y-%m-%d %H:%M")
+        try:
+            cursor = self.db.execute(
+                "INSERT INTO leads (phone, email, product, session_id, created_at, status) "
+                "VALUES (?, ?, ?, ?, ?, 'nowy')",
+                (phone, email, product or "nieznany", session_id, created_at)
+            )
+        except sqlite3.IntegrityError:
+            return None
+        return {
+            "id": cursor.lastrowid,
+            "phone": phone,
+            "email": email,
+            "product": product or "nieznany",
+            "session_id": session_id,
+            "created_at": created_at,
+            "status": "nowy"
+        }
+
+    def page(self, status: str = None, product: str = None, date_from: str = None, date_to: str = None,
+             order: str = "desc", limit: int = 50, cursor: str = None) -> tuple[list[dict], str]:
+        """Jedna strona leadów po created_at; zwraca (leady, kursor następnej strony albo None).
+
+        date_from / date_to - "RRRR-MM-DD" albo "RRRR-MM-DD GG:MM"; date_to bez niego.
+        """
+        conditions, params = [], []
+        for column, value in (("status", status), ("product", product)):
+            if value:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        if date_from:
+            conditions.append("created_at >= ?")
+            params.append(date_from)
+        if date_to:
+            conditions.append("created_at < ?")
+            params.append(date_to)
+        direction = "ASC" if order == "asc" else "DESC"
+        if cursor:
+            # Dalej niż ostatni lead poprzedniej strony (porównanie par - po indeksie)
+            conditions.append(f"(created_at, id) {'>' if direction == 'ASC' else '<'} (?, ?)")
+            params.extend(decode_cursor(cursor))
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        rows = self.db.execute(
+            f"SELECT * FROM leads {where} ORDER BY created_at {direction}, id {direction} LIMIT ?",
+            (*params, limit + 1)
+        ).fetchall()
+        leads = [dict(row) for row in rows[:limit]]
+        next_cursor = encode_cursor(leads[-1]) if len(rows) > limit else None
+        return leads, next_cursor
+
+    def pages(self, chunk: int = 500, **filters):
+        """Wszystkie pasujące leady, strona po stronie (generator list) - bez wczytywania całości"""
+        cursor = None
+        while True:
+            leads, cursor = self.page(limit=chunk, cursor=cursor, **filters)
+            if leads:
+                yield leads
+            if cursor is None:
+                return
+
+    def count(self, status: str = None) -> int:
+        """Liczba leadów z liczników (bez przeglądania tabeli)"""
+        if status:
+            row = self.db.execute("SELECT n FROM lead_counts WHERE status = ?", (status,)).fetchone()
+            return row[0] if row else 0
+        return self.db.execute("SELECT COALESCE(SUM(n), 0) FROM lead_counts").fetchone()[0]
+
+
+def encode_cursor(lead: dict) -> str:
+    raw = json.dumps([lead["created_at"], lead["id"]]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> tuple:
+    try:
+        created_at, lead_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return str(created_at), int(lead_id)
+    except (ValueError, TypeError) as e:
+        raise ValueError("Nieprawidłowy kursor") from e
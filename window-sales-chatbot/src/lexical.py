@@ -0,0 +1,149 @@
+"""Wyszukiwanie leksykalne BM25 z normalizacją pod język polski.
+
+Indeks odwrócony budowany jest przez prepare_knowledge.py i zapisywany
+obok wafam_chunks.json. Dobrze łapie dokładne nazwy produktów
+("HST", "PSK", "Swisspacer", "Hoppe Secustik", "Uw"), z którymi
+wyszukiwanie wektorowe radzi sobie słabiej.
+"""
+import json
+import math
+import re
+from collections import Counter
+
+# Polskie znaki -> odpowiedniki bez ogonków
+DIACRITICS = str.maketrans("ąćęłńóśźż", "acelnoszz")
+
+STOPWORDS = {
+    "a", "aby", "ale", "bo", "by", "czy", "do", "dla", "i", "ich", "ja", "jak",
+    "jaka", "jaki", "jakie", "jest", "juz", "ktora", "ktore", "ktory", "mam",
+    "mi", "mnie", "na", "nie", "o", "od", "oraz", "po", "pod", "przy", "sa",
+    "sie", "sobie", "ta", "tak", "te", "to", "tu", "u", "w", "we", "z", "za",
+    "ze", "co", "czym", "czego", "macie", "moge", "mozna", "pan", "pani",
+}
+
+# Końcówki fleksyjne (bez ogonków), od najdłuższych
+SUFFIXES = sorted([
+    "owania", "owanie", "osciach", "osciami", "oscia", "osci", "ami", "ach",
+    "ego", "emu", "owi", "ych", "ymi", "imi", "ich", "iej", "ow", "om", "em",
+    "ie", "ia", "ej", "ym", "im", "a", "e", "i", "y", "o", "u",
+], key=len, reverse=True)
+
+TOKEN_RE = re.compile(r"\w+")
+
+
+def stem(token: str) -> str:
+    """Prosty stemmer: obcina końcówkę, zostawiając rdzeń min. 3 znaki"""
+    if len(token) <= 4 or token.isdigit():
+        return token
+    for suffix in SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= 3:
+            return token[:-len(suffix)]
+    return token
+
+
+def tokenize(text: str) -> list[str]:
+    text = text.lower().translate(DIACRITICS)
+    return [stem(t) for t in TOKEN_RE.findall(text) if t not in STOPWORDS]
+
+
+def build_index(chunks, k1: float = 1.2, b: float = 0.75) -> dict:
+    """Zbuduj indeks odwrócony BM25 z fragmentów (lista albo iterator - jedno przejście, bez kopii)"""
+    postings = {}
+    documents = []
+
+    for doc_id, chunk in enumerate(chunks):
+        terms = tokenize(chunk["title"] + "\n" + chunk["content"])
+        documents.append({
+            "id": chunk["id"],
+            "title": chunk["title"],
+            "content": chunk["content"],
+            "length": len(terms),
+        })
+        for term, tf in Counter(terms).items():
+            postings.setdefault(term, []).append((doc_id, tf))
+
+    count = len(documents)
+    idf = {
+        term: math.log(1 + (count - len(docs) + 0.5) / (len(docs) + 0.5))
+        for term, docs in postings.items()
+    }
+
+    return {
+        "version": 1,
+        "k1": k1,
+        "b": b,
+        "avg_length": sum(d["length"] for d in documents) / max(count, 1),
+        "documents": documents,
+        "idf": idf,
+        "postings": postings,
+    }
+
+
+def save_index(index: dict, path: str):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False)
+
+
+class BM25Index:
+    def __init__(self, index: dict):
+        self.k1 = index["k1"]
+        self.b = index["b"]
+        self.idf = index["idf"]
+        self.postings = index["postings"]
+        self.documents = index["documents"]
+        # Mianownik BM25 zależny tylko od długości dokumentu - liczony raz
+        avg_length = index["avg_length"] or 1
+        self.length_norm = [
+            self.k1 * (1 - self.b + self.b * d["length"] / avg_length)
+            for d in self.documents
+        ]
+
+    @classmethod
+    def load(cls, path: str):
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def search(self, query: str, k: int = 2):
+        """Zwróć listę (treść, tytuł, wynik BM25) - najlepsze fragmenty"""
+        scores = {}
+        for term in set(tokenize(query)):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for doc_id, tf in self.postings[term]:
+                weight = idf * tf * (self.k1 + 1) / (tf + self.length_norm[doc_id])
+                scores[doc_id] = scores.get(doc_id, 0.0) + weight
+
+        best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [
+            (self.documents[i]["content"], self.documents[i]["title"], score)
+            for i, score in best
+        ]
+
+
+def fuse(vector_results, lexical_results, k: int, alpha: float,
+         max_distance: float, min_lexical: float, with_scores: bool = False):
+    """Połącz wyniki wektorowe (odległości) i leksykalne (BM25) w jeden ranking.
+
+    Fragment przechodzi, jeśli spełnia próg odległości albo próg BM25.
+    Wynik końcowy: alpha * podobieństwo wektorowe + (1 - alpha) * BM25
+    znormalizowane do [0, 1) (wynik równy progowi BM25 daje 0.5).
+    with_scores=True: trójki (treść, tytuł, wynik) zamiast par.
+    """
+    candidates = {}
+    for content, title, distance in vector_results:
+        entry = candidates.setdefault(content, {"title": title, "vector": 0.0, "lexical": 0.0, "ok": False})
+        entry["vector"] = max(0.0, 1 - distance / 2)
+        entry["ok"] = entry["ok"] or distance < max_distance
+    for content, title, score in lexical_results:
+        entry = candidates.setdefault(content, {"title": title, "vector": 0.0, "lexical": 0.0, "ok": False})
+        entry["lexical"] = score / (score + min_lexical)
+        entry["ok"] = entry["ok"] or score >= min_lexical
+
+    ranked = sorted(
+        (alpha * e["vector"] + (1 - alpha) * e["lexical"], content, e["title"])
+        for content, e in candidates.items() if e["ok"]
+    )
+    if with_scores:
+        return [(content, title, score) for score, content, title in reversed(ranked)][:k]
+    return [(content, title) for _, content, title in reversed(ranked)][:k]
@@ -0,0 +1,174 @@
+"""Pomiary czasu etapów /chat i liczniki w formacie Prometheusa.
+
+Użycie w kodzie:
+    with stage("embedding"):
+        ...
+
+Czasy trafiają do histogramu wafam_stage_seconds{stage="..."} oraz do
+słownika bieżącego zapytania (nagłówek Server-Timing w trybie debug).
+Przy WAFAM_METRICS=0 stage() zwraca pusty kontekst i nic nie mierzy.
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+
+ENABLED = os.getenv("WAFAM_METRICS", "1") != "0"
+
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Czasy etapów bieżącego zapytania (None = nie zbieramy)
+current_timings = ContextVar("current_timings", default=None)
+
+
+def label_text(labels: tuple) -> str:
+    return ",".join(f'{key}="{value}"' for key, value in labels)
+
+
+class Histogram:
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.total += value
+        self.count += 1
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.help = {}
+        self.histograms = {}
+        self.counters = {}
+        self.gauges = {}
+
+    def describe(self, name: str, kind: str, text: str):
+        self.help[name] = (kind, text)
+
+    def observe(self, name: str, value: float, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def gauge(self, name: str, text: str, callback):
+        """Wartość liczona przy odczycie: liczba albo słownik {etykiety: liczba}"""
+        self.describe(name, "gauge", text)
+        self.gauges[name] = callback
+
+    def render(self) -> str:
+        lines = []
+        seen = set()
+
+        def header(name, kind):
+            if name not in seen:
+                seen.add(name)
+                text = self.help.get(name, (kind, name))[1]
+                lines.append(f"# HELP {name} {text}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        with self.lock:
+            histograms = sorted(self.histograms.items())
+            counters = sorted(self.counters.items())
+
+        for (name, labels), histogram in histograms:
+            header(name, "histogram")
+            prefix = label_text(labels) + "," if labels else ""
+            cumulative = 0
+            for bound, count in zip(BUCKETS, histogram.counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{{prefix}le="+Inf"}} {histogram.count}')
+            suffix = f"{{{label_text(labels)}}}" if labels else ""
+            lines.append(f"{name}_sum{suffix} {histogram.total:.6f}")
+            lines.append(f"{name}_count{suffix} {histogram.count}")
+
+        for (name, labels), value in counters:
+            header(name, "counter")
+            suffix = f"{{{label_text(labels)}}}" if labels else ""
+            lines.append(f"{name}{suffix} {value}")
+
+        for name, callback in self.gauges.items():
+            header(name, "gauge")
+            value = callback()
+            if isinstance(value, dict):
+                for labels, item in sorted(value.items()):
+                    lines.append(f"{name}{{{label_text(labels)}}} {item}")
+            else:
+                lines.append(f"{name} {value}")
+
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+registry.describe("wafam_stage_seconds", "histogram", "Czas etapów obsługi zapytania /chat")
+
+
+def _record_stage(name: str, elapsed: float):
+    registry.observe("wafam_stage_seconds", elapsed, stage=name)
+    timings = current_timings.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + elapsed
+
+
+@contextmanager
+def _stage(name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _record_stage(name, time.perf_counter() - start)
+
+
+_NULL_STAGE = nullcontext()
+
+
+def _null_stage(name: str):
+    return _NULL_STAGE
+
+
+def _null_record_stage(name: str, elapsed: float):
+    pass
+
+
+def _inc(name: str, value: float = 1, **labels):
+    registry.inc(name, value, **labels)
+
+
+def _null_inc(name: str, value: float = 1, **labels):
+    pass
+
+
+stage = _stage if ENABLED else _null_stage
+record_stage = _record_stage if ENABLED else _null_record_stage
+inc = _inc if ENABLED else _null_inc
+
+
+def start_request():
+    """Zacznij zbierać czasy etapów bieżącego zapytania"""
+    if not ENABLED:
+        return None
+    timings = {}
+    current_timings.set(timings)
+    return timings
+
+
+def server_timing(timings: dict) -> str:
+    """Nagłówek Server-Timing, np. 'embedding;dur=41.2, llm;dur=903.5'"""
+    return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings.items())
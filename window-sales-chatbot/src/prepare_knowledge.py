@@ -1,10 +1,60 @@
+"""Przygotowanie bazy wiedzy: pliki z ofertą -> fragmenty, indeks BM25 i manifest.
+
+Pliki (.txt / .md, także całe katalogi) czytane są strumieniowo, linia po
+linii, razem z liczeniem hasha SHA-256 treści. Nagłówki sekcji rozpoznaje
+jeden skompilowany wzorzec ze wszystkich słów kluczowych SECTIONS (drzewo
+prefiksów jak w extractor.py). Sekcja dzielona jest na fragmenty do
+`--max-tokens` tokenów na granicy linii (za długa linia - na granicy słów),
+kolejny fragment zaczyna się `--overlap` tokenami końca poprzedniego.
+
+Pliki przetwarzane są równolegle w puli procesów; fragmenty pliku trafiają
+do data/chunks/<plik>-<hash>.jsonl. Plik o niezmienionym rozmiarze, czasie
+modyfikacji i ustawieniach nie jest czytany ponownie. Manifest
+(data/wafam_manifest.json) opisuje pliki (hash, fragmenty, tokeny, plik
+JSONL) - z niego czyta build_vectordb.py. Dla API powstają jak dotąd
+wafam_chunks.json (wszystkie fragmenty) i wafam_bm25.json.
+
+`--tenant <id>` zapisuje wszystko w tenants/<id>/data/ (patrz tenants.py);
+bez podanych plików czyta pliki .txt/.md z katalogu tenants/<id>/.
+
+Uruchomienie:
+    python prepare_knowledge.py                                   # data/wafam_oferta.TXT
+    python prepare_knowledge.py ../data/katalogi ../data/wafam_oferta.TXT --workers 4
+    python prepare_knowledge.py --tenant okna-nowak                # tenants/okna-nowak/*.txt
+"""
+import argparse
+import functools
+import hashlib
 import json
+import operator
 import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from extractor import keyword_pattern
+from knowledge_base import chunk_hash
+from lexical import build_index, save_index
+from prompt_builder import TokenCounter
+from tenants import PROMPT_FILE, tenant_paths
 
 # Ścieżki do plików
 script_dir = os.path.dirname(os.path.abspath(__file__))
-input_file = os.path.join(script_dir, '..', 'data', 'wafam_oferta.txt')
-output_file = os.path.join(script_dir, '..', 'data', 'wafam_chunks.json')
+data_dir = os.path.join(script_dir, '..', 'data')
+input_file = os.path.join(data_dir, 'wafam_oferta.TXT')
+output_file = os.path.join(data_dir, 'wafam_chunks.json')
+index_file = os.path.join(data_dir, 'wafam_bm25.json')
+manifest_file = os.path.join(data_dir, 'wafam_manifest.json')
+shards_dir = os.path.join(data_dir, 'chunks')
+
+INPUT_EXTENSIONS = (".txt", ".md")
+MANIFEST_VERSION = 1
+# Linia dłuższa od tego to treść, nie nagłówek sekcji
+HEADER_MAX_CHARS = 100
+# Krótsze sekcje są pomijane (puste nagłówki, resztki)
+MIN_SECTION_CHARS = 50
+# Granica zdania (zakładka między fragmentami to całe zdania)
+SENTENCE_RE = re.compile(r"(?<=[.!?])\s+(?=\S)")
 
 # Definicja sekcji do wyodrębnienia
 SECTIONS = [
@@ -31,85 +81,350 @@ SECTIONS = [
     {"id": "parametry", "title": "Parametry techniczne", "keywords": ["parametry techniczne", "uw", "komór"]},
 ]
 
-def load_document():
-    with open(input_file, 'r', encoding='utf-8') as f:
-        return f.read()
 
-def split_into_chunks(text):
-    chunks = []
-    lines = text.split('\n')
-    
-    current_chunk = []
-    current_section = None
-    
+class SectionMatcher:
+    """Rozpoznawanie nagłówków sekcji jednym wzorcem; wygrywa sekcja wcześniejsza na liście"""
+
+    def __init__(self, sections: list[dict]):
+        self.sections = sections
+        masks = {}
+        for bit, section in enumerate(sections):
+            for keyword in section["keywords"]:
+                masks[keyword] = masks.get(keyword, 0) | 1 << bit
+        # Domknięcie: dopasowane słowo niesie też sekcje słów w nim zawartych
+        self.masks = {
+            word: functools.reduce(operator.or_, (masks[other] for other in masks if other in word))
+            for word in masks
+        }
+        self.pattern = re.compile(f"(?=({keyword_pattern(masks)}))")
+
+    def match(self, line: str):
+        text = line.strip()
+        if len(text) >= HEADER_MAX_CHARS:
+            return None
+        found = 0
+        for word in self.pattern.findall(text.lower()):
+            found |= self.masks[word]
+        if not found:
+            return None
+        return self.sections[(found & -found).bit_length() - 1]
+
+
+def read_lines(path: str, digest):
+    """Linie pliku bez końca linii; przy okazji hash surowej treści"""
+    with open(path, 'rb') as f:
+        first = True
+        for raw in f:
+            digest.update(raw)
+            line = raw.decode('utf-8', errors='replace').rstrip('\r\n')
+            if first:
+                line = line.lstrip('\ufeff')
+                first = False
+            yield line
+
+
+def iter_sections(lines, matcher: SectionMatcher):
+    """Kolejne (sekcja, tekst); tekst bez nagłówka to sekcja "intro" (na początku) albo "outro" (na końcu)"""
+    current = []
+    section = None
     for line in lines:
-        line_lower = line.lower().strip()
-        
-        # Sprawdź czy to nowa sekcja
-        new_section = None
-        for section in SECTIONS:
-            if any(keyword in line_lower for keyword in section["keywords"]):
-                if len(line.strip()) < 100:  # To prawdopodobnie nagłówek
-                    new_section = section
+        new_section = matcher.match(line)
+        if new_section and current:
+            text = '\n'.join(current).strip()
+            if len(text) > MIN_SECTION_CHARS:
+                yield section or {"id": "intro", "title": "Wprowadzenie"}, text
+            current = []
+            section = new_section
+        current.append(line)
+
+    text = '\n'.join(current).strip()
+    if len(text) > MIN_SECTION_CHARS:
+        yield section or {"id": "outro", "title": "Inne"}, text
+
+
+def split_line(line: str, counter: TokenCounter, max_tokens: int) -> list[str]:
+    """Linia podzielona na zdania; zdanie dłuższe niż max_tokens - na granicy słów"""
+    pieces = []
+    for sentence in SENTENCE_RE.split(line):
+        if counter.count(sentence) <= max_tokens:
+            pieces.append(sentence)
+            continue
+        current = []
+        for word in sentence.split():
+            if current and counter.count(' '.join(current + [word])) > max_tokens:
+                pieces.append(' '.join(current))
+                current = []
+            current.append(word)
+        if current:
+            pieces.append(' '.join(current))
+    return pieces
+
+
+def join_units(units: list[tuple]) -> str:
+    return ''.join((separator if i else '') + piece for i, (piece, _, separator) in enumerate(units)).strip()
+
+
+def split_section(text: str, counter: TokenCounter, max_tokens: int, overlap: int) -> list[str]:
+    """Fragmenty do max_tokens tokenów; każdy kolejny zaczyna się końcówką poprzedniego (do `overlap` tokenów)"""
+    if counter.count(text) <= max_tokens:
+        return [text]
+    # Jednostki: zdania z separatorem przed nimi (nowa linia albo spacja w środku linii)
+    units = []
+    for line in text.split('\n'):
+        for i, piece in enumerate(split_line(line, counter, max_tokens)):
+            units.append((piece, counter.count(piece) + 1, ' ' if i else '\n'))
+
+    chunks = []
+    current = []
+    tokens = 0
+    fresh = False
+    for unit in units:
+        if current and tokens + unit[1] > max_tokens:
+            chunks.append(join_units(current))
+            # Zakładka: całe zdania z końca, razem do `overlap` tokenów
+            carried = []
+            carried_tokens = 0
+            for previous in reversed(current):
+                if carried_tokens + previous[1] > overlap or carried_tokens + previous[1] + unit[1] > max_tokens:
                     break
-        
-        if new_section and current_chunk:
-            # Zapisz poprzedni chunk
-            chunk_text = '\n'.join(current_chunk).strip()
-            if chunk_text and len(chunk_text) > 50:
-                chunks.append({
-                    "id": current_section["id"] if current_section else "intro",
-                    "title": current_section["title"] if current_section else "Wprowadzenie",
-                    "content": chunk_text,
-                    "char_count": len(chunk_text)
-                })
-            current_chunk = []
-            current_section = new_section
-        
-        current_chunk.append(line)
-    
-    # Zapisz ostatni chunk
-    if current_chunk:
-        chunk_text = '\n'.join(current_chunk).strip()
-        if chunk_text and len(chunk_text) > 50:
-            chunks.append({
-                "id": current_section["id"] if current_section else "outro",
-                "title": current_section["title"] if current_section else "Inne",
-                "content": chunk_text,
-                "char_count": len(chunk_text)
-            })
-    
-    return chunks
+                carried.insert(0, previous)
+                carried_tokens += previous[1]
+            current, tokens = carried, carried_tokens
+            fresh = False
+        if not current and not unit[0].strip():
+            continue
+        current.append(unit)
+        tokens += unit[1]
+        fresh = fresh or bool(unit[0].strip())
+    if fresh:
+        chunks.append(join_units(current))
+    return [chunk for chunk in chunks if chunk]
+
+
+def shard_name(source: str, sha256: str) -> str:
+    base = re.sub(r'[^\w.-]+', '_', os.path.splitext(source)[0]).strip('_') or 'plik'
+    return f"{base}-{sha256[:16]}.jsonl"
+
+
+def chunk_file(path: str, source: str, settings: dict, output_dir: str) -> dict:
+    """Jeden plik: fragmenty do JSONL (strumieniowo), wynik do manifestu. Wykonywane w procesie puli."""
+    start = time.perf_counter()
+    counter = TokenCounter("gpt-4o-mini")
+    matcher = SectionMatcher(SECTIONS)
+    digest = hashlib.sha256()
+    temp_path = os.path.join(output_dir, f".{os.getpid()}-{time.time_ns()}.tmp")
+    chunks = 0
+    tokens = 0
+    with open(temp_path, 'w', encoding='utf-8') as out:
+        for section, text in iter_sections(read_lines(path, digest), matcher):
+            for content in split_section(text, counter, settings["max_tokens"], settings["overlap"]):
+                chunk = {
+                    "id": section["id"],
+                    "title": section["title"],
+                    "content": content,
+                    "char_count": len(content),
+                    "tokens": counter.count(content),
+                    "source": source,
+                    "hash": chunk_hash(section["title"], content),
+                }
+                out.write(json.dumps(chunk, ensure_ascii=False) + '\n')
+                chunks += 1
+                tokens += chunk["tokens"]
+
+    sha256 = digest.hexdigest()
+    shard = shard_name(source, sha256)
+    os.replace(temp_path, os.path.join(output_dir, shard))
+    stat = os.stat(path)
+    return {
+        "source": source,
+        "sha256": sha256,
+        "bytes": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "shard": shard,
+        "chunks": chunks,
+        "tokens": tokens,
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+
+
+def find_inputs(paths: list[str]) -> list[tuple[str, str]]:
+    """(ścieżka, nazwa w manifeście) plików wejściowych; katalogi przeszukiwane rekurencyjnie"""
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                for name in sorted(names):
+                    if name.lower().endswith(INPUT_EXTENSIONS):
+                        full = os.path.join(root, name)
+                        found.append((full, os.path.relpath(full, os.path.dirname(os.path.normpath(path)))))
+        else:
+            found.append((path, os.path.basename(path)))
+    found.sort(key=lambda item: item[1])
+    sources = [source for _, source in found]
+    duplicates = {source for source in sources if sources.count(source) > 1}
+    if duplicates:
+        raise SystemExit(f"Powtórzone nazwy plików: {', '.join(sorted(duplicates))}")
+    return found
+
+
+def load_manifest(path: str) -> dict:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return manifest if manifest.get("version") == MANIFEST_VERSION else {}
+
+
+def iter_chunks(manifest: dict, directory: str = None):
+    """Fragmenty wszystkich plików manifestu, strumieniowo (kolejność z manifestu)"""
+    for entry in manifest["files"]:
+        with open(os.path.join(directory or shards_dir, entry["shard"]), 'r', encoding='utf-8') as f:
+            for line in f:
+                yield json.loads(line)
+
+
+def write_chunks(chunks, path: str) -> int:
+    """wafam_chunks.json zapisywany fragment po fragmencie"""
+    count = 0
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        f.write('[')
+        for chunk in chunks:
+            f.write(',\n  ' if count else '\n  ')
+            f.write(json.dumps(chunk, ensure_ascii=False))
+            count += 1
+        f.write('\n]\n')
+    os.replace(temp_path, path)
+    return count
+
 
 def main():
+    global output_file, index_file, manifest_file, shards_dir
+    parser = argparse.ArgumentParser(description="Przygotowanie bazy wiedzy WAFAM")
+    parser.add_argument("inputs", nargs="*", help="pliki .txt/.md albo katalogi (domyślnie data/wafam_oferta.TXT)")
+    parser.add_argument("--max-tokens", type=int, default=int(os.getenv("WAFAM_CHUNK_MAX_TOKENS", "120")),
+                        help="maksymalna długość fragmentu w tokenach")
+    parser.add_argument("--overlap", type=int, default=int(os.getenv("WAFAM_CHUNK_OVERLAP", "20")),
+                        help="tokenów końca fragmentu powtórzonych na początku następnego")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="procesów przetwarzających pliki")
+    parser.add_argument("--full", action="store_true", help="przetwórz wszystkie pliki od nowa")
+    parser.add_argument("--tenant", help="przygotuj bazę tenanta (tenants/<id>/data)")
+    args = parser.parse_args()
+    if not 0 <= args.overlap < args.max_tokens:
+        parser.error("--overlap musi być mniejszy niż --max-tokens")
+
+    inputs = args.inputs or [input_file]
+    if args.tenant:
+        paths = tenant_paths(args.tenant)
+        output_file, index_file, manifest_file, shards_dir = (
+            paths["chunks"], paths["bm25"], paths["manifest"], paths["shards"])
+        os.makedirs(paths["data"], exist_ok=True)
+        inputs = args.inputs or [paths["dir"]]
+
     print("=" * 50)
     print("WAFAM Knowledge Base Preparation")
     print("=" * 50)
-    
-    # Wczytaj dokument
-    print("\n[1/3] Wczytywanie dokumentu...")
-    text = load_document()
-    print(f"Wczytano {len(text)} znaków")
-    
-    # Podziel na chunki
-    print("\n[2/3] Dzielenie na fragmenty...")
-    chunks = split_into_chunks(text)
-    print(f"Utworzono {len(chunks)} fragmentów")
-    
-    # Zapisz do JSON
-    print("\n[3/3] Zapisywanie do pliku...")
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(chunks, f, ensure_ascii=False, indent=2)
-    print(f"Zapisano do: {output_file}")
-    
+
+    # Pliki wejściowe i poprzedni manifest
+    print("\n[1/4] Wyszukiwanie plików...")
+    inputs = find_inputs(inputs)
+    if args.tenant and not args.inputs:
+        # Prompt systemowy tenanta leży obok plików z ofertą - to nie treść bazy
+        inputs = [(path, source) for path, source in inputs if os.path.basename(path) != PROMPT_FILE]
+    counter = TokenCounter("gpt-4o-mini")
+    settings = {
+        "max_tokens": args.max_tokens,
+        "overlap": args.overlap,
+        "tokenizer": "tiktoken" if counter.exact else "estimate",
+        "sections": hashlib.sha256(json.dumps(SECTIONS, ensure_ascii=False).encode('utf-8')).hexdigest()[:16],
+    }
+    previous = load_manifest(manifest_file) if not args.full else {}
+    previous_files = {entry["source"]: entry for entry in previous.get("files", [])} \
+        if previous.get("settings") == settings else {}
+    os.makedirs(shards_dir, exist_ok=True)
+
+    results = {}
+    to_process = []
+    for path, source in inputs:
+        stat = os.stat(path)
+        entry = previous_files.get(source)
+        if (entry and entry["bytes"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns
+                and os.path.exists(os.path.join(shards_dir, entry["shard"]))):
+            results[source] = entry
+        else:
+            to_process.append((path, source))
+    print(f"Plików: {len(inputs)}, bez zmian: {len(results)}, do przetworzenia: {len(to_process)}")
+
+    # Dzielenie na fragmenty - równolegle, plik na proces
+    print("\n[2/4] Dzielenie na fragmenty...")
+    start = time.perf_counter()
+    workers = max(1, min(args.workers, len(to_process)))
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(chunk_file, path, source, settings, shards_dir) for path, source in to_process]
+            for future in as_completed(futures):
+                result = future.result()
+                results[result["source"]] = result
+                print(f"  {result['source']}: {result['chunks']} fragmentów, {result['seconds']:.2f} s")
+    else:
+        for path, source in to_process:
+            result = chunk_file(path, source, settings, shards_dir)
+            results[source] = result
+            print(f"  {result['source']}: {result['chunks']} fragmentów, {result['seconds']:.2f} s")
+    print(f"Gotowe w {time.perf_counter() - start:.1f} s ({workers} proc.)")
+
+    # Te same treści co w poprzednim manifeście - wafam_chunks.json i BM25 są aktualne
+    unchanged = (
+        [(entry["source"], entry["sha256"]) for entry in previous.get("files", [])]
+        == [(source, results[source]["sha256"]) for _, source in inputs]
+        and previous.get("settings") == settings
+        and os.path.exists(output_file) and os.path.exists(index_file)
+    )
+
+    # Manifest i pliki dla API
+    print("\n[3/4] Zapisywanie manifestu i fragmentów...")
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "settings": settings,
+        "files": [results[source] for _, source in inputs],
+    }
+    temp_manifest = manifest_file + '.tmp'
+    with open(temp_manifest, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(temp_manifest, manifest_file)
+
+    # Pliki JSONL, których nie ma już w manifeście
+    used = {entry["shard"] for entry in manifest["files"]}
+    for name in os.listdir(shards_dir):
+        if name not in used:
+            os.remove(os.path.join(shards_dir, name))
+
+    print(f"Manifest: {manifest_file}")
+    if unchanged:
+        print(f"Treść plików bez zmian - {os.path.basename(output_file)} i {os.path.basename(index_file)} aktualne")
+    else:
+        count = write_chunks(iter_chunks(manifest), output_file)
+        print(f"Zapisano {count} fragmentów do: {output_file}")
+
+    # Zbuduj indeks leksykalny (BM25) dla wyszukiwania hybrydowego
+    print("\n[4/4] Budowanie indeksu BM25...")
+    if not unchanged:
+        # Fragmenty czytane strumieniowo z plików JSONL - bez listy całego korpusu w pamięci
+        index = build_index(iter_chunks(manifest))
+        save_index(index, index_file)
+        print(f"Zapisano {len(index['idf'])} termów do: {index_file}")
+
     # Pokaż podsumowanie
     print("\n" + "=" * 50)
-    print("Podsumowanie fragmentów:")
+    print("Podsumowanie plików:")
     print("=" * 50)
-    for i, chunk in enumerate(chunks):
-        print(f"{i+1}. {chunk['title']} ({chunk['char_count']} znaków)")
-    
+    for entry in manifest["files"]:
+        print(f"{entry['source']}: {entry['chunks']} fragmentów, {entry['tokens']} tokenów, "
+              f"{entry['bytes'] / 1024:.0f} KB, sha256 {entry['sha256'][:12]}")
+
     print("\nGotowe!")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,164 @@
+"""Składanie promptu w limicie tokenów.
+
+Budżet (WAFAM_PROMPT_TOKEN_BUDGET, bez stałego prefiksu z promptem
+systemowym - ten i tak trafia do cache promptów) dzielony jest tak:
+    1. części obowiązkowe (zebrane dane, pytanie klienta) - zawsze w całości,
+    2. fragmenty z bazy wiedzy - do `context_share` tego, co zostało,
+    3. historia rozmowy - reszta (plus to, czego nie zużyły fragmenty);
+       najnowsze wypowiedzi w całości, starsze jako krótkie streszczenie.
+
+Tokeny liczy tiktoken (kodowanie modelu); gdy go nie ma albo nie da się
+pobrać kodowania (brak sieci), używamy ostrożnego przybliżenia - ok. 3
+znaki polskiego tekstu na token. Przycinamy zawsze na granicy słowa.
+"""
+import re
+
+# Przybliżenie bez tokenizera - zawyża raczej niż zaniża
+CHARS_PER_TOKEN = 3
+SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+
+
+class TokenCounter:
+    def __init__(self, model: str = "gpt-4o-mini"):
+        self.encoding = None
+        try:
+            import tiktoken
+            self.encoding = tiktoken.encoding_for_model(model)
+        except Exception:
+            pass
+
+    @property
+    def exact(self) -> bool:
+        return self.encoding is not None
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self.encoding is not None:
+            return len(self.encoding.encode(text))
+        return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+    def truncate(self, text: str, max_tokens: int, from_start: bool = False) -> str:
+        """Skróć tekst do `max_tokens` na granicy słowa (from_start=True - zostaw koniec)"""
+        if max_tokens <= 0:
+            return ""
+        if self.count(text) <= max_tokens:
+            return text
+        if self.encoding is not None:
+            tokens = self.encoding.encode(text)
+            part = tokens[-max_tokens:] if from_start else tokens[:max_tokens]
+            cut = self.encoding.decode(part)
+        else:
+            limit = max_tokens * CHARS_PER_TOKEN
+            cut = text[-limit:] if from_start else text[:limit]
+
+        # Bez urwanych słów: odetnij niepełne słowo na brzegu cięcia
+        if from_start:
+            space = cut.find(" ")
+            return "…" + (cut[space + 1:] if 0 <= space < len(cut) // 2 else cut)
+        space = cut.rfind(" ")
+        return (cut[:space] if space > len(cut) // 2 else cut).rstrip(" ,;:-") + "…"
+
+
+def compact_turn(message: dict, max_words: int = 20) -> str:
+    """Jedna linijka streszczenia: pierwsze zdanie wypowiedzi, najwyżej `max_words` słów"""
+    text = " ".join(message["content"].split())
+    first = SENTENCE_END.split(text, 1)[0]
+    words = first.split()
+    if len(words) > max_words:
+        first = " ".join(words[:max_words]) + "…"
+    who = "Klient" if message["role"] == "user" else "Asystent"
+    return f"{who}: {first}"
+
+
+def fold_summary(summary: str, messages: list[dict], counter: TokenCounter, max_tokens: int) -> str:
+    """Dopisz wypowiedzi do streszczenia; najstarsze linijki wypadają po przekroczeniu limitu"""
+    lines = [line for line in summary.split("\n") if line]
+    lines.extend(compact_turn(message) for message in messages)
+    while len(lines) > 1 and counter.count("\n".join(lines)) > max_tokens:
+        lines.pop(0)
+    return counter.truncate("\n".join(lines), max_tokens, from_start=True)
+
+
+def build_catalogue(chunks: list[dict], counter: TokenCounter, max_tokens: int) -> str:
+    """Skrót bazy wiedzy: po kawałku z każdej sekcji, zawsze w tej samej kolejności"""
+    sections = {}
+    for chunk in chunks:
+        sections.setdefault(chunk["title"], []).append(" ".join(chunk["content"].split()))
+    if not sections or max_tokens <= 0:
+        return ""
+
+    per_section = max_tokens // len(sections)
+    lines = [
+        f"- {title}: {counter.truncate(' '.join(texts), max(per_section - counter.count(title) - 2, 10))}"
+        for title, texts in sections.items()
+    ]
+    return "\n".join(lines)
+
+
+class PromptBuilder:
+    def __init__(self, counter: TokenCounter, budget: int = 750, context_share: float = 0.7,
+                 summary_tokens: int = 80, message_tokens: int = 50, recent_messages: int = 2):
+        self.counter = counter
+        self.budget = budget
+        self.context_share = context_share
+        self.summary_tokens = summary_tokens
+        self.message_tokens = message_tokens
+        self.recent_messages = recent_messages
+
+    def fit_contexts(self, contexts: list[str], budget: int) -> list[str]:
+        """Całe fragmenty, dopóki mieszczą się w budżecie; ostatni ewentualnie przycięty"""
+        fitted = []
+        for context in contexts:
+            tokens = self.counter.count(context)
+            if tokens <= budget:
+                fitted.append(context)
+                budget -= tokens
+            else:
+                # Sensowny kawałek albo nic
+                if budget >= 40:
+                    fitted.append(self.counter.truncate(context, budget))
+                break
+        return fitted
+
+    def fit_history(self, history: list[dict], summary: str, budget: int):
+        """Najnowsze wypowiedzi (przycięte na granicy słowa); starsze dołączone do streszczenia"""
+        has_older = summary or len(history) > self.recent_messages
+        summary_budget = min(self.summary_tokens, budget // 3) if has_older else 0
+        budget -= summary_budget
+
+        recent = []
+        for message in reversed(history[-self.recent_messages:] if self.recent_messages else []):
+            content = self.counter.truncate(message["content"], self.message_tokens)
+            tokens = self.counter.count(content)
+            if tokens > budget:
+                break
+            recent.append({"role": message["role"], "content": content})
+            budget -= tokens
+        recent.reverse()
+
+        older = history[:len(history) - len(recent)]
+        if older or summary:
+            summary = fold_summary(summary, older, self.counter, summary_budget)
+        return recent, summary
+
+    def allocate(self, fixed_parts: list[str], contexts: list[str], history: list[dict], summary: str) -> dict:
+        """Rozdziel budżet; zwraca dopasowane części i liczby tokenów"""
+        fixed = sum(self.counter.count(part) for part in fixed_parts)
+        remaining = max(self.budget - fixed, 0)
+
+        fitted = self.fit_contexts(contexts, int(remaining * self.context_share))
+        context_tokens = sum(self.counter.count(context) for context in fitted)
+
+        recent, summary = self.fit_history(history, summary, remaining - context_tokens)
+        return {
+            "contexts": fitted,
+            "history": recent,
+            "summary": summary,
+            "tokens": {
+                "fixed": fixed,
+                "context": context_tokens,
+                "history": sum(self.counter.count(m["content"]) for m in recent),
+                "summary": self.counter.count(summary),
+            },
+        }
@@ -0,0 +1,198 @@
+"""Odtwarzanie zapisanych pytań klientów (np. po zmianie SYSTEM_PROMPT albo bazy).
+
+Wejście: JSONL, jedna tura na linię: {"session_id": "...", "text": "..."}.
+Tury jednej sesji idą po kolei (liczy się historia rozmowy), różne sesje
+równolegle - najwyżej `concurrency` naraz. Wyniki zapisywane są na
+bieżąco, w kolejności ukończenia, po jednej linii JSON:
+    {"session_id", "turn", "text", "bot", "sources", "error", "ms"}
+
+Wznawianie: sesje, które mają w pliku wyników wszystkie tury bez błędu,
+są pomijane. Wiersze niedokończonych sesji są usuwane i sesja liczona
+jest od pierwszej tury (inaczej brakowałoby historii rozmowy).
+
+Uruchomienie (w tym procesie, bez serwera - wspólne wyszukiwanie i cache):
+    python replay.py pytania.jsonl wyniki.jsonl --concurrency 16
+albo przez działające API (/chat/batch):
+    python replay.py pytania.jsonl wyniki.jsonl --url http://127.0.0.1:8000
+(token z WAFAM_ADMIN_TOKEN albo --token)
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+
+def read_turns(path: str) -> list[dict]:
+    turns = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                item = json.loads(line)
+                turns.append({"session_id": str(item["session_id"]), "text": item["text"]})
+    return turns
+
+
+def group_sessions(turns) -> dict:
+    """Tury pogrupowane w sesje: {session_id: [tekst, ...]} w kolejności z pliku"""
+    sessions = {}
+    for turn in turns:
+        sessions.setdefault(turn["session_id"], []).append(turn["text"])
+    return sessions
+
+
+async def replay_sessions(sessions: dict, ask, concurrency: int = 8, done=None):
+    """Wyniki tur w kolejności ukończenia (generator async).
+
+    `ask(session_id, turn, text)` zwraca słownik z "bot" i "sources".
+    Każdy z `concurrency` workerów bierze całą sesję i odtwarza ją po kolei.
+    `done(session_id)` (async) wołane po ostatniej turze sesji - np. usunięcie
+    sesji, żeby odtwarzanie nie wypierało z magazynu sesji prawdziwych klientów.
+    """
+    results = asyncio.Queue(maxsize=concurrency * 2)
+    pending = iter(sessions.items())
+
+    async def worker():
+        for session_id, texts in pending:
+            try:
+                for turn, text in enumerate(texts):
+                    row = {"session_id": session_id, "turn": turn, "text": text}
+                    start = time.perf_counter()
+                    try:
+                        answer = await ask(session_id, turn, text)
+                        row.update(bot=answer["bot"], sources=answer["sources"], error=None)
+                    except Exception as e:
+                        row.update(bot=None, sources=[], error=f"{type(e).__name__}: {e}")
+                    row["ms"] = round((time.perf_counter() - start) * 1000, 1)
+                    await results.put(row)
+            finally:
+                if done is not None:
+                    await done(session_id)
+
+    async def run():
+        try:
+            await asyncio.gather(*(worker() for _ in range(max(min(concurrency, len(sessions)), 1))))
+        finally:
+            await results.put(None)
+
+    task = asyncio.create_task(run())
+    try:
+        while (row := await results.get()) is not None:
+            yield row
+        await task
+    finally:
+        task.cancel()
+
+
+def load_finished(path: str, sessions: dict) -> set:
+    """Sesje zakończone w poprzednim przebiegu; wiersze pozostałych usuwa z pliku"""
+    if not os.path.exists(path):
+        return set()
+    rows = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                rows.append(json.loads(line))
+            except json.JSONDecodeError:
+                # Urwana ostatnia linia po przerwaniu
+                continue
+
+    ok_turns = {}
+    for row in rows:
+        if row.get("error") is None:
+            ok_turns.setdefault(row["session_id"], set()).add(row["turn"])
+    finished = {
+        session_id for session_id, turns in ok_turns.items()
+        if session_id in sessions and len(turns) == len(sessions[session_id])
+    }
+
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        for row in rows:
+            if row["session_id"] in finished:
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+    os.replace(tmp, path)
+    return finished
+
+
+async def replay_local(sessions: dict, concurrency: int):
+    """Tury liczone w tym procesie (import api - ten sam kod co /chat)"""
+    import api
+    await api.wait_ready()
+    async for row in replay_sessions(sessions, api.ask_replay_turn, concurrency, done=api.end_replay_session):
+        yield row
+
+
+async def replay_remote(sessions: dict, concurrency: int, url: str, chunk_turns: int, token: str = None):
+    """Tury wysyłane do /chat/batch działającego API, paczkami całych sesji"""
+    import httpx
+
+    chunks, chunk, size = [], [], 0
+    for session_id, texts in sessions.items():
+        if chunk and size + len(texts) > chunk_turns:
+            chunks.append(chunk)
+            chunk, size = [], 0
+        chunk.extend({"session_id": session_id, "text": text} for text in texts)
+        size += len(texts)
+    if chunk:
+        chunks.append(chunk)
+
+    headers = {"Authorization": f"Bearer {token}"} if token else {}
+    async with httpx.AsyncClient(timeout=None, headers=headers) as http:
+        for turns in chunks:
+            body = {"turns": turns, "concurrency": concurrency}
+            async with http.stream("POST", f"{url.rstrip('/')}/chat/batch", json=body) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if line:
+                        yield json.loads(line)
+
+
+async def main_async(args):
+    sessions = group_sessions(read_turns(args.input))
+    total = sum(len(texts) for texts in sessions.values())
+    finished = load_finished(args.output, sessions) if args.resume else set()
+    pending = {sid: texts for sid, texts in sessions.items() if sid not in finished}
+    todo = sum(len(texts) for texts in pending.values())
+    print(f"Sesje: {len(sessions)} (tury: {total}), do zrobienia: {len(pending)} (tury: {todo})")
+    if not pending:
+        return
+
+    if args.url:
+        rows = replay_remote(pending, args.concurrency, args.url, args.chunk_turns, args.token)
+    else:
+        rows = replay_local(pending, args.concurrency)
+
+    done = errors = 0
+    start = time.perf_counter()
+    with open(args.output, "a" if args.resume else "w", encoding="utf-8") as f:
+        async for row in rows:
+            # Linia po linii - po przerwaniu plik zawiera wszystko, co skończone
+            f.write(json.dumps(row, ensure_ascii=False) + "\n")
+            f.flush()
+            done += 1
+            errors += row["error"] is not None
+            if done % 100 == 0:
+                print(f"  {done}/{todo} tur ({done / (time.perf_counter() - start):.1f} tur/s)")
+
+    elapsed = time.perf_counter() - start
+    print(f"Gotowe: {done} tur w {elapsed:.1f} s, błędy: {errors}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Odtwarzanie rozmów z pliku JSONL")
+    parser.add_argument("input", help="JSONL z turami: {\"session_id\", \"text\"}")
+    parser.add_argument("output", help="JSONL z odpowiedziami (dopisywany przy wznawianiu)")
+    parser.add_argument("--concurrency", type=int, default=8, help="ile sesji naraz")
+    parser.add_argument("--url", help="adres działającego API (domyślnie: w tym procesie)")
+    parser.add_argument("--token", default=os.getenv("WAFAM_ADMIN_TOKEN"),
+                        help="token administratora API (/chat/batch)")
+    parser.add_argument("--chunk-turns", type=int, default=2000, help="tur w jednym zapytaniu /chat/batch")
+    parser.add_argument("--no-resume", dest="resume", action="store_false",
+                        help="zacznij od nowa (nadpisz plik wyników)")
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+"""Semantyczny cache odpowiedzi bota.
+
+Klucz to wektor pytania (embedding) + intencja. Trafienie następuje, gdy
+podobieństwo kosinusowe do zapisanego pytania o tej samej intencji
+przekracza próg. Wpisy wygasają po TTL, a po przekroczeniu limitu
+usuwany jest najdawniej używany (LRU).
+"""
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+class MemoryBackend:
+    """Wpisy trzymane w pamięci procesu (kolejność = kolejność użycia)"""
+
+    def __init__(self):
+        self.entries = OrderedDict()
+
+    def load(self):
+        return []
+
+    def put(self, key: str, entry: dict):
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+
+    def touch(self, key: str):
+        self.entries.move_to_end(key)
+        self.entries[key]["last_used"] = time.time()
+
+    def delete(self, key: str):
+        self.entries.pop(key, None)
+
+    def oldest(self):
+        return next(iter(self.entries), None)
+
+    def clear(self):
+        self.entries.clear()
+
+
+class SqliteBackend(MemoryBackend):
+    """Wpisy w pamięci + kopia w pliku SQLite, dzięki czemu cache przetrwa restart.
+
+    Trafienia nie są zapisywane na dysk (żeby odczyt nie czekał na zapis),
+    więc po restarcie kolejność LRU odtwarzana jest z czasu dodania wpisu.
+    """
+
+    def __init__(self, path: str):
+        super().__init__()
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS response_cache (
+                key TEXT PRIMARY KEY,
+                intent TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                answer TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self.db.commit()
+
+    def load(self):
+        rows = self.db.execute(
+            "SELECT key, intent, vector, answer, created_at, last_used "
+            "FROM response_cache ORDER BY created_at"
+        ).fetchall()
+        for key, intent, vector, answer, created_at, last_used in rows:
+            self.entries[key] = {
+                "intent": intent,
+                "vector": np.frombuffer(vector, dtype=np.float32),
+                "answer": json.loads(answer),
+                "created_at": created_at,
+                "last_used": last_used,
+            }
+        return list(self.entries)
+
+    def put(self, key: str, entry: dict):
+        super().put(key, entry)
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO response_cache VALUES (?, ?, ?, ?, ?, ?)",
+                (key, entry["intent"], entry["vector"].tobytes(),
+                 json.dumps(entry["answer"], ensure_ascii=False),
+                 entry["created_at"], entry["last_used"])
+            )
+            self.db.commit()
+
+    def delete(self, key: str):
+        super().delete(key)
+        with self.lock:
+            self.db.execute("DELETE FROM response_cache WHERE key = ?", (key,))
+            self.db.commit()
+
+    def clear(self):
+        super().clear()
+        with self.lock:
+            self.db.execute("DELETE FROM response_cache")
+            self.db.commit()
+
+
+class ResponseCache:
+    def __init__(self, backend, threshold: float = 0.95, ttl: float = 86400, max_entries: int = 1000):
+        self.backend = backend
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "bypassed": 0, "stored": 0, "evicted": 0}
+        # Macierze wektorów per intencja (budowane leniwie, unieważniane przy zmianach)
+        self.matrices = {}
+        self.counter = len(backend.load())
+
+    def _matrix(self, intent: str):
+        if intent not in self.matrices:
+            keys = [k for k, e in self.backend.entries.items() if e["intent"] == intent]
+            if keys:
+                vectors = np.stack([self.backend.entries[k]["vector"] for k in keys])
+            else:
+                vectors = np.empty((0, 0), dtype=np.float32)
+            self.matrices[intent] = (keys, vectors)
+        return self.matrices[intent]
+
+    def _matching(self, intent: str, dim: int):
+        """Macierz dla intencji; wpisy o innym wymiarze (inny embedder) są kasowane"""
+        keys, vectors = self._matrix(intent)
+        if keys and vectors.shape[1] != dim:
+            self.backend.clear()
+            self.matrices.clear()
+            keys, vectors = self._matrix(intent)
+        return keys, vectors
+
+    def _forget(self, key: str):
+        entry = self.backend.entries.get(key)
+        if entry is not None:
+            self.matrices.pop(entry["intent"], None)
+            self.backend.delete(key)
+
+    def lookup(self, vector, intent: str):
+        """Zwróć zapisaną odpowiedź dla podobnego pytania albo None"""
+        query = normalize(vector)
+        with self.lock:
+            keys, vectors = self._matching(intent, len(query))
+            if not keys:
+                self.stats["misses"] += 1
+                return None
+
+            similarities = vectors @ query
+            best = int(np.argmax(similarities))
+            key = keys[best]
+            entry = self.backend.entries[key]
+
+            if time.time() - entry["created_at"] > self.ttl:
+                self._forget(key)
+                self.stats["misses"] += 1
+                return None
+
+            if similarities[best] < self.threshold:
+                self.stats["misses"] += 1
+                return None
+
+            self.backend.touch(key)
+            self.stats["hits"] += 1
+            return entry["answer"]
+
+    def store(self, vector, intent: str, answer: dict):
+        now = time.time()
+        vector = normalize(vector)
+        with self.lock:
+            # Równoległe chybienia dla tego samego pytania - nie duplikuj wpisu
+            keys, vectors = self._matching(intent, len(vector))
+            if keys and float(np.max(vectors @ vector)) >= self.threshold:
+                return
+
+            self.counter += 1
+            key = f"{intent}:{now:.6f}:{self.counter}"
+            self.backend.put(key, {
+                "intent": intent,
+                "vector": vector,
+                "answer": answer,
+                "created_at": now,
+                "last_used": now,
+            })
+            self.matrices.pop(intent, None)
+            self.stats["stored"] += 1
+
+            while len(self.backend.entries) > self.max_entries:
+                self._forget(self.backend.oldest())
+                self.stats["evicted"] += 1
+
+    def bypass(self):
+        self.stats["bypassed"] += 1
+
+    def clear(self):
+        with self.lock:
+            self.backend.clear()
+            self.matrices.clear()
+
+    def get_stats(self) -> dict:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "entries": len(self.backend.entries),
+            "hit_rate": round(self.stats["hits"] / lookups, 3) if lookups else 0.0,
+        }
+
+
+def normalize(vector) -> np.ndarray:
+    array = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(array)
+    return array / norm if norm else array
+
+
+def create_response_cache(backend: str, path: str, **kwargs):
+    """Utwórz cache wg konfiguracji: memory, sqlite albo off (None)"""
+    if backend == "off":
+        return None
+    if backend == "sqlite":
+        return ResponseCache(SqliteBackend(path), **kwargs)
+    return ResponseCache(MemoryBackend(), **kwargs)
@@ -0,0 +1,227 @@
+"""Szybkie wyszukiwanie: cache embeddingów pytań i indeks NumPy w pamięci."""
+import json
+import mmap
+import os
+import sqlite3
+import struct
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+
+
+def normalize_query(text: str) -> str:
+    """Klucz cache: małe litery, pojedyncze spacje, postać NFC"""
+    return " ".join(unicodedata.normalize("NFC", text).lower().split())
+
+
+class EmbeddingCache:
+    """Cache LRU embeddingów pytań z opcjonalną kopią w pliku SQLite.
+
+    Klucze mają przedrostek z nazwą embeddera (`model`), więc po zmianie
+    embeddera stare wektory z pliku nie są używane.
+    """
+
+    def __init__(self, max_entries: int = 5000, path: str = None, model: str = ""):
+        self.max_entries = max_entries
+        self.prefix = f"{model}|" if model else ""
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+        self.db = None
+
+        if path:
+            self.db = sqlite3.connect(path, check_same_thread=False)
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS query_embeddings "
+                "(query TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+            )
+            self.db.commit()
+            rows = self.db.execute(
+                "SELECT query, vector FROM query_embeddings WHERE substr(query, 1, ?) = ? "
+                "ORDER BY rowid DESC LIMIT ?",
+                (len(self.prefix), self.prefix, max_entries)
+            ).fetchall()
+            for query, vector in reversed(rows):
+                self.entries[query] = np.frombuffer(vector, dtype=np.float32)
+
+    def get(self, text: str):
+        key = self.prefix + normalize_query(text)
+        with self.lock:
+            vector = self.entries.get(key)
+            if vector is None:
+                self.stats["misses"] += 1
+                return None
+            self.entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return vector
+
+    def put(self, text: str, vector):
+        key = self.prefix + normalize_query(text)
+        vector = np.asarray(vector, dtype=np.float32)
+        with self.lock:
+            self.entries[key] = vector
+            self.entries.move_to_end(key)
+            evicted = []
+            while len(self.entries) > self.max_entries:
+                evicted.append(self.entries.popitem(last=False)[0])
+
+            if self.db is not None:
+                self.db.execute(
+                    "INSERT OR REPLACE INTO query_embeddings VALUES (?, ?)",
+                    (key, vector.tobytes())
+                )
+                self.db.executemany(
+                    "DELETE FROM query_embeddings WHERE query = ?",
+                    [(k,) for k in evicted]
+                )
+                self.db.commit()
+
+    def get_stats(self) -> dict:
+        return {**self.stats, "entries": len(self.entries)}
+
+
+class NumpyIndex:
+    """Wszystkie wektory fragmentów w jednej macierzy float32.
+
+    Odległość liczona jak w Chroma (kwadrat odległości euklidesowej),
+    więc próg 0.8 z search_knowledge działa bez zmian.
+    """
+
+    def __init__(self, vectors, documents: list[str], titles: list[str]):
+        self.vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        self.norms = np.einsum("ij,ij->i", self.vectors, self.vectors)
+        self.documents = documents
+        self.titles = titles
+
+    @classmethod
+    def from_chroma(cls, vectorstore):
+        data = vectorstore.get(include=["embeddings", "documents", "metadatas"])
+        titles = [(m or {}).get("title", "Nieznane") for m in data["metadatas"]]
+        return cls(np.asarray(data["embeddings"]), data["documents"], titles)
+
+    def __len__(self):
+        return len(self.documents)
+
+    def search(self, query_vector, k: int = 2):
+        """Zwróć listę (treść, tytuł, odległość) - najbliższe fragmenty"""
+        if not len(self):
+            return []
+        query = np.asarray(query_vector, dtype=np.float32)
+        distances = self.norms - 2 * (self.vectors @ query) + float(query @ query)
+
+        k = min(k, len(distances))
+        top = np.argpartition(distances, k - 1)[:k]
+        top = top[np.argsort(distances[top])]
+        return [(self.documents[i], self.titles[i], float(distances[i])) for i in top]
+
+
+# Plik indeksu w katalogu wersji bazy (build_vectordb.py), czytany przez mmap.
+# Układ: nagłówek (magia, wersja formatu, długość metadanych), metadane JSON
+# (wersja bazy, embedder, liczba i wymiar wektorów, położenie sekcji), potem
+# sekcje wyrównane do 64 B: wektory float32, ich kwadraty norm, przesunięcia
+# treści i tytułów (uint64) oraz treści i tytuły w UTF-8.
+INDEX_FILE = "index.bin"
+INDEX_MAGIC = b"WAFAMIDX"
+INDEX_FORMAT = 1
+INDEX_HEADER = struct.Struct("<8sII")
+INDEX_ALIGN = 64
+
+
+def write_index(path: str, vectors, documents: list[str], titles: list[str], build: str, embedder: str):
+    """Zapisz indeks do pliku (tymczasowy plik + os.replace - czytelnicy widzą całość albo nic)"""
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    count, dim = vectors.shape
+    texts = [text.encode("utf-8") for text in (*documents, *titles)]
+    offsets = np.zeros(len(texts) + 1, dtype=np.uint64)
+    offsets[1:] = np.cumsum([len(text) for text in texts])
+    sections = {
+        "vectors": vectors.tobytes(),
+        "norms": np.einsum("ij,ij->i", vectors, vectors).astype(np.float32).tobytes(),
+        "offsets": offsets.tobytes(),
+        "text": b"".join(texts),
+    }
+
+    meta = {"build": build, "embedder": embedder, "count": count, "dim": dim,
+            "created": time.strftime("%Y-%m-%d %H:%M:%S"), "sections": {}}
+    # Długość metadanych zależy od położenia sekcji - zarezerwuj miejsce z zapasem
+    start = INDEX_HEADER.size + len(json.dumps(meta)) + 64 * len(sections) + 256
+    position = -(-start // INDEX_ALIGN) * INDEX_ALIGN
+    for name, data in sections.items():
+        meta["sections"][name] = [position, len(data)]
+        position = -(-(position + len(data)) // INDEX_ALIGN) * INDEX_ALIGN
+    meta_bytes = json.dumps(meta).encode("utf-8")
+    assert INDEX_HEADER.size + len(meta_bytes) <= meta["sections"]["vectors"][0]
+
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(INDEX_HEADER.pack(INDEX_MAGIC, INDEX_FORMAT, len(meta_bytes)))
+        f.write(meta_bytes)
+        for name, data in sections.items():
+            f.seek(meta["sections"][name][0])
+            f.write(data)
+        f.truncate(position)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def read_index_meta(path: str) -> dict:
+    """Metadane indeksu bez mapowania całego pliku"""
+    with open(path, "rb") as f:
+        magic, version, meta_length = INDEX_HEADER.unpack(f.read(INDEX_HEADER.size))
+        if magic != INDEX_MAGIC or version != INDEX_FORMAT:
+            raise ValueError(f"{path}: nieznany format indeksu ({magic!r}, wersja {version})")
+        return json.loads(f.read(meta_length))
+
+
+class MappedStrings:
+    """Teksty z pliku indeksu, dekodowane dopiero przy odczycie"""
+
+    def __init__(self, buffer, offsets, start: int, count: int, base: int):
+        self.buffer = buffer
+        self.offsets = offsets
+        self.start = start
+        self.count = count
+        self.base = base
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        begin = self.base + int(self.offsets[self.start + i])
+        end = self.base + int(self.offsets[self.start + i + 1])
+        return bytes(self.buffer[begin:end]).decode("utf-8")
+
+
+class MmapIndex(NumpyIndex):
+    """NumpyIndex na pliku zmapowanym w pamięci (bez kopii).
+
+    Strony pliku są w cache systemu, więc wszystkie workery uvicorna
+    (--workers N) dzielą jedną kopię wektorów zamiast trzymać własne.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.meta = read_index_meta(path)
+        with open(path, "rb") as f:
+            self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        count, dim = self.meta["count"], self.meta["dim"]
+
+        def section(name, dtype, length):
+            offset, _ = self.meta["sections"][name]
+            return np.frombuffer(self.mmap, dtype=dtype, count=length, offset=offset)
+
+        self.vectors = section("vectors", np.float32, count * dim).reshape(count, dim)
+        self.norms = section("norms", np.float32, count)
+        offsets = section("offsets", np.uint64, 2 * count + 1)
+        base = self.meta["sections"]["text"][0]
+        self.documents = MappedStrings(self.mmap, offsets, 0, count, base)
+        # Tytuły leżą w blobie zaraz za treściami
+        self.titles = MappedStrings(self.mmap, offsets, count, count, base)
+
+    @property
+    def build(self) -> str:
+        return self.meta["build"]
@@ -0,0 +1,217 @@
+"""Pamięć sesji rozmów: historia, temat i zebrane dane w jednym rekordzie.
+
+Sesje wygasają po czasie bezczynności (TTL), a po przekroczeniu limitu
+usuwana jest najdawniej używana (LRU). Backend "memory" działa w jednym
+procesie, "sqlite" i "redis" pozwalają dzielić sesje między workerami
+uvicorna.
+
+Sesja jest czytana na początku tury i zapisywana w całości na końcu, bez
+blokady. Dwie równoległe tury tej samej sesji w różnych workerach (np.
+podwójne kliknięcie "Wyślij") - zapis drugiej nadpisuje pierwszą i jej
+wymiana znika z historii. Widget wysyła kolejną wiadomość dopiero po
+odpowiedzi, więc w praktyce dotyczy to tylko takich powtórzeń.
+"""
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+
+
+@dataclass(slots=True)
+class Session:
+    history: list = field(default_factory=list)
+    topic: str = None
+    data: dict = field(default_factory=dict)
+    last_seen: float = 0.0
+    # Streszczenie wypowiedzi, które wypadły z historii
+    summary: str = ""
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self), ensure_ascii=False, separators=(",", ":"))
+
+    @classmethod
+    def from_json(cls, raw) -> "Session":
+        return cls(**json.loads(raw))
+
+
+class MemorySessionStore:
+    """Sesje w pamięci procesu (OrderedDict: od najdawniej używanej)"""
+
+    shared = False
+
+    def __init__(self, max_sessions: int = 10000, ttl: float = 1800):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.sessions = OrderedDict()
+        self.lock = threading.Lock()
+        self.evicted = 0
+
+    def _purge(self, now: float):
+        # Najstarsze sesje są na początku - wystarczy zdejmować z przodu
+        while self.sessions:
+            session_id, session = next(iter(self.sessions.items()))
+            if now - session.last_seen <= self.ttl and len(self.sessions) <= self.max_sessions:
+                break
+            del self.sessions[session_id]
+            self.evicted += 1
+
+    def get(self, session_id: str) -> Session:
+        now = time.time()
+        with self.lock:
+            self._purge(now)
+            session = self.sessions.get(session_id)
+            if session is None:
+                session = Session()
+                self.sessions[session_id] = session
+            self.sessions.move_to_end(session_id)
+            session.last_seen = now
+            return session
+
+    def save(self, session_id: str, session: Session):
+        with self.lock:
+            session.last_seen = time.time()
+            self.sessions[session_id] = session
+            self.sessions.move_to_end(session_id)
+            self._purge(session.last_seen)
+
+    def delete(self, session_id: str):
+        with self.lock:
+            self.sessions.pop(session_id, None)
+
+    def __len__(self):
+        return len(self.sessions)
+
+
+class SqliteSessionStore:
+    """Sesje w pliku SQLite - wspólne dla wszystkich workerów na jednej maszynie"""
+
+    shared = True
+
+    def __init__(self, path: str, max_sessions: int = 10000, ttl: float = 1800, purge_every: float = 30):
+        self.path = path
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.purge_every = purge_every
+        self.last_purge = 0.0
+        self.evicted = 0
+        self.local = threading.local()
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS sessions (
+                id TEXT PRIMARY KEY,
+                record TEXT NOT NULL,
+                last_seen REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS sessions_last_seen ON sessions(last_seen);
+        """)
+
+    @property
+    def db(self):
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self.local.connection = connection
+        return connection
+
+    def _purge(self, now: float):
+        # Sprzątanie co kilkadziesiąt sekund, nie przy każdym zapytaniu
+        if now - self.last_purge < self.purge_every:
+            return
+        self.last_purge = now
+        cursor = self.db.execute("DELETE FROM sessions WHERE last_seen < ?", (now - self.ttl,))
+        self.evicted += cursor.rowcount
+        cursor = self.db.execute(
+            "DELETE FROM sessions WHERE id IN ("
+            "SELECT id FROM sessions ORDER BY last_seen DESC LIMIT -1 OFFSET ?)",
+            (self.max_sessions,)
+        )
+        self.evicted += cursor.rowcount
+
+    def get(self, session_id: str) -> Session:
+        now = time.time()
+        self._purge(now)
+        row = self.db.execute(
+            "SELECT record FROM sessions WHERE id = ? AND last_seen >= ?",
+            (session_id, now - self.ttl)
+        ).fetchone()
+        session = Session.from_json(row[0]) if row else Session()
+        session.last_seen = now
+        return session
+
+    def save(self, session_id: str, session: Session):
+        session.last_seen = time.time()
+        self.db.execute(
+            "INSERT OR REPLACE INTO sessions VALUES (?, ?, ?)",
+            (session_id, session.to_json(), session.last_seen)
+        )
+
+    def delete(self, session_id: str):
+        self.db.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+    def __len__(self):
+        return self.db.execute(
+            "SELECT COUNT(*) FROM sessions WHERE last_seen >= ?", (time.time() - self.ttl,)
+        ).fetchone()[0]
+
+
+class RedisSessionStore:
+    """Sesje w Redisie (lub zgodnym serwerze); TTL przez SETEX, limit przez maxmemory.
+
+    Liczba aktywnych sesji z sorted setu `<prefix>seen` (sesja -> ostatnie użycie),
+    przycinanego ZREMRANGEBYSCORE - bez SCAN całej bazy przy każdym odczycie metryk.
+    """
+
+    shared = True
+
+    def __init__(self, url: str, ttl: float = 1800, prefix: str = "wafam:session:", purge_every: float = 30):
+        import redis
+
+        self.redis = redis.Redis.from_url(url)
+        self.ttl = int(ttl)
+        self.prefix = prefix
+        self.seen_key = prefix + "seen"
+        self.purge_every = purge_every
+        self.last_purge = 0.0
+        self.evicted = 0
+
+    def get(self, session_id: str) -> Session:
+        raw = self.redis.get(self.prefix + session_id)
+        session = Session.from_json(raw) if raw else Session()
+        session.last_seen = time.time()
+        return session
+
+    def save(self, session_id: str, session: Session):
+        session.last_seen = time.time()
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.setex(self.prefix + session_id, self.ttl, session.to_json())
+        pipe.zadd(self.seen_key, {session_id: session.last_seen})
+        if session.last_seen - self.last_purge >= self.purge_every:
+            self.last_purge = session.last_seen
+            pipe.zremrangebyscore(self.seen_key, "-inf", session.last_seen - self.ttl)
+        pipe.execute()
+
+    def delete(self, session_id: str):
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.delete(self.prefix + session_id)
+        pipe.zrem(self.seen_key, session_id)
+        pipe.execute()
+
+    def __len__(self):
+        # Sesje zapisane w czasie TTL (przybliżenie: bez wpisów usuniętych przez maxmemory)
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.zremrangebyscore(self.seen_key, "-inf", time.time() - self.ttl)
+        pipe.zcard(self.seen_key)
+        return pipe.execute()[1]
+
+
+def create_session_store(backend: str, path: str = None, url: str = None,
+                         max_sessions: int = 10000, ttl: float = 1800):
+    """Utwórz magazyn sesji wg konfiguracji: memory, sqlite albo redis"""
+    if backend == "sqlite":
+        return SqliteSessionStore(path, max_sessions=max_sessions, ttl=ttl)
+    if backend == "redis":
+        return RedisSessionStore(url, ttl=ttl)
+    return MemorySessionStore(max_sessions=max_sessions, ttl=ttl)
@@ -0,0 +1,223 @@
+"""Wielu dealerów (tenantów) w jednym wdrożeniu: osobna baza wiedzy, prompt i leady.
+
+Tenant to katalog tenants/<id>/ (WAFAM_TENANTS_DIR):
+    system_prompt.txt          prompt systemowy (linia "KONTAKT:" - do odpowiedzi awaryjnej)
+    data/wafam_chunks.json     fragmenty i indeks BM25 (prepare_knowledge.py --tenant <id>)
+    data/wafam_bm25.json
+    data/leads.db              leady
+    knowledge_base/            wersje bazy wektorowej (build_vectordb.py --tenant <id>)
+Tenant domyślny (WAFAM_DEFAULT_TENANT) korzysta z dotychczasowych ścieżek
+(data/, knowledge_base/) i SYSTEM_PROMPT z api.py.
+
+Lekkie części tenanta (prompt, BM25, leady) tworzone są przy pierwszym
+zapytaniu i zostają w pamięci. Bazy wektorowe trzyma LRU ograniczone
+rozmiarem: baza wczytywana jest przy pierwszym użyciu, a gdy suma
+przekroczy limit, zwalniane są najdawniej używane (domyślny tenant -
+nigdy). Liczba zapytań tenantów zapisywana jest przy zamknięciu - po
+starcie rozgrzewane są bazy najczęściej używanych.
+"""
+import asyncio
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+
+TENANTS_DIR = os.getenv(
+    "WAFAM_TENANTS_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tenants')
+)
+TENANT_ID_RE = re.compile(r"^[a-z0-9][a-z0-9_-]{0,39}$")
+PROMPT_FILE = "system_prompt.txt"
+USAGE_FILE = "usage.json"
+
+
+class UnknownTenant(LookupError):
+    """Nie ma takiego tenanta (brak katalogu albo pliku promptu)"""
+
+
+def tenant_paths(tenant_id: str, root: str = TENANTS_DIR) -> dict:
+    """Pliki tenanta w katalogu tenants/<id>/"""
+    directory = os.path.join(root, tenant_id)
+    data_dir = os.path.join(directory, "data")
+    return {
+        "dir": directory,
+        "prompt": os.path.join(directory, PROMPT_FILE),
+        "data": data_dir,
+        "chunks": os.path.join(data_dir, "wafam_chunks.json"),
+        "bm25": os.path.join(data_dir, "wafam_bm25.json"),
+        "manifest": os.path.join(data_dir, "wafam_manifest.json"),
+        "shards": os.path.join(data_dir, "chunks"),
+        "leads": os.path.join(data_dir, "leads.db"),
+        "knowledge_base": os.path.join(directory, "knowledge_base"),
+    }
+
+
+class Tenant:
+    """Części tenanta potrzebne przy każdym zapytaniu (baza wektorowa - w TenantRegistry)"""
+
+    def __init__(self, tenant_id: str, **parts):
+        self.id = tenant_id
+        self.__dict__.update(parts)
+
+    def session_key(self, session_id: str) -> str:
+        """Klucz sesji w magazynie sesji - te same session_id u dwóch tenantów to różne rozmowy.
+
+        Prefiks ma każdy tenant, także domyślny: id tenanta nie zawiera ":",
+        więc session_id typu "okna-nowak:abc" nie trafi w sesję innego tenanta.
+        """
+        return f"{self.id}:{session_id}"
+
+
+class TenantRegistry:
+    """Tenanci tworzeni przy pierwszym użyciu i LRU ich baz wektorowych (limit w bajtach).
+
+    `factory(id)` tworzy Tenant, `kb_loader(tenant)` otwiera jego bazę wiedzy,
+    `sizeof(baza)` szacuje zajmowaną pamięć.
+    """
+
+    def __init__(self, default_id: str, factory, kb_loader, sizeof, max_bytes: int,
+                 root: str = TENANTS_DIR, usage_path: str = None):
+        self.default_id = default_id
+        self.factory = factory
+        self.kb_loader = kb_loader
+        self.sizeof = sizeof
+        self.max_bytes = max_bytes
+        self.root = root
+        self.usage_path = usage_path or os.path.join(root, USAGE_FILE)
+        self.tenants = {}
+        self.indexes = OrderedDict()
+        self.loading = {}
+        self.lock = threading.Lock()
+        self.usage = self.load_usage()
+        self.stats = {"hits": 0, "misses": 0, "loads": 0, "evictions": 0, "errors": 0}
+
+    def exists(self, tenant_id: str) -> bool:
+        if tenant_id == self.default_id:
+            return True
+        return bool(TENANT_ID_RE.match(tenant_id)) and os.path.isfile(tenant_paths(tenant_id, self.root)["prompt"])
+
+    def names(self) -> list[str]:
+        """Wszyscy skonfigurowani tenanci (domyślny pierwszy)"""
+        found = []
+        if os.path.isdir(self.root):
+            found = sorted(name for name in os.listdir(self.root) if name != self.default_id and self.exists(name))
+        return [self.default_id] + found
+
+    def get(self, tenant_id: str = None) -> Tenant:
+        """Tenant o tym id (tworzony przy pierwszym użyciu); UnknownTenant, gdy go nie ma"""
+        tenant_id = tenant_id or self.default_id
+        tenant = self.tenants.get(tenant_id)
+        if tenant is not None:
+            return tenant
+        if not self.exists(tenant_id):
+            raise UnknownTenant(f"Nieznany tenant: {tenant_id}")
+        with self.lock:
+            if tenant_id not in self.tenants:
+                self.tenants[tenant_id] = self.factory(tenant_id)
+            return self.tenants[tenant_id]
+
+    async def resolve(self, tenant_id: str = None) -> Tenant:
+        """get() bez blokowania pętli zdarzeń (tworzenie tenanta czyta pliki)"""
+        tenant = self.tenants.get(tenant_id or self.default_id)
+        if tenant is not None:
+            return tenant
+        return await asyncio.to_thread(self.get, tenant_id)
+
+    def record(self, tenant_id: str):
+        self.usage[tenant_id] = self.usage.get(tenant_id, 0) + 1
+
+    def add(self, tenant_id: str, knowledge_base):
+        """Dodaj wczytaną bazę do LRU (np. bazę domyślnego tenanta po starcie)"""
+        self.indexes[tenant_id] = (knowledge_base, self.sizeof(knowledge_base))
+        self.indexes.move_to_end(tenant_id)
+        self.stats["loads"] += 1
+        self.evict(keep=tenant_id)
+
+    async def knowledge(self, tenant: Tenant):
+        """Baza wektorowa tenanta - z LRU albo wczytana teraz (w wątku, raz dla równoległych zapytań)"""
+        entry = self.indexes.get(tenant.id)
+        if entry is not None:
+            self.indexes.move_to_end(tenant.id)
+            self.stats["hits"] += 1
+            return entry[0]
+        lock = self.loading.setdefault(tenant.id, asyncio.Lock())
+        async with lock:
+            entry = self.indexes.get(tenant.id)
+            if entry is not None:
+                self.stats["hits"] += 1
+                return entry[0]
+            self.stats["misses"] += 1
+            try:
+                knowledge_base = await asyncio.to_thread(self.kb_loader, tenant)
+            except Exception:
+                self.stats["errors"] += 1
+                raise
+            if knowledge_base is not None:
+                # None - tenant nie ma jeszcze bazy; sprawdzane znów przy kolejnym zapytaniu
+                self.add(tenant.id, knowledge_base)
+            return knowledge_base
+
+    def discard(self, tenant_id: str):
+        """Zapomnij tenanta i jego bazę (zostaną wczytane od nowa, np. po przebudowie)"""
+        if tenant_id == self.default_id:
+            return
+        with self.lock:
+            self.tenants.pop(tenant_id, None)
+        self.indexes.pop(tenant_id, None)
+
+    def evict(self, keep: str = None):
+        """Zwolnij najdawniej używane bazy, aż suma zmieści się w limicie"""
+        while self.loaded_bytes() > self.max_bytes:
+            victim = next((tenant_id for tenant_id in self.indexes
+                           if tenant_id not in (keep, self.default_id)), None)
+            if victim is None:
+                # Zostały tylko baza domyślna i właśnie wczytana - większe od limitu, ale potrzebne
+                return
+            del self.indexes[victim]
+            self.stats["evictions"] += 1
+            print(f"Zwolniono bazę wiedzy tenanta {victim} (limit pamięci)")
+
+    def loaded_bytes(self) -> int:
+        return sum(size for _, size in self.indexes.values())
+
+    def hottest(self, limit: int) -> list[str]:
+        """Tenanci z największą liczbą zapytań (bez domyślnego - ten wczytywany jest zawsze)"""
+        ranked = sorted(self.usage.items(), key=lambda item: -item[1])
+        return [tenant_id for tenant_id, _ in ranked if tenant_id != self.default_id and self.exists(tenant_id)][:limit]
+
+    async def warm_up(self, limit: int) -> list[str]:
+        """Wczytaj bazy `limit` najczęściej używanych tenantów (błędy tylko wypisywane)"""
+        loaded = []
+        for tenant_id in self.hottest(limit):
+            try:
+                await self.knowledge(await self.resolve(tenant_id))
+            except Exception as e:
+                print(f"Nie wczytano bazy tenanta {tenant_id}: {e}")
+                continue
+            loaded.append(tenant_id)
+        return loaded
+
+    def load_usage(self) -> dict:
+        try:
+            with open(self.usage_path, "r", encoding="utf-8") as f:
+                return {str(k): int(v) for k, v in json.load(f).items()}
+        except (OSError, ValueError, AttributeError):
+            return {}
+
+    def save_usage(self):
+        if not self.usage or not os.path.isdir(self.root):
+            return
+        temp_path = self.usage_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(self.usage, f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, self.usage_path)
+
+    def get_stats(self) -> dict:
+        return {
+            **self.stats,
+            "active": len(self.tenants),
+            "loaded": len(self.indexes),
+            "loaded_bytes": self.loaded_bytes(),
+            "max_bytes": self.max_bytes,
+        }
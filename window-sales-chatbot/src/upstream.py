@@ -0,0 +1,133 @@
+"""Odporność na awarie API modelu: ponowienia z budżetem i bezpiecznik.
+
+Wolne albo niedziałające OpenAI nie może blokować wszystkich zapytań:
+    - każde wywołanie ma limit czasu (osobny dla czatu i embeddingów),
+    - błędy przejściowe (timeout, zerwane połączenie, 429, 5xx) są
+      ponawiane z losowym opóźnieniem (full jitter), ale ponowień może
+      być najwyżej `ratio` wszystkich wywołań (RetryBudget) - przy
+      awarii ponowienia nie mnożą ruchu,
+    - po `failures` porażkach z rzędu bezpiecznik (CircuitBreaker) się
+      otwiera i przez `reset_after` s wywołania od razu kończą się
+      UpstreamUnavailable (API odpowiada wtedy awaryjnie). Potem jedno
+      wywołanie próbne decyduje, czy zamknąć go z powrotem,
+    - błędy trwałe (`fatal`, np. unieważniony klucz - 401/403) nie są
+      ponawiane, ale liczą się jako porażka i kończą UpstreamUnavailable.
+"""
+import asyncio
+import random
+import time
+
+
+class UpstreamUnavailable(Exception):
+    """Wywołanie nie powiodło się albo bezpiecznik jest otwarty"""
+
+
+class RetryBudget:
+    """Ponowienia jako ułamek wywołań: każde wywołanie dodaje `ratio` żetonu, ponowienie zabiera 1"""
+
+    def __init__(self, ratio: float = 0.2, min_tokens: float = 10):
+        self.ratio = ratio
+        self.max_tokens = max(min_tokens, 1.0)
+        self.tokens = self.max_tokens
+
+    def deposit(self):
+        self.tokens = min(self.tokens + self.ratio, self.max_tokens)
+
+    def withdraw(self) -> bool:
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failures: int = 5, reset_after: float = 15.0):
+        self.failures = failures
+        self.reset_after = reset_after
+        self.state = self.CLOSED
+        self.consecutive = 0
+        self.opened_at = 0.0
+        self.trial = False
+
+    def allow(self) -> bool:
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_after:
+            self.state = self.HALF_OPEN
+            self.trial = False
+        if self.state == self.HALF_OPEN:
+            # Tylko jedno wywołanie próbne naraz
+            if self.trial:
+                return False
+            self.trial = True
+            return True
+        return self.state == self.CLOSED
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.consecutive = 0
+        self.trial = False
+
+    def abandon(self):
+        """Wywołanie przerwane (np. klient się rozłączył) - nie wiadomo nic o usłudze, próba do powtórzenia"""
+        self.trial = False
+
+    def record_failure(self):
+        self.consecutive += 1
+        if self.state == self.HALF_OPEN or self.consecutive >= self.failures:
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+            self.trial = False
+
+
+class Upstream:
+    """Wywołania jednego etapu (np. "chat") z ponowieniami i bezpiecznikiem"""
+
+    def __init__(self, name: str, retryable, attempts: int = 3, base_delay: float = 0.2,
+                 max_delay: float = 2.0, budget: RetryBudget = None, breaker: CircuitBreaker = None,
+                 on_event=None, fatal=None):
+        self.name = name
+        self.retryable = retryable
+        self.fatal = fatal or (lambda error: False)
+        self.attempts = max(attempts, 1)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget or RetryBudget()
+        self.breaker = breaker or CircuitBreaker()
+        # on_event(nazwa etapu, zdarzenie) - liczniki w metrykach
+        self.on_event = on_event or (lambda name, event: None)
+
+    async def call(self, make_call):
+        """Wywołaj `make_call()` (zwraca awaitable); UpstreamUnavailable przy otwartym bezpieczniku"""
+        if not self.breaker.allow():
+            self.on_event(self.name, "short_circuit")
+            raise UpstreamUnavailable(f"{self.name}: bezpiecznik otwarty")
+        self.budget.deposit()
+
+        for attempt in range(self.attempts):
+            try:
+                result = await make_call()
+            except asyncio.CancelledError:
+                # Bez tego przerwane wywołanie próbne zostawiłoby bezpiecznik półotwarty na zawsze
+                self.breaker.abandon()
+                raise
+            except Exception as e:
+                if self.fatal(e):
+                    # Usługa nieużywalna bez zmiany konfiguracji - bez ponowień, ale to awaria
+                    self.breaker.record_failure()
+                    self.on_event(self.name, "failure")
+                    raise UpstreamUnavailable(f"{self.name}: {type(e).__name__}: {e}") from e
+                if not self.retryable(e):
+                    # Błąd zapytania (np. 400) - nie świadczy o awarii usługi
+                    self.breaker.record_success()
+                    raise
+                self.breaker.record_failure()
+                self.on_event(self.name, "failure")
+                last_attempt = attempt + 1 == self.attempts
+                if last_attempt or self.breaker.state == CircuitBreaker.OPEN or not self.budget.withdraw():
+                    raise UpstreamUnavailable(f"{self.name}: {type(e).__name__}: {e}") from e
+                self.on_event(self.name, "retry")
+                await asyncio.sleep(random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt)))
+            else:
+                self.breaker.record_success()
+                return result
@@ -0,0 +1,86 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from admission import PRIORITY_BATCH, Admission, Overloaded, RateLimiter
+
+
+async def queued(admission: Admission, session_key: str, has_contact: bool = False):
+    """Zadanie czekające w kolejce (po jednym obrocie pętli jest już w kopcu)"""
+    task = asyncio.create_task(admission.admit(session_key, "1.2.3.4", has_contact))
+    await asyncio.sleep(0)
+    return task
+
+
+def test_contact_message_overtakes_queued_default():
+    async def scenario():
+        admission = Admission(max_active=1, max_queue=4, queue_timeout=5)
+        first = await admission.admit("a", "1.2.3.4")
+        default = await queued(admission, "b")
+        contact = await queued(admission, "c", has_contact=True)
+
+        first.release()
+        ticket = await contact
+        assert not default.done()
+        ticket.release()
+        (await default).release()
+        assert admission.active == 0
+
+    asyncio.run(scenario())
+
+
+def test_full_queue_sheds_lowest_priority():
+    async def scenario():
+        admission = Admission(max_active=1, max_queue=1, queue_timeout=5)
+        first = await admission.admit("a", "1.2.3.4")
+        default = await queued(admission, "b")
+        contact = await queued(admission, "c", has_contact=True)
+
+        with pytest.raises(Overloaded) as shed:
+            await default
+        assert shed.value.reason == "shed"
+        with pytest.raises(Overloaded) as full:
+            await admission.admit("d", "1.2.3.4")
+        assert full.value.reason == "queue_full"
+
+        first.release()
+        (await contact).release()
+        assert admission.active == 0
+
+    asyncio.run(scenario())
+
+
+def test_contact_message_skips_session_limit():
+    async def scenario():
+        admission = Admission(max_active=10, max_queue=10, queue_timeout=5,
+                              session_limiter=RateLimiter(per_minute=1, burst=1))
+        (await admission.admit("a", "1.2.3.4")).release()
+        with pytest.raises(Overloaded) as limited:
+            await admission.admit("a", "1.2.3.4")
+        assert limited.value.reason == "rate_limited" and limited.value.retry_after >= 1
+        (await admission.admit("a", "1.2.3.4", has_contact=True)).release()
+
+    asyncio.run(scenario())
+
+
+def test_group_limit_leaves_slots_for_other_groups():
+    async def scenario():
+        admission = Admission(max_active=2, max_queue=4, queue_timeout=5)
+        batch = await admission.admit("r1", None, group="wafam/batch", group_limit=1, priority=PRIORITY_BATCH)
+        waiting = asyncio.create_task(
+            admission.admit("r2", None, group="wafam/batch", group_limit=1, priority=PRIORITY_BATCH)
+        )
+        await asyncio.sleep(0)
+        assert not waiting.done()
+        client = await admission.admit("a", "1.2.3.4", group="wafam")
+
+        batch.release()
+        (await waiting).release()
+        client.release()
+        assert admission.active == 0
+
+    asyncio.run(scenario())
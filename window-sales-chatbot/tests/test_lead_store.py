@@ -0,0 +1,46 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from lead_store import LeadStore
+
+
+def make_store(tmp_path, count: int = 7) -> LeadStore:
+    store = LeadStore(str(tmp_path / "leads.db"))
+    for i in range(count):
+        assert store.add(phone=f"60000000{i}", product="okna", session_id=f"s{i}")
+    return store
+
+
+@pytest.mark.parametrize("order", ["asc", "desc"])
+def test_cursor_pages_cover_every_lead_once(tmp_path, order):
+    # Leady z tej samej minuty - kolejność rozstrzyga id
+    store = make_store(tmp_path)
+    seen, cursor = [], None
+    while True:
+        leads, cursor = store.page(order=order, limit=3, cursor=cursor)
+        seen.extend(lead["id"] for lead in leads)
+        if cursor is None:
+            break
+    assert seen == sorted(seen, reverse=order == "desc")
+    assert len(seen) == len(set(seen)) == 7
+
+
+def test_cursor_keeps_filters_and_duplicates_are_rejected(tmp_path):
+    store = make_store(tmp_path, count=3)
+    assert store.add(phone="600000000") is None
+    store.add(email="jan@example.com", product="drzwi")
+    leads, cursor = store.page(product="okna", limit=2)
+    more, last = store.page(product="okna", limit=2, cursor=cursor)
+    assert [lead["product"] for lead in leads + more] == ["okna"] * 3
+    assert last is None
+    assert store.count() == 4 and store.count("nowy") == 4
+
+
+def test_invalid_cursor(tmp_path):
+    store = make_store(tmp_path, count=1)
+    with pytest.raises(ValueError):
+        store.page(cursor="nie-kursor")
@@ -0,0 +1,30 @@
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from replay import load_finished
+
+
+def row(session_id: str, turn: int, error: str = None) -> str:
+    return json.dumps({"session_id": session_id, "turn": turn, "text": "?", "bot": None if error else "ok",
+                       "sources": [], "error": error, "ms": 1.0}) + "\n"
+
+
+def test_load_finished_keeps_only_complete_sessions(tmp_path):
+    sessions = {"a": ["x", "y"], "b": ["x", "y"], "c": ["x", "y"]}
+    results = tmp_path / "wyniki.jsonl"
+    results.write_text(
+        row("a", 1) + row("b", 0) + row("a", 0) + row("b", 1, error="UpstreamUnavailable: chat")
+        + row("c", 0) + '{"session_id": "c", "tu',
+        encoding="utf-8"
+    )
+
+    assert load_finished(str(results), sessions) == {"a"}
+    kept = [json.loads(line) for line in results.read_text(encoding="utf-8").splitlines()]
+    assert sorted((r["session_id"], r["turn"]) for r in kept) == [("a", 0), ("a", 1)]
+
+
+def test_load_finished_without_results_file(tmp_path):
+    assert load_finished(str(tmp_path / "brak.jsonl"), {"a": ["x"]}) == set()
@@ -0,0 +1,26 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from tenants import PROMPT_FILE, Tenant, TenantRegistry
+
+
+def make_registry(root) -> TenantRegistry:
+    for tenant_id in ("okna-nowak", "okna"):
+        os.makedirs(root / tenant_id)
+        (root / tenant_id / PROMPT_FILE).write_text("KONTAKT: -", encoding="utf-8")
+    return TenantRegistry("wafam", Tenant, kb_loader=lambda tenant: None, sizeof=lambda kb: 0,
+                          max_bytes=0, root=str(root))
+
+
+def test_tenants_never_share_session_key(tmp_path):
+    registry = make_registry(tmp_path)
+    tenants = [registry.get(tenant_id) for tenant_id in registry.names()]
+    session_ids = ["abc", "okna-nowak:abc", "nowak:abc", ":abc", "okna:nowak:abc", "wafam:abc", ""]
+    owners = {}
+    for tenant in tenants:
+        for session_id in session_ids:
+            key = tenant.session_key(session_id)
+            assert owners.setdefault(key, (tenant.id, session_id)) == (tenant.id, session_id)
+    assert len(owners) == len(tenants) * len(session_ids)
@@ -0,0 +1,80 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from upstream import CircuitBreaker, Upstream, UpstreamUnavailable
+
+
+def open_breaker(failures: int = 2) -> CircuitBreaker:
+    breaker = CircuitBreaker(failures=failures, reset_after=60)
+    for _ in range(failures):
+        assert breaker.allow()
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN and not breaker.allow()
+    return breaker
+
+
+def expire(breaker: CircuitBreaker):
+    breaker.opened_at -= breaker.reset_after
+
+
+def test_half_open_allows_one_trial_and_closes_on_success():
+    breaker = open_breaker()
+    expire(breaker)
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.allow()
+
+
+def test_failed_trial_reopens_breaker():
+    breaker = open_breaker()
+    expire(breaker)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN and not breaker.allow()
+
+
+def test_abandoned_trial_can_be_repeated():
+    breaker = open_breaker()
+    expire(breaker)
+    assert breaker.allow()
+    breaker.abandon()
+    assert breaker.allow()
+    assert not breaker.allow()
+
+
+def test_fatal_errors_open_breaker_without_retries():
+    calls = []
+
+    async def revoked_key():
+        calls.append(1)
+        raise PermissionError("401")
+
+    upstream = Upstream("chat", lambda e: True, attempts=3, base_delay=0,
+                        breaker=CircuitBreaker(failures=2, reset_after=60),
+                        fatal=lambda e: isinstance(e, PermissionError))
+
+    async def scenario():
+        for _ in range(3):
+            with pytest.raises(UpstreamUnavailable):
+                await upstream.call(revoked_key)
+
+    asyncio.run(scenario())
+    assert len(calls) == 2
+    assert upstream.breaker.state == CircuitBreaker.OPEN
+
+
+def test_request_errors_are_raised_as_is():
+    async def bad_request():
+        raise ValueError("400")
+
+    upstream = Upstream("chat", lambda e: False)
+    with pytest.raises(ValueError):
+        asyncio.run(upstream.call(bad_request))
+    assert upstream.breaker.state == CircuitBreaker.CLOSED